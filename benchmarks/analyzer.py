@@ -0,0 +1,66 @@
+"""Сравнение последовательного, пакетного и суточного подсчета статистик.
+
+Запуск: ``python -m benchmarks.analyzer [число сообщений]``.
+"""
+import datetime
+import gc
+import random
+import sys
+import time
+
+from tganalyzer.core.analyzer import DEPENDENCIES, start_analyses
+from tganalyzer.core.columnar import ColumnarChat
+from tganalyzer.core.creator import Chat
+from benchmarks.synthetic import synthetic_message
+
+
+def best_of(repeat: int, func, *args):
+    """Возвращает лучшее время из нескольких запусков и результат функции."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(messages: int = 1_000_000):
+    """Печатает время анализа одного большого чата всеми способами."""
+    rnd = random.Random(0)
+    header = {"name": "Group", "type": "private_group", "id": 1}
+    users = [(f"Member {i}", f"user{i}") for i in range(5)]
+    chat = Chat(header, (synthetic_message(rnd, i, 1, users)
+                         for i in range(messages)))
+    columnar_chat = ColumnarChat.from_chat(chat)
+    time_gap = (datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc),
+                datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc))
+    # сравниваются способы подсчета опций, у которых есть batch_func;
+    # остальные (например, top_words) считаются только по сообщениям
+    features = {feature: "batch_func" in DEPENDENCIES[feature]
+                for feature in DEPENDENCIES}
+
+    loop, expected = best_of(3, start_analyses, [chat], time_gap, features)
+    # миллион объектов Message замедляет проходы сборщика мусора
+    del chat
+    gc.collect()
+    batch, stats = best_of(3, start_analyses, [columnar_chat], time_gap,
+                           features)
+    assert stats[0] == expected[0]
+    print(f"{messages} messages: loop {loop:.2f} s, batch {batch:.3f} s, "
+          f"x{loop / batch:.0f}")
+
+    # промежуток из целых дней считается по суточным агрегатам
+    time_gap = (time_gap[0],
+                datetime.datetime(2099, 12, 31, 23, 59, 59,
+                                  tzinfo=datetime.timezone.utc))
+    start = time.perf_counter()
+    columnar_chat.day_cube()
+    build = time.perf_counter() - start
+    query, _ = best_of(3, start_analyses, [columnar_chat], time_gap,
+                       features)
+    print(f"day cube: build {build:.3f} s once, then {query * 1000:.1f} ms "
+          f"per time gap")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
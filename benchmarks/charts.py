@@ -0,0 +1,79 @@
+"""Скорость построения графиков отчета.
+
+Графики строятся на новых и на повторно используемых фигурах matplotlib.
+
+Запуск: ``python -m benchmarks.charts [число чатов]``.
+"""
+import datetime
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+import warnings
+
+from tganalyzer.core.analyzer import start_analyses
+from tganalyzer.core.columnar import ColumnarChat
+from tganalyzer.html_export import (FigurePool, draw_date_plot, draw_pie,
+                                    draw_symb_msg_word, draw_timesofday,
+                                    draw_tod_pie, draw_top_bar,
+                                    draw_voicemsg_videomsg_videos_photos)
+from benchmarks.synthetic import synthetic_export
+
+
+def chart_jobs(path: Path, chats: int) -> list:
+    """Задания на все графики отчета по синтетическому экспорту.
+
+    :param path: каталог для файлов графиков.
+    :param chats: число чатов.
+    """
+    export = synthetic_export(20_000, chats)
+    parsed = [ColumnarChat(chat) for chat in export["chats"]["list"]]
+    time_gap = (datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc),
+                datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc))
+    features = ["symb", "msg", "word", "voice_message", "video_message",
+                "video_file", "photo", "day_night"]
+    stats, _ = start_analyses(parsed, time_gap,
+                              {feature: True for feature in features})
+    chatnames = {chat.id: chat.name for chat in parsed}
+    jobs = []
+    for feature in features[:3]:
+        draw_symb_msg_word(path, stats[feature], chatnames, feature, jobs)
+    for feature in features[3:7]:
+        draw_voicemsg_videomsg_videos_photos(
+            path, stats[feature], chatnames, feature, jobs)
+    draw_timesofday(path, stats["day_night"], jobs)
+    return jobs
+
+
+def charts_per_second(jobs: list, repeat: int = 3) -> float:
+    """Лучшая скорость построения графиков из нескольких запусков."""
+    best = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for job in jobs:
+            job()
+        best = max(best, len(jobs) / (time.perf_counter() - start))
+    return best
+
+
+def main(chats: int = 5):
+    """Печатает число графиков в секунду по видам графиков."""
+    warnings.filterwarnings("ignore")   # нет глифов для эмодзи
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = chart_jobs(Path(tmp), chats)
+        groups = {"pies": (draw_pie, draw_tod_pie),
+                  "bars": (draw_top_bar,),
+                  "date plots": (draw_date_plot,)}
+        for group, draws in groups.items():
+            group_jobs = [job for job in jobs if job.draw in draws]
+            with mock.patch("tganalyzer.html_export.FIGURES.subplots",
+                            lambda kind: FigurePool().subplots(kind)):
+                new = charts_per_second(group_jobs)
+            reused = charts_per_second(group_jobs)
+            print(f"{group} ({len(group_jobs)}): new figures {new:.1f}/s, "
+                  f"reused {reused:.1f}/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
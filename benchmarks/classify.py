@@ -0,0 +1,124 @@
+"""Скорость определения типа сообщений.
+
+Сравнивается creator.classify с прежним способом (scan_type): проверкой
+каждого ключа сообщения по списку обязательных полей и цепочкой условий.
+
+Запуск: ``python -m benchmarks.classify [число сообщений]``.
+"""
+import json
+import random
+import sys
+import time
+
+from tganalyzer.core.creator import classify, required_fields_message
+from benchmarks.synthetic import synthetic_message
+
+
+# Сообщения всех типов, которых нет в синтетическом экспорте
+SAMPLES = [
+    {"media_type": "audio_file", "mime_type": "audio/mpeg",
+     "duration_seconds": 180, "performer": "x", "title": "y"},
+    {"media_type": "unknown_media", "mime_type": "application/pdf"},
+    {"media_type": "unknown_media"},
+    {"poll": {"question": "?", "answers": []}},
+    {"contact_information": {"first_name": "a", "phone_number": "1"}},
+    {"location_information": {"latitude": 0, "longitude": 0}},
+    {"game_title": "Game", "game_description": "", "game_link": ""},
+    {"via_bot": "@bot", "inline_bot_buttons": []},
+    {"reply_to_message_id": 1, "forwarded_from": "a", "edited": "x",
+     "edited_unixtime": "0"},
+    {"saved_from": "a"},
+    {"photo": "x", "mime_type": "image/jpeg"},
+]
+
+
+def scan_type(message: dict) -> str:
+    """Тип сообщения, определенный прежним способом.
+
+    :param message: структура телеграмма, содержащая данные о сообщении.
+    """
+    if message["type"] == "service":
+        if message["action"] == "phone_call":
+            return "single_call"
+        return "group_call"
+    tmp_simple_text = True
+    for key in message.keys():
+        if key not in required_fields_message and \
+                key not in ['edited',
+                            'edited_unixtime',
+                            'forwarded_from',
+                            'reply_to_message_id',
+                            'reply_to_peer_id']:
+            tmp_simple_text = False
+    if tmp_simple_text:
+        return "simple_text"
+    elif "media_type" in message.keys() and \
+            message["media_type"] in ["sticker", "voice_message",
+                                      "video_message", "audio_file",
+                                      "video_file", "animation"]:
+        return message["media_type"]
+    elif "mime_type" in message.keys():
+        return "file"
+    elif "photo" in message.keys():
+        return "photo"
+    elif "poll" in message.keys():
+        return "poll"
+    elif "contact_information" in message.keys():
+        return "contact"
+    elif "location_information" in message.keys():
+        return "location"
+    elif "game_title" in message.keys():
+        return "game"
+    elif "via_bot" in message.keys():
+        return "bot_usage"
+    return "unknown"
+
+
+def sample_messages(messages: int, seed: int = 0) -> list[dict]:
+    """Сообщения синтетического экспорта вперемешку с ``SAMPLES``.
+
+    Звонки из синтетического экспорта остаются, остальные служебные
+    сообщения туда не попадают. Структуры проходят через json, как при
+    разборе экспорта.
+    :param messages: число сообщений.
+    :param seed: зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    users = [("Me", "user1"), ("Friend", "user2")]
+    result = []
+    for i in range(messages):
+        message = synthetic_message(rnd, i, 2, users)
+        if i % 10 == 9:
+            message.update(SAMPLES[i // 10 % len(SAMPLES)])
+        result.append(message)
+    group_call = dict(result[0], type="service", action="group_call",
+                      actor="Me", actor_id="user1")
+    return json.loads(json.dumps(result + [group_call]))
+
+
+def messages_per_second(classifier, messages: list[dict],
+                        repeat: int = 3) -> float:
+    """Лучшая скорость определения типа из нескольких запусков."""
+    best = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            classifier(message)
+        best = max(best, len(messages) / (time.perf_counter() - start))
+    return best
+
+
+def main(messages: int = 200_000):
+    """Печатает скорость обоих способов и проверяет, что они согласны."""
+    sample = sample_messages(messages)
+    mismatches = sum(classify(message) != scan_type(message)
+                     for message in sample)
+    for name, classifier in (("key scan", scan_type),
+                             ("table", classify)):
+        print(f"{name}: {messages_per_second(classifier, sample):.0f} "
+              f"messages/s")
+    print(f"mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,79 @@
+"""Время запуска: импорт модулей, справка CLI и появление окна GUI.
+
+Запуск: ``python -m benchmarks.imports``.
+"""
+import os
+from pathlib import Path
+import subprocess
+import sys
+import time
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# Модули, которые загружаются только при построении отчета или в GUI
+HEAVY_MODULES = ("matplotlib", "jinja2", "PIL", "PySide6")
+# Окно создается и сразу закрывается после первой обработки событий
+WINDOW_CODE = """
+from PySide6.QtWidgets import QApplication
+from tganalyzer.gui import MainWindow
+app = QApplication([])
+window = MainWindow()
+window.show()
+app.processEvents()
+"""
+
+
+def import_times(code: str) -> dict[str, int]:
+    """Время импорта модулей по ``python -X importtime``.
+
+    :param code: код, выполняемый в новом интерпретаторе.
+    :return: словарь вида {имя модуля: время импорта с зависимостями в
+        микросекундах}.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True,
+                            cwd=ROOT)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def run_time(args: list[str], env: dict = None, repeat: int = 5) -> float:
+    """Лучшее из нескольких время работы нового интерпретатора в секундах.
+
+    :param args: аргументы интерпретатора.
+    :param env: дополнительные переменные окружения.
+    :param repeat: число запусков.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], capture_output=True,
+                       check=True, cwd=ROOT, env=dict(os.environ, **env or {}))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Печатает время запуска CLI и GUI.
+
+    Для каждого печатаются и тяжелые модули, которые грузятся при импорте.
+    """
+    for module in ("tganalyzer.cmd", "tganalyzer.gui"):
+        times = import_times(f"import {module}")
+        heavy = [name for name in HEAVY_MODULES if name in times]
+        print(f"import {module}: {times[module] / 1000:.0f} ms, "
+              f"heavy modules: {', '.join(heavy) or 'none'}")
+    print(f"CLI help: {run_time(['-m', 'tganalyzer', '--help']):.2f} s")
+    print(f"report help: "
+          f"{run_time(['-m', 'tganalyzer', 'report', '--help']):.2f} s")
+    window = run_time(["-c", WINDOW_CODE], {"QT_QPA_PLATFORM": "offscreen"})
+    print(f"GUI window: {window:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
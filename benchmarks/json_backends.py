@@ -0,0 +1,50 @@
+"""Сравнение бэкендов разбора json на синтетическом экспорте.
+
+Запуск: ``python -m benchmarks.json_backends [число сообщений]``.
+"""
+import gc
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from tganalyzer.core.creator import Extraction
+from tganalyzer.core.jsonstream import available_backends
+from benchmarks.synthetic import write_synthetic_export
+
+
+def bench_load(path: Path, backend: str) -> float:
+    """Время полной загрузки файла."""
+    start = time.perf_counter()
+    Extraction(path, backend=backend)
+    return time.perf_counter() - start
+
+
+def bench_stream(path: Path, backend: str) -> float:
+    """Время потокового обхода всех сообщений файла."""
+    start = time.perf_counter()
+    for _, messages in Extraction(path, stream=True,
+                                  backend=backend).iter_chats():
+        for _ in messages:
+            pass
+    return time.perf_counter() - start
+
+
+def main(messages: int = 1_000_000):
+    """Печатает время разбора для всех установленных бэкендов."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "result.json"
+        write_synthetic_export(path, messages)
+        size = path.stat().st_size / 2 ** 20
+        print(f"{messages} messages, {size:.0f} MiB")
+        print(f"{'backend':<10}{'load, s':>10}{'stream, s':>12}")
+        for backend in available_backends():
+            gc.collect()
+            load = bench_load(path, backend)
+            gc.collect()
+            stream = bench_stream(path, backend)
+            print(f"{backend:<10}{load:>10.2f}{stream:>12.2f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
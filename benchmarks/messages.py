@@ -0,0 +1,149 @@
+"""Память объектов creator.Message и скорость их создания.
+
+Для сравнения сообщения сохраняются и в прежнем виде (DictMessage): с
+``__dict__``, datetime и собственными строками автора и типа у каждого
+сообщения. Память считается tracemalloc по всему, что остается от разбора
+json после удаления разобранных структур.
+
+Запуск: ``python -m benchmarks.messages [число сообщений]``.
+"""
+import gc
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from tganalyzer.core.creator import Chat, Message, start_creator
+from benchmarks.synthetic import synthetic_message
+
+
+CHAT = {"type": "personal_chat", "id": 2}
+
+
+class DictMessage():
+    """Сообщение в прежнем представлении, только для сравнения памяти.
+
+    Поля те же, что у Message, и ссылаются на те же строки разобранного
+    json, что и раньше.
+    """
+
+    def __init__(self, message: dict, chat: dict):
+        """Берет поля из сообщения нового вида.
+
+        :param message: структура телеграмма, содержащая данные о сообщении.
+        :param chat: структура телеграмма, содержащая данные о чате.
+        """
+        new = Message(message, chat)
+        self.send_time = new.send_time
+        self.text = new.text
+        if message["type"] == "service":
+            self.author = message["actor"]
+        else:
+            self.author = message["from"]
+            self.edited = new.edited
+            if new.edited:
+                self.edit_time = new.edit_time
+            self.forwarded = new.forwarded
+            if new.forwarded:
+                self.forwarded_from = message["forwarded_from"]
+        self.type = message["media_type"] \
+            if message.get("media_type") == new.type else new.type
+        if new.type == "sticker":
+            self.sticker_emoji = message.get("sticker_emoji")
+        if new.duration:
+            self.duration = new.duration
+
+
+def export_text(messages: int, seed: int = 0) -> str:
+    """Текст json массива сообщений синтетического личного чата.
+
+    :param messages: число сообщений.
+    :param seed: зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    users = [("Me", "user1"), ("Friend", "user2")]
+    return json.dumps([synthetic_message(rnd, i, CHAT["id"], users)
+                       for i in range(messages)], ensure_ascii=False)
+
+
+def message_bytes(text: str, create) -> float:
+    """Память сообщений в байтах на сообщение.
+
+    :param text: текст json массива сообщений.
+    :param create: функция, создающая список сообщений по списку структур.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        messages = create(json.loads(text))
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size / len(messages)
+
+
+def dict_messages(structures: list) -> list:
+    """Сообщения в прежнем представлении."""
+    return [DictMessage(message, CHAT) for message in structures]
+
+
+def slotted_messages(structures: list, keep_text: bool = True) -> list:
+    """Сообщения класса Message."""
+    return Chat(CHAT, structures, keep_text).messages
+
+
+def creator_bytes(text: str, keep_text: bool = None) -> float:
+    """Память сообщений, разобранных start_creator, в байтах на сообщение.
+
+    Так меряется путь, которым файл разбирает приложение: потоковый разбор
+    без промежуточного списка структур.
+    :param text: текст json массива сообщений.
+    :param keep_text: сохранять ли тексты сообщений.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "result.json"
+        path.write_text(json.dumps({"chats": {"list": [
+                {**CHAT, "name": "Friend", "messages": []}]}})
+                .replace("[]", text), encoding="utf-8")
+        # кэши интернирования и дат заполняются до замера, как при разборе
+        # большого файла, где их размер ничтожен по сравнению с сообщениями
+        start_creator(str(path), keep_text=keep_text)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            chats = start_creator(str(path), keep_text=keep_text)
+            gc.collect()
+            size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return size / len(chats[0].messages)
+
+
+def main(messages: int = 200_000):
+    """Печатает память на сообщение и ее оценку для 10 млн сообщений."""
+    text = export_text(messages)
+    results = {
+        "dict": message_bytes(text, dict_messages),
+        "slots": message_bytes(text, slotted_messages),
+        "slots, no text": message_bytes(
+                text, lambda structures: slotted_messages(structures,
+                                                          False)),
+        "start_creator, no text": creator_bytes(text, False),
+    }
+    for name, size in results.items():
+        print(f"{name}: {size:.0f} bytes/message, "
+              f"{size * 10_000_000 / (1 << 30):.2f} GB per 10M messages, "
+              f"{results['dict'] / size:.1f}x less than dict")
+    structures = json.loads(text)
+    start = time.perf_counter()
+    slotted_messages(structures)
+    print(f"creation: {messages / (time.perf_counter() - start):.0f} "
+          f"messages/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
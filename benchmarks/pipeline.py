@@ -0,0 +1,101 @@
+"""Пиковая память потокового анализа в зависимости от размера экспорта.
+
+Сообщения синтетического экспорта создаются на лету и сразу передаются в
+pipeline.analyse_stream, поэтому экспорт любого размера не записывается на
+диск. Размер экспорта считается по среднему размеру сообщения в файле.
+
+Запуск: ``python -m benchmarks.pipeline [размер экспорта в ГБ]``.
+"""
+import datetime
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.imports import ROOT
+from benchmarks.synthetic import synthetic_message
+
+
+CHATS = 10
+SPAN_DAYS = 5 * 365   # период переписки каждого чата
+TIME_GAP = (datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc))
+
+
+def message_bytes(sample: int = 1000) -> float:
+    """Средний размер сообщения в файле экспорта в байтах.
+
+    :param sample: по скольким сообщениям считать.
+    """
+    rnd = random.Random(0)
+    users = [("Me", "user1"), ("Friend", "user2")]
+    return sum(len(json.dumps(synthetic_message(rnd, i, 2, users),
+                              ensure_ascii=False, indent=1)) + 2
+               for i in range(sample)) / sample
+
+
+def synthetic_stream(messages: int, chats: int = CHATS, seed: int = 0):
+    """Выдает чаты синтетического экспорта с генераторами сообщений.
+
+    Сообщения каждого чата равномерно распределены по ``SPAN_DAYS`` дням,
+    так что от числа сообщений зависит только их плотность.
+    :param messages: общее число сообщений.
+    :param chats: число чатов.
+    :param seed: зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    for chat_num in range(chats):
+        chat_id = 1000 + chat_num
+        size = messages // chats + (chat_num < messages % chats)
+        users = [("Me", "user1"), (f"Friend {chat_num}", f"user{chat_id}")]
+        minutes = SPAN_DAYS * 24 * 60 / max(size, 1)
+        yield ({"type": "personal_chat", "id": chat_id},
+               (synthetic_message(rnd, i, chat_id, users, minutes)
+                for i in range(size)))
+
+
+def stream_peak_rss(messages: int) -> int:
+    """Пиковая память процесса после анализа синтетического потока.
+
+    :param messages: число сообщений потока.
+    :return: максимальный размер резидентной памяти в байтах.
+    """
+    from tganalyzer.core.analyzer import DEPENDENCIES
+    from tganalyzer.core.pipeline import analyse_stream
+    analyse_stream(synthetic_stream(messages), TIME_GAP,
+                   dict.fromkeys(DEPENDENCIES, True))
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(messages: int) -> int:
+    """Пиковая память анализа потока в отдельном интерпретаторе.
+
+    :param messages: число сообщений потока.
+    """
+    code = ("from benchmarks.pipeline import stream_peak_rss; "
+            f"print(stream_peak_rss({messages}))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                            text=True, check=True, cwd=ROOT)
+    return int(result.stdout)
+
+
+def main(size_gb: float = 5):
+    """Печатает пиковую память и скорость анализа.
+
+    Меряются несколько размеров экспорта вплоть до заданного.
+    """
+    per_message = message_bytes()
+    for fraction in (0.001, 0.01, 0.1, 1):
+        messages = int(size_gb * fraction * (1 << 30) / per_message)
+        start = time.perf_counter()
+        rss = measure(messages)
+        elapsed = time.perf_counter() - start
+        print(f"{size_gb * fraction:g} GB ({messages} messages): "
+              f"peak RSS {rss / (1 << 20):.0f} MB, "
+              f"{messages / elapsed:.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main(*map(float, sys.argv[1:]))
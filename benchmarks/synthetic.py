@@ -0,0 +1,107 @@
+"""Генерация синтетического экспорта Telegram для бенчмарков."""
+import datetime
+import json
+import random
+
+
+START = datetime.datetime(2015, 1, 1)
+WORDS = ("привет как дела что нового hello world ok да нет завтра "
+         "сегодня встреча в кафе see you soon").split()
+MEDIA = [("sticker", {"sticker_emoji": "🙂"}),
+         ("voice_message", {"duration_seconds": 7}),
+         ("video_message", {"duration_seconds": 12}),
+         ("video_file", {"duration_seconds": 60}),
+         ("animation", {})]
+
+
+def synthetic_message(rnd: random.Random, i: int, chat_id: int,
+                      users: list[tuple[str, str]],
+                      minutes: float = 17) -> dict:
+    """Создает одно сообщение, похожее на сообщение экспорта.
+
+    :param rnd: генератор случайных чисел.
+    :param i: порядковый номер сообщения (определяет дату).
+    :param chat_id: id чата.
+    :param users: пары (имя, from_id) участников чата.
+    :param minutes: промежуток между сообщениями в минутах.
+    """
+    date = START + datetime.timedelta(seconds=round(60 * minutes * i))
+    name, from_id = users[i % len(users)]
+    text = " ".join(rnd.choices(WORDS, k=rnd.randint(0, 12)))
+    message = {
+        "id": i + 1,
+        "type": "message",
+        "date": date.isoformat(),
+        "date_unixtime": str(int(date.timestamp())),
+        "from": name,
+        "from_id": from_id,
+        "text": text,
+        "text_entities": [{"type": "plain", "text": text}] if text else [],
+    }
+    kind = rnd.random()
+    if kind < 0.1:
+        media_type, extra = rnd.choice(MEDIA)
+        message.update(file="(File not included)", media_type=media_type,
+                       mime_type="application/octet-stream", **extra)
+    elif kind < 0.15:
+        message.update(photo="(File not included)", width=800, height=600)
+    elif kind < 0.2:
+        message["text"] = [{"type": "bold", "text": "note:"}, " " + text]
+        message["text_entities"] = [{"type": "bold", "text": "note:"},
+                                    {"type": "plain", "text": " " + text}]
+    elif kind < 0.22:
+        message["edited"] = (date + datetime.timedelta(minutes=1)).isoformat()
+        message["edited_unixtime"] = str(int(date.timestamp()) + 60)
+    elif kind < 0.225:
+        message = {"id": i + 1, "type": "service",
+                   "date": message["date"],
+                   "date_unixtime": message["date_unixtime"],
+                   "actor": name, "actor_id": from_id,
+                   "action": "phone_call", "duration_seconds": 42,
+                   "text": "", "text_entities": []}
+    return message
+
+
+def synthetic_export(messages: int, chats: int = 100, seed: int = 0) -> dict:
+    """Создает экспорт с заданным числом сообщений.
+
+    Размеры чатов распределены неравномерно: первый чат самый большой.
+    :param messages: общее число сообщений.
+    :param chats: число чатов.
+    :param seed: зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(chats)]
+    total = sum(weights)
+    sizes = [int(messages * w / total) for w in weights]
+    sizes[0] += messages - sum(sizes)
+    chat_list = []
+    for chat_num, size in enumerate(sizes):
+        chat_id = 1000 + chat_num
+        if chat_num % 2:
+            chat = {"name": f"Group {chat_num}", "type": "private_group",
+                    "id": chat_id}
+            users = [(f"Member {j}", f"user{chat_id * 100 + j}")
+                     for j in range(2 + chat_num % 7)]
+        else:
+            chat = {"type": "personal_chat", "id": chat_id}
+            users = [("Me", "user1"), (f"Friend {chat_num}",
+                                       f"user{chat_id}")]
+        chat["messages"] = [synthetic_message(rnd, i, chat_id, users)
+                            for i in range(size)]
+        chat_list.append(chat)
+    return {"about": "Synthetic export",
+            "chats": {"about": "This page lists all chats from this export.",
+                      "list": chat_list}}
+
+
+def write_synthetic_export(path, messages: int, chats: int = 100):
+    """Записывает синтетический экспорт в файл так же, как Telegram Desktop.
+
+    :param path: путь к файлу.
+    :param messages: общее число сообщений.
+    :param chats: число чатов.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_export(messages, chats), f,
+                  ensure_ascii=False, indent=1)
@@ -0,0 +1,79 @@
+"""Память и точность счетчика частых слов (words.WordCounter).
+
+Поток слов подчиняется закону Ципфа, как слова живой речи: частота слова
+обратно пропорциональна его номеру в словаре. Счетчик с ограниченной
+емкостью сравнивается с точным (``capacity=None``) по памяти, скорости и
+совпадению топа слов. Отдельно меряется скорость разбора текстов на слова
+(words.tokenize).
+
+Запуск: ``python -m benchmarks.words [число слов] [размер словаря]``.
+"""
+import itertools
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from tganalyzer.core.words import CAPACITY, WordCounter, tokenize
+from benchmarks.messages import export_text
+
+
+TOP = 10   # сколько частых слов сравнивается
+
+
+def zipf_words(words: int, vocabulary: int, seed: int = 0) -> list[str]:
+    """Поток слов с частотами по закону Ципфа.
+
+    :param words: длина потока.
+    :param vocabulary: число разных слов.
+    :param seed: зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    weights = itertools.accumulate(1 / (i + 1) for i in range(vocabulary))
+    return rnd.choices([f"слово{i}" for i in range(vocabulary)],
+                       cum_weights=list(weights), k=words)
+
+
+def count(stream: list[str], capacity: int) -> tuple[WordCounter, int, float]:
+    """Считает слова потока.
+
+    :param stream: поток слов.
+    :param capacity: емкость счетчика.
+    :return: счетчик, его пиковая память в байтах и время подсчета.
+    """
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        counter = WordCounter(capacity)
+        counter.update(stream)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return counter, peak, elapsed
+
+
+def main(words: int = 2_000_000, vocabulary: int = 500_000):
+    """Печатает память, скорость и совпадение топа обоих счетчиков."""
+    stream = zipf_words(words, vocabulary)
+    exact, _, _ = count(stream, None)
+    expected = [word for word, _ in exact.most_common(TOP)]
+    for name, capacity in (("exact", None), ("space-saving", CAPACITY)):
+        counter, peak, elapsed = count(stream, capacity)
+        top = [word for word, _ in counter.most_common(TOP)]
+        print(f"{name}: {len(counter)} words kept, "
+              f"peak {peak / (1 << 20):.1f} MB, "
+              f"{words / elapsed:.0f} words/s, "
+              f"top-{TOP} recall {len(set(top) & set(expected)) / TOP:.0%}")
+    texts = [message["text"] for message in json.loads(export_text(100_000))
+             if isinstance(message["text"], str)]
+    start = time.perf_counter()
+    for text in texts:
+        tokenize(text)
+    print(f"tokenize: {len(texts) / (time.perf_counter() - start):.0f} "
+          f"messages/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -117,6 +117,23 @@ def task_coverage():
     }
 
 
+def task_bench():
+    """Run benchmarks."""
+    return {
+        "actions": [
+            "python -m benchmarks.json_backends",
+            "python -m benchmarks.analyzer",
+            "python -m benchmarks.charts",
+            "python -m benchmarks.imports",
+            "python -m benchmarks.classify",
+            "python -m benchmarks.messages",
+            "python -m benchmarks.pipeline",
+            "python -m benchmarks.words",
+        ],
+        'verbosity': 2,
+    }
+
+
 def task_wheel():
     """Build a wheel (binary distribution)."""
     return {
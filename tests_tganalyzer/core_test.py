@@ -1,19 +1,51 @@
+import collections
+import copy
 import datetime
+import importlib.util
+import json
+import os
 from pathlib import Path
+import pickle
+import random
+import re
+import shutil
+import subprocess
 import sys
+import tempfile
 import unittest
+from unittest import mock
+from xml.etree import ElementTree
 import pytz
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 # import tganalyzer
-from tganalyzer.core.creator import start_creator
-from tganalyzer.core.analyzer import start_analyses
+from tganalyzer.core.creator import (start_creator, Extraction, Chat,
+                                     LazyChat, scan_chats, load_chats,
+                                     decode_dates, classify)
+from tganalyzer.core.jsonstream import available_backends, get_backend
+from tganalyzer.core.columnar import ColumnarChat
+from tganalyzer.core.cache import ExportCache
+from tganalyzer.core.aggregates import ChatAggregates
+from tganalyzer.core import incremental, pipeline
+from tganalyzer.core.words import WordCounter, tokenize
+from tganalyzer.core.analyzer import DEPENDENCIES, start_analyses
+from tganalyzer.cmd import select_chats, start_cmd
+from tganalyzer.html_export import (CHART_MODES, ChartJob, FigurePool,
+                                    html_export, _date_series)
+from tganalyzer.html_export.cache import ChartCache
+from tganalyzer.html_export.inline import minify_svg
+from benchmarks import classify as classify_bench
+from benchmarks import messages as messages_bench
+from benchmarks.imports import import_times
+from benchmarks.synthetic import write_synthetic_export
 # from pprint import pprint
 
 PATH = str(Path(__file__).resolve().parent / "data.json")
 FEATURES = ["symb", "word", "msg", "voice_message", "video_message",
             "video_file", "photo", "day_night"]
 CHAT_ID = 1012308965
+TIME_GAP = [datetime.datetime(2019, 1, 1, 0, 0, 0, 0, pytz.UTC),
+            datetime.datetime(2025, 1, 1, 0, 0, 0, 0, pytz.UTC)]
 
 class CoreTest(unittest.TestCase):
     def setUp(self):
@@ -53,3 +85,971 @@ class CoreTest(unittest.TestCase):
 
     def test_msg(self):
         self.__test_counted_feature("msg", (2, 4, 4, 5))
+
+
+class StreamCreatorTest(unittest.TestCase):
+    @staticmethod
+    def __dump(chats):
+        return [(chat.id, chat.name, chat.type,
+                 [tuple(getattr(message, name)
+                        for name in message.__slots__)
+                  for message in chat.messages])
+                for chat in chats]
+
+    def test_stream_matches_load(self):
+        extractor = Extraction(PATH)
+        expected = self.__dump(Chat(chat) for chat in extractor.chats_ex())
+        for chunk_size in (7, 4096):
+            with mock.patch("tganalyzer.core.jsonstream.CHUNK_SIZE",
+                            chunk_size):
+                self.assertEqual(self.__dump(start_creator(PATH)), expected)
+
+    def test_backends_agree(self):
+        expected = self.__dump(start_creator(PATH, backend="json"))
+        for backend in available_backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(
+                    self.__dump(start_creator(PATH, backend=backend)),
+                    expected)
+                extractor = Extraction(PATH, backend=backend)
+                self.assertEqual(
+                    self.__dump(Chat(chat) for chat in extractor.chats_ex()),
+                    expected)
+
+    def test_backend_choice(self):
+        with mock.patch.dict("os.environ", {"TGANALYZER_JSON": "json"}):
+            self.assertEqual(get_backend().name, "json")
+        self.assertEqual(get_backend("auto").name, available_backends()[0])
+        with self.assertRaises(ValueError):
+            get_backend("yaml")
+
+    def test_progress_in_bytes(self):
+        progress = mock.Mock()
+        with mock.patch("tganalyzer.core.jsonstream.CHUNK_SIZE", 512):
+            start_creator(PATH, progress)
+        percents = [call.args[0] for call in progress.emit.call_args_list]
+        self.assertGreater(len(percents), 2)
+        self.assertEqual(percents, sorted(set(percents)))
+        self.assertEqual(percents[-1], 100)
+
+    def test_parallel_creator(self):
+        data = json.loads(Path(PATH).read_text(encoding="utf-8"))
+        chat = data["chats"]["list"][0]
+        late = dict(chat, id=7, messages=[dict(message, from_id="user1")
+                                          for message in chat["messages"]])
+        late["messages"][-1].update({"from": "Late", "from_id": "user7"})
+        empty = {"name": "e", "type": "private_group", "id": 8,
+                 "messages": []}
+        data["chats"]["list"] += [late, empty, chat]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "result.json"
+            path.write_text(json.dumps(data, ensure_ascii=False, indent=1),
+                            encoding="utf-8")
+            expected = self.__dump(start_creator(path))
+            self.assertEqual(expected[1][1], "Late")
+            progress = mock.Mock()
+            with mock.patch("tganalyzer.core.jsonstream.CHUNK_SIZE", 512):
+                chats = start_creator(path, progress, workers=2)
+                columnar = start_creator(path, workers=2, columnar=True)
+        self.assertEqual(self.__dump(chats), expected)
+        self.assertEqual(progress.emit.call_args_list[-1].args, (100,))
+        self.assertEqual(
+            [(chat.id, chat.name, chat.type,
+              [(view.author, view.send_time, view.type, view.duration,
+                view.text_len, view.word_count) for view in chat.messages])
+             for chat in columnar],
+            [(chat.id, chat.name, chat.type,
+              [(msg.author, msg.send_time, msg.type, msg.duration,
+                msg.text_len, msg.word_count) for msg in chat.messages])
+             for chat in chats])
+
+    def test_scan_and_load(self):
+        data = json.loads(Path(PATH).read_text(encoding="utf-8"))
+        chat = data["chats"]["list"][0]
+        service = dict(chat["messages"][6], action="pin_message")
+        late = dict(chat, id=7, messages=[dict(message, from_id="user1")
+                                          for message in chat["messages"]]
+                    + [dict(service, id=10 ** 6)])
+        late["messages"][-2].update({"from": "Late", "from_id": "user7"})
+        empty = {"name": "e", "type": "private_group", "id": 8,
+                 "messages": []}
+        data["chats"]["list"] += [late, empty, chat]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "result.json"
+            path.write_text(json.dumps(data, ensure_ascii=False, indent=1),
+                            encoding="utf-8")
+            expected = start_creator(path)
+            for chunk_size in (512, 1 << 20):
+                with mock.patch("tganalyzer.core.jsonstream.CHUNK_SIZE",
+                                chunk_size):
+                    lazy = scan_chats(path)
+                    self.assertEqual(
+                        [(chat.id, chat.name, chat.type, len(chat))
+                         for chat in lazy],
+                        [(chat.id, chat.name, chat.type, len(chat))
+                         for chat in expected])
+                    self.assertEqual(self.__dump(load_chats(lazy)),
+                                     self.__dump(expected))
+            progress = mock.Mock()
+            chats = load_chats(lazy[1:3] + [expected[0]], progress, True, 2)
+        self.assertEqual(progress.emit.call_args.args, (100,))
+        self.assertIs(chats[2], expected[0])
+        self.assertIsInstance(chats[0], ColumnarChat)
+        self.assertEqual(
+            [view.send_time for view in chats[0].messages],
+            [message.send_time for message in expected[1].messages])
+
+    def test_tricky_json(self):
+        data = {"chats": {"list": [{
+            "messages": [{"id": 1, "type": "message",
+                          "date": "2024-01-01T00:00:00",
+                          "from": "a", "from_id": "user1",
+                          "text": "}]{[\\\" ☃ \\"}],
+            "type": "private_group", "id": 5, "name": "x"}]},
+            "about": [1.5e3, None, True]}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "result.json"
+            path.write_text(json.dumps(data, ensure_ascii=False, indent=1),
+                            encoding="utf-8")
+            with mock.patch("tganalyzer.core.jsonstream.CHUNK_SIZE", 3):
+                chats = start_creator(path)
+        self.assertEqual(len(chats), 1)
+        self.assertEqual(chats[0].id, 5)
+        self.assertEqual(chats[0].messages[0].text,
+                         "}]{[\\\" ☃ \\")
+
+
+class MessageTest(unittest.TestCase):
+    def test_fields(self):
+        chat = start_creator(PATH)[0]
+        lean = start_creator(PATH, keep_text=False)[0]
+        for message, other in zip(chat.messages, lean.messages):
+            self.assertFalse(hasattr(message, "__dict__"))
+            self.assertEqual(message.send_time.tzinfo,
+                             datetime.timezone.utc)
+            copy_ = pickle.loads(pickle.dumps(message))
+            for field in ("author", "send_time", "type", "text", "edited",
+                          "forwarded", "duration", "text_len",
+                          "word_count"):
+                self.assertEqual(getattr(copy_, field),
+                                 getattr(message, field))
+                if field != "text":
+                    self.assertEqual(getattr(other, field),
+                                     getattr(message, field))
+            self.assertEqual(other.text, "" if not message.text else None)
+        sticker = next(message for message in chat.messages
+                       if message.type == "sticker")
+        self.assertTrue(sticker.edited)
+        self.assertIsInstance(sticker.edit_time, datetime.datetime)
+        with self.assertRaises(AttributeError):
+            chat.messages[0].edit_time
+        # одинаковые авторы - один объект
+        self.assertIs(chat.messages[1].author, chat.messages[2].author)
+
+    def test_decode_dates(self):
+        dates = ["1969-12-31T23:59:59", "2000-02-29T12:00:00",
+                 "2024-05-24T06:12:44", "2038-01-19T03:14:08"]
+        # даты без часового пояса считаются временем UTC
+        self.assertEqual(decode_dates(dates),
+                         [int(datetime.datetime.fromisoformat(
+                                 date + "+00:00").timestamp())
+                          for date in dates])
+        data = Extraction(PATH).chats_ex()[0]
+        chat = Chat(data)
+        edited = [message for message in data["messages"]
+                  if "edited" in message]
+        self.assertEqual(
+                [message.edit_time for message in chat.messages
+                 if message.edited],
+                [datetime.datetime.fromisoformat(message["edited"])
+                 .replace(tzinfo=datetime.timezone.utc)
+                 for message in edited])
+
+    def test_memory(self):
+        text = messages_bench.export_text(20_000)
+        old = messages_bench.message_bytes(text,
+                                           messages_bench.dict_messages)
+        new = messages_bench.message_bytes(
+                text, lambda structures: messages_bench.slotted_messages(
+                        structures, keep_text=False))
+        with_text = messages_bench.message_bytes(
+                text, messages_bench.slotted_messages)
+        self.assertGreaterEqual(old / new, 3)
+        self.assertLess(with_text, old)
+        # то же при разборе файла, которым пользуется приложение
+        self.assertGreaterEqual(
+                old / messages_bench.creator_bytes(text, keep_text=False), 3)
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_export_types(self):
+        messages = [message for message
+                    in Extraction(PATH).chats_ex()[0]["messages"]
+                    if message["type"] != "service"
+                    or message["action"] in ("phone_call", "group_call")]
+        expected = ["bot_usage", "simple_text", "simple_text", "simple_text",
+                    "photo", "video_file", "single_call", "sticker",
+                    "voice_message", "video_message", "video_message",
+                    "simple_text", "simple_text", "photo", "simple_text"]
+        self.assertEqual([classify(message) for message in messages],
+                         expected)
+        self.assertEqual([message.type
+                          for message in start_creator(PATH)[0].messages],
+                         expected)
+        self.assertEqual([classify_bench.scan_type(message)
+                          for message in messages], expected)
+
+    def test_matches_key_scan(self):
+        messages = classify_bench.sample_messages(2000)
+        types = [classify(message) for message in messages]
+        self.assertEqual(types, [classify_bench.scan_type(message)
+                                 for message in messages])
+        # встречаются все типы
+        self.assertEqual(set(types), {
+                "simple_text", "sticker", "voice_message", "video_message",
+                "video_file", "animation", "audio_file", "file", "photo",
+                "poll", "contact", "location", "game", "bot_usage",
+                "unknown", "single_call", "group_call"})
+
+
+class ColumnarTest(unittest.TestCase):
+    def setUp(self):
+        self.chats = start_creator(PATH)
+        self.columnar = start_creator(PATH, columnar=True)
+
+    def test_views_match_messages(self):
+        for chat, col in zip(self.chats, self.columnar):
+            self.assertEqual((chat.id, chat.name, chat.type),
+                             (col.id, col.name, col.type))
+            self.assertEqual(len(chat.messages), len(col.messages))
+            for msg, view in zip(chat.messages, col.messages):
+                for field in ("author", "send_time", "type", "duration",
+                              "text_len", "word_count"):
+                    self.assertEqual(getattr(msg, field),
+                                     getattr(view, field))
+                self.assertIsNone(view.text)
+        col = ColumnarChat.from_chat(self.chats[0], keep_text=True)
+        self.assertEqual([view.text for view in col.messages],
+                         [msg.text for msg in self.chats[0].messages])
+
+    @classmethod
+    def _ordered(cls, data):
+        if isinstance(data, dict):
+            return [(key, cls._ordered(value)) for key, value in data.items()]
+        return data
+
+    def test_analyses_match(self):
+        features = {feature: True for feature in FEATURES}
+        expected, _ = start_analyses(self.chats, TIME_GAP, features)
+        stats, chats = start_analyses(self.columnar, TIME_GAP, features)
+        self.assertEqual(self._ordered(stats), self._ordered(expected))
+        self.assertIs(chats[CHAT_ID], self.columnar[0])
+
+    def test_parallel_analyses(self):
+        features = {feature: True for feature in FEATURES}
+        chats = self.chats + self.columnar + [
+            ColumnarChat.from_chat(chat) for chat in self.chats]
+        for i, chat in enumerate(chats):
+            chat.id = i
+        progress = mock.Mock()
+        expected, _ = start_analyses(chats, TIME_GAP, features,
+                                     progress=progress)
+        self.assertEqual([call.args[0] for call in progress.emit.mock_calls],
+                         [33, 66, 100])
+        progress = mock.Mock()
+        stats, parsed = start_analyses(chats, TIME_GAP, features,
+                                       workers=2, progress=progress)
+        self.assertEqual(self._ordered(stats), self._ordered(expected))
+        self.assertEqual(list(parsed), list(range(len(chats))))
+        self.assertEqual([call.args[0] for call in progress.emit.mock_calls],
+                         [33, 66, 100])
+
+    def test_batch_order_and_range(self):
+        media = [{}, {"media_type": "voice_message", "duration_seconds": 3},
+                 {"photo": "x"}, {"media_type": "video_file"}]
+        messages = [dict({"id": i, "type": "message",
+                          "date": f"2024-03-{1 + i // 7:02}T{i * 5 % 24:02}"
+                                  f":00:00",
+                          "from": ("cba" if i < 14 else "abc")[i % 3],
+                          "from_id": "user0",
+                          "text": "x " * (i % 4)}, **media[i % 4])
+                    for i in range(60)]
+        chat = Chat({"name": "g", "type": "private_group", "id": 1},
+                    messages)
+        features = {feature: True for feature in FEATURES}
+        for day in (1, 2, 4):
+            time_gap = [datetime.datetime(2024, 3, day, 3, tzinfo=pytz.UTC),
+                        datetime.datetime(2024, 3, 8, 1, tzinfo=pytz.UTC)]
+            expected, _ = start_analyses([chat], time_gap, features)
+            stats, _ = start_analyses([ColumnarChat.from_chat(chat)],
+                                      time_gap, features)
+            self.assertEqual(self._ordered(stats), self._ordered(expected))
+
+    def test_day_cube(self):
+        media = [{}, {"media_type": "voice_message", "duration_seconds": 3},
+                 {"photo": "x"}, {"media_type": "video_file"},
+                 {"media_type": "voice_message", "duration_seconds": 5}]
+        messages = [dict({"id": i, "type": "message",
+                          "date": f"2024-03-{1 + i // 9:02}T{i * 7 % 24:02}"
+                                  f":{i % 60:02}:00",
+                          "from": "cbad"[i % 3 + i // 50],
+                          "from_id": "user0",
+                          "text": "x " * (i % 4)}, **media[i % 5])
+                    for i in range(80)]
+        chats = self.chats + [
+            Chat({"name": "g", "type": "private_group", "id": 1}, messages)]
+        columnar = [ColumnarChat.from_chat(chat) for chat in chats]
+        cells = [ChatAggregates.from_chat(chat) for chat in chats]
+        features = {feature: True for feature in FEATURES}
+        for first, last in ((datetime.date(2019, 1, 1),
+                             datetime.date(2024, 12, 31)),
+                            (datetime.date(2024, 3, 2),
+                             datetime.date(2024, 3, 5)),
+                            (datetime.date(2024, 3, 4),
+                             datetime.date(2024, 5, 24)),
+                            (datetime.date(2024, 3, 3),
+                             datetime.date(2024, 3, 3))):
+            time_gap = [
+                datetime.datetime.combine(first, datetime.time.min,
+                                          pytz.UTC),
+                datetime.datetime.combine(last, datetime.time.max,
+                                          pytz.UTC)]
+            expected, _ = start_analyses(chats, time_gap, features)
+            for parsed in (columnar, cells):
+                stats, _ = start_analyses(parsed, time_gap, features)
+                self.assertEqual(self._ordered(stats),
+                                 self._ordered(expected))
+        # таблица строится один раз на чат
+        self.assertIs(columnar[0].day_cube(), columnar[0].day_cube())
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ExportCache(Path(self.tmp.name) / "cache")
+        self.path = Path(self.tmp.name) / "result.json"
+        self.path.write_bytes(Path(PATH).read_bytes())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @staticmethod
+    def __dump(chats):
+        return [(chat.id, chat.name, chat.type, chat.authors,
+                 {name: list(column) for name, column in chat.columns.items()})
+                for chat in chats]
+
+    def __creator(self, path):
+        return start_creator(path, columnar=True, cache=self.cache)
+
+    def test_load_without_parsing(self):
+        expected = self.__dump(self.__creator(self.path))
+        with mock.patch("tganalyzer.core.creator.iter_creator") as creator:
+            self.assertEqual(self.__dump(self.__creator(self.path)), expected)
+            # другое время изменения, но то же содержимое
+            os.utime(self.path, (0, 0))
+            copy = Path(self.tmp.name) / "copy.json"
+            copy.write_bytes(self.path.read_bytes())
+            self.assertEqual(self.__dump(self.__creator(self.path)), expected)
+            self.assertEqual(self.__dump(self.__creator(copy)), expected)
+        creator.assert_not_called()
+        with self.assertRaises(ValueError):
+            start_creator(self.path, cache=self.cache)
+
+    @unittest.skipUnless(importlib.util.find_spec("PySide6"),
+                         "PySide6 is not installed")
+    def test_gui_reopen(self):
+        from tganalyzer import gui
+        path = str(self.path)
+        with mock.patch.dict("os.environ", {"TGANALYZER_CACHE":
+                                            str(self.cache.directory)}):
+            chats = gui.open_export(path)
+            self.assertTrue(all(isinstance(chat, LazyChat)
+                                for chat in chats))
+            # пока не все чаты разобраны, экспорт в кэш не попадает
+            gui.store_export(path, chats)
+            self.assertIsNone(self.cache.load(path))
+            chats = load_chats(chats, columnar=True)
+            gui.store_export(path, chats)
+            with mock.patch.object(gui, "scan_chats") as scan:
+                reopened = gui.open_export(path)
+            scan.assert_not_called()
+        self.assertEqual(self.__dump(reopened), self.__dump(chats))
+
+    def test_invalidation(self):
+        self.__creator(self.path)
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        data["chats"]["list"][0]["messages"].pop()
+        self.path.write_text(json.dumps(data), encoding="utf-8")
+        self.assertIsNone(self.cache.load(self.path))
+        self.assertEqual(len(self.__creator(self.path)[0]), 14)
+        self.cache.clear(self.path)
+        self.assertIsNone(self.cache.load(self.path))
+
+    def test_lru_eviction(self):
+        paths = [Path(self.tmp.name) / f"{i}.json" for i in range(3)]
+        for i, path in enumerate(paths):
+            path.write_bytes(self.path.read_bytes() + b" " * i)
+            self.__creator(path)
+        self.cache.load(paths[0])
+        entry_size = max(meta["bytes"] for _, meta in self.cache._entries())
+        self.cache.size_limit = 2 * entry_size
+        self.cache.evict()
+        self.assertIsNotNone(self.cache.load(paths[0]))
+        self.assertIsNone(self.cache.load(paths[1]))
+        self.assertIsNotNone(self.cache.load(paths[2]))
+
+
+class IncrementalTest(unittest.TestCase):
+    TIME_GAP = [datetime.datetime(2019, 1, 1, tzinfo=pytz.UTC),
+                datetime.datetime(2024, 12, 31, 23, 59, 59, 999999,
+                                  tzinfo=pytz.UTC)]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = incremental.AggregateStore(Path(self.tmp.name) / "agg")
+        data = json.loads(Path(PATH).read_text(encoding="utf-8"))
+        media = [{}, {"media_type": "voice_message", "duration_seconds": 3},
+                 {"photo": "x"}, {"media_type": "video_file"}]
+        group = {"name": "g", "type": "private_group", "id": 1,
+                 "messages": [dict({"id": i, "type": "message",
+                                    "date": f"2024-03-{1 + i // 7:02}T"
+                                            f"{i * 5 % 24:02}:00:00",
+                                    "from": "cbad"[i % 3 + i // 50],
+                                    "from_id": "user0",
+                                    "text": "x " * (i % 4)}, **media[i % 4])
+                              for i in range(60)]}
+        self.new = copy.deepcopy(data)
+        self.new["chats"]["list"].append(group)
+        self.old = copy.deepcopy(self.new)
+        self.old["chats"]["list"][0]["messages"][9:] = []
+        self.old["chats"]["list"][1]["messages"][40:] = []
+        self.new["chats"]["list"].append(dict(group, id=2, name="h"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def __write(self, data):
+        path = Path(self.tmp.name) / "result.json"
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=1),
+                        encoding="utf-8")
+        return path
+
+    def test_matches_full_analysis(self):
+        features = {feature: True for feature in FEATURES}
+        seen = []
+        new_messages = incremental._new_messages
+
+        def counting(*args):
+            for message in new_messages(*args):
+                seen.append(message["id"])
+                yield message
+
+        with mock.patch("tganalyzer.core.jsonstream.CHUNK_SIZE", 512):
+            incremental.start_incremental(self.__write(self.old),
+                                          store=self.store)
+            path = self.__write(self.new)
+            with mock.patch.object(incremental, "_new_messages", counting):
+                chats = incremental.start_incremental(path, store=self.store)
+            expected, _ = start_analyses(start_creator(path, columnar=True),
+                                         self.TIME_GAP, features)
+        self.assertEqual(seen, [288457, 288458, 288459, 288460, 288461,
+                                288465] + list(range(40, 60))
+                         + list(range(60)))
+        self.assertEqual([chat.messages_num for chat in chats], [15, 60, 60])
+        stats, _ = start_analyses(chats, self.TIME_GAP, features)
+        self.assertEqual(ColumnarTest._ordered(stats),
+                         ColumnarTest._ordered(expected))
+        with self.assertRaises(ValueError):
+            start_analyses(chats, TIME_GAP, features)
+        # состояние заменено новым
+        self.assertEqual(len(list(self.store._states())), 1)
+        self.assertEqual(self.store.find(2)[1][2].last_id, 59)
+
+
+class PipelineTest(unittest.TestCase):
+    # промежуток не совпадает с границами суток
+    TIME_GAP = [datetime.datetime(2015, 1, 3, 7, 30, tzinfo=pytz.UTC),
+                datetime.datetime(2015, 1, 20, 13, 0, 5, tzinfo=pytz.UTC)]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "result.json"
+        write_synthetic_export(self.path, 3000, chats=5)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_analyses(self):
+        features = dict.fromkeys(DEPENDENCIES, True)
+        # опция без пакетной функции считается по сообщениям частей
+        msg = {key: value for key, value in DEPENDENCIES["msg"].items()
+               if key != "batch_func"}
+        for patched in ({}, {"msg": msg}):
+            with self.subTest(patched=list(patched)), \
+                    mock.patch.dict(DEPENDENCIES, patched), \
+                    mock.patch.object(pipeline, "PART_MESSAGES", 100):
+                expected, parsed = start_analyses(
+                        start_creator(self.path, columnar=True,
+                                      keep_text=True),
+                        self.TIME_GAP, features)
+                stats, chats = pipeline.start_pipeline(
+                        self.path, self.TIME_GAP, features)
+                self.assertEqual(ColumnarTest._ordered(stats),
+                                 ColumnarTest._ordered(expected))
+                self.assertEqual(
+                        [(chat.id, chat.name, len(chat))
+                         for chat in chats.values()],
+                        [(chat.id, chat.name, len(chat))
+                         for chat in parsed.values()])
+
+    def test_select(self):
+        features = dict.fromkeys(DEPENDENCIES, True)
+        stats, chats = pipeline.start_pipeline(
+                self.path, self.TIME_GAP, features,
+                select=lambda chat: chat.messages_num > 500)
+        self.assertEqual(list(chats), [1000, 1001])
+        self.assertEqual(list(stats["msg"]), [1000, 1001])
+
+    def test_peak_rss_bounded(self):
+        # потоки около 12 и 94 МБ экспорта; сообщения не хранятся, поэтому
+        # память не должна расти с числом сообщений
+        def peak_rss(messages):
+            code = ("from tganalyzer.core import pipeline; "
+                    "pipeline.PART_MESSAGES = 2000; "
+                    "from benchmarks.pipeline import stream_peak_rss; "
+                    f"print(stream_peak_rss({messages}))")
+            result = subprocess.run(
+                    [sys.executable, "-c", code], capture_output=True,
+                    text=True, check=True,
+                    cwd=Path(__file__).resolve().parent.parent)
+            return int(result.stdout)
+
+        small, large = peak_rss(40_000), peak_rss(320_000)
+        self.assertLess(large - small, 4 << 20)
+
+
+class WordsTest(unittest.TestCase):
+    @staticmethod
+    def _zipf(words, vocabulary, seed=0):
+        rnd = random.Random(seed)
+        return rnd.choices([f"w{i}" for i in range(vocabulary)],
+                           [1 / (i + 1) for i in range(vocabulary)],
+                           k=words)
+
+    def test_tokenize(self):
+        self.assertEqual(
+                tokenize("Привет, Ёжик! Кто-то сказал: don't STOP 2024 и "
+                         "я_тоже a b ПРИВЕТ"),
+                ["привет", "ежик", "кто-то", "сказал", "don't", "stop",
+                 "привет"])
+
+    def test_exact(self):
+        stream = self._zipf(5000, 300)
+        expected = collections.Counter(stream)
+        for capacity in (None, 300):
+            counter = WordCounter(capacity)
+            counter.update(stream[:2000])
+            for word in stream[2000:]:
+                counter.add(word)
+            self.assertTrue(counter.exact)
+            self.assertEqual(counter.counts, expected)
+            self.assertEqual(counter.total, len(stream))
+        halves = WordCounter(None)
+        halves.update(stream[:2500])
+        other = WordCounter(None)
+        other.update(stream[2500:])
+        self.assertEqual(halves.merge(other).counts, expected)
+        self.assertEqual(halves.most_common(3),
+                         sorted(expected.items(),
+                                key=lambda it: (-it[1], it[0]))[:3])
+
+    def test_space_saving(self):
+        stream = self._zipf(100_000, 20_000)
+        expected = collections.Counter(stream)
+        counter = WordCounter(500)
+        counter.update(stream)
+        self.assertFalse(counter.exact)
+        self.assertEqual(len(counter), 500)
+        self.assertEqual(sum(counter.counts.values()), counter.total)
+        self.assertEqual(counter.total, len(stream))
+        for word, count in expected.most_common(10):
+            error = counter.errors.get(word, 0)
+            self.assertLessEqual(error, len(stream) / 500)
+            self.assertLessEqual(counter.counts[word] - error, count)
+            self.assertGreaterEqual(counter.counts[word], count)
+        self.assertEqual({word for word, _ in counter.most_common(10)},
+                         {word for word, _ in expected.most_common(10)})
+        copy_ = pickle.loads(pickle.dumps(counter))
+        copy_.update(stream[:100])
+        counter.update(stream[:100])
+        self.assertEqual(copy_.counts, counter.counts)
+
+    def test_feature(self):
+        features = {"msg": True, "top_words": True}
+        expected, _ = start_analyses(start_creator(PATH), TIME_GAP, features)
+        self.assertEqual(
+                list(expected["top_words"][CHAT_ID]["chat"].items())[:2],
+                [("love", 2), ("sought", 2)])
+        self.assertEqual(
+                len(expected["top_words"][CHAT_ID]["users"]), 2)
+        for workers in (None, 2):
+            chats = start_creator(PATH, columnar=True, keep_text=True,
+                                  workers=workers)
+            stats, _ = start_analyses(chats, TIME_GAP, features,
+                                      workers=workers)
+            self.assertEqual(ColumnarTest._ordered(stats),
+                             ColumnarTest._ordered(expected))
+        with self.assertRaises(ValueError):
+            start_analyses(start_creator(PATH, columnar=True), TIME_GAP,
+                           features)
+
+
+class HtmlExportTest(unittest.TestCase):
+    def setUp(self):
+        chats = start_creator(PATH)
+        features = {feature: True for feature in FEATURES}
+        self.stats, parsed_chats = start_analyses(chats, TIME_GAP, features)
+        self.metadata = {"login": "", "chats": parsed_chats,
+                         "time_gap": TIME_GAP}
+
+    def test_parallel_charts(self):
+        metadata, stats = self.metadata, self.stats
+        reports = []
+        for workers in (None, 2):
+            progress = mock.Mock()
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "report.html"
+                html_export(str(path), metadata, stats, workers=workers,
+                            progress=progress)
+                charts = {file.name: file.read_bytes() for file in
+                          (Path(tmp) / "report_html_files").glob("*.svg")}
+                reports.append((charts, path.read_text(encoding="utf-8")))
+            values = [call.args[0] for call in progress.emit.call_args_list]
+            self.assertEqual(len(values), len(charts))
+            self.assertEqual(values, sorted(values))
+            self.assertEqual(values[-1], 100)
+        self.assertEqual(reports[0], reports[1])
+        self.assertIn(f"{CHAT_ID}_msg_date.svg", reports[0][0])
+
+    def test_chart_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ChartCache(Path(tmp) / "charts")
+            files = Path(tmp) / "report_html_files"
+            html_export(str(Path(tmp) / "report.html"), self.metadata,
+                        self.stats, cache=cache)
+            charts = {file.name: file.read_bytes()
+                      for file in files.glob("*.svg")}
+            # общий и единственного чата графики совпадают
+            self.assertLess(len(list(cache.directory.iterdir())),
+                            len(charts))
+            shutil.rmtree(files)
+            progress = mock.Mock()
+            with mock.patch.object(ChartJob, "__call__") as draw:
+                html_export(str(Path(tmp) / "report.html"), self.metadata,
+                            self.stats, theme="dark", progress=progress,
+                            cache=cache)
+            draw.assert_not_called()
+            self.assertEqual({file.name: file.read_bytes()
+                              for file in files.glob("*.svg")}, charts)
+            progress.emit.assert_called_with(100)
+            # другие параметры - другой ключ
+            job = ChartJob(len, files / "a.svg", {"a": 1}, pieces=5)
+            other = ChartJob(len, files / "a.svg", {"a": 1}, pieces=3)
+            self.assertNotEqual(cache.key(job, "en_US.UTF-8"),
+                                cache.key(other, "en_US.UTF-8"))
+            self.assertNotEqual(cache.key(job, "en_US.UTF-8"),
+                                cache.key(job, "ru_RU.UTF-8"))
+            # вытеснение давно не использованных
+            cache.size_limit = max(map(len, charts.values()))
+            cache.evict()
+            sizes = [entry.stat().st_size
+                     for entry in cache.directory.iterdir()]
+            self.assertLessEqual(sum(sizes), cache.size_limit)
+            self.assertLess(len(sizes), len(charts) // 2)
+
+    def test_browser_charts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "report.html"
+            html_export(str(path), self.metadata, self.stats, charts="js")
+            files = Path(tmp) / "report_html_files"
+            self.assertEqual(sorted(file.name for file in files.iterdir()),
+                             ["charts.js", "charts_data.js", "style.css"])
+            data = (files / "charts_data.js").read_text(encoding="utf-8")
+            self.assertTrue(data.startswith("var TG_CHARTS = "))
+            charts = json.loads(data[len("var TG_CHARTS = "):-2])
+            html = path.read_text(encoding="utf-8")
+            for name in charts:
+                self.assertIn(f'data-chart="{name}"', html)
+            self.assertNotIn(".svg", html)
+            spec = charts[f"{CHAT_ID}_msg_date"]
+            self.assertEqual(spec["kind"], "line")
+            total = sum(sum(series["values"]) for series in spec["series"])
+            self.assertEqual(total, sum(
+                    sum(days.values())
+                    for days in self.stats["msg"][CHAT_ID].values()))
+            with self.assertRaises(ValueError):
+                html_export(str(path), self.metadata, self.stats,
+                            charts="png")
+
+    def test_date_series(self):
+        start = datetime.date(2015, 1, 1)
+        data = {"a": {start + datetime.timedelta(days=i): i % 5
+                      for i in range(0, 3000, 2)},
+                "b": {start: 1, start + datetime.timedelta(days=3): 2}}
+        date_min, date_max, resolution, series = _date_series(data, 3000)
+        self.assertEqual((date_min, resolution), (start, "D"))
+        self.assertEqual(date_max, start + datetime.timedelta(days=2998))
+        self.assertEqual(series[1][2].tolist(), [1, 0, 0, 2])
+        for points, expected in ((500, "W"), (100, "M")):
+            date_min, _, resolution, series = _date_series(data, points)
+            self.assertEqual(resolution, expected)
+            days, values = series[0][1], series[0][2]
+            self.assertLessEqual(len(days), points)
+            self.assertEqual(date_min, days[0].item())
+        # среднее за день февраля, начала недель - понедельники
+        february = [value for day, value in data["a"].items()
+                    if (day.year, day.month) == (2015, 2)]
+        idx = days.tolist().index(datetime.date(2015, 2, 1))
+        self.assertAlmostEqual(values[idx], sum(february) / 28)
+        self.assertTrue(all(day.item().weekday() == 0
+                            for day in _date_series(data, 500)[3][0][1]))
+
+    def test_figure_reuse(self):
+        reports = []
+        for fresh in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = str(Path(tmp) / "report.html")
+                if fresh:
+                    # новая фигура на каждый график
+                    with mock.patch(
+                            "tganalyzer.html_export.FIGURES.subplots",
+                            lambda kind:
+                            FigurePool().subplots(kind)):
+                        html_export(path, self.metadata, self.stats)
+                else:
+                    html_export(path, self.metadata, self.stats)
+                reports.append({
+                        file.name: file.read_bytes() for file in
+                        (Path(tmp) / "report_html_files").glob("*.svg")})
+        self.assertGreater(len(reports[0]), 20)
+        self.assertEqual(reports[0], reports[1])
+
+    def test_image_formats(self):
+        signatures = {".png": b"\x89PNG", ".webp": b"RIFF"}
+        widths = {}
+        for image_format, dpi in (("png", 50), ("png", 100), ("webp", 100)):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "report.html"
+                html_export(str(path), self.metadata, self.stats,
+                            image_format=image_format, dpi=dpi)
+                files = Path(tmp) / "report_html_files"
+                self.assertFalse(list(files.glob("*.svg")))
+                html = path.read_text(encoding="utf-8")
+                for file in files.glob(f"*.{image_format}"):
+                    self.assertTrue(file.read_bytes().startswith(
+                            signatures[file.suffix]))
+                    self.assertIn(f"report_html_files/{file.name}", html)
+                if image_format == "png":
+                    # ширина изображения в заголовке IHDR
+                    header = (files / f"{CHAT_ID}_msg_date.png").read_bytes()
+                    widths[dpi] = int.from_bytes(header[16:20], "big")
+        self.assertAlmostEqual(widths[100] / widths[50], 2, delta=0.1)
+
+        # растровые только графики с большим числом точек
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("tganalyzer.html_export.RASTER_MIN_POINTS", 10):
+            path = Path(tmp) / "report.html"
+            html_export(str(path), self.metadata, self.stats,
+                        image_format="auto")
+            files = Path(tmp) / "report_html_files"
+            self.assertTrue((files / f"{CHAT_ID}_msg_date.webp").exists())
+            self.assertTrue((files / f"{CHAT_ID}_msg_user.svg").exists())
+            html = path.read_text(encoding="utf-8")
+            self.assertIn(f"{CHAT_ID}_msg_date.webp", html)
+            self.assertNotIn(f"{CHAT_ID}_msg_date.svg", html)
+        with self.assertRaises(ValueError):
+            html_export(str(path), self.metadata, self.stats,
+                        image_format="gif")
+
+    def test_single_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            html_export(str(Path(tmp) / "report.html"), self.metadata,
+                        self.stats)
+            charts = list((Path(tmp) / "report_html_files").glob("*.svg"))
+            svg = charts[0].read_text(encoding="utf-8")
+            minified = minify_svg(svg)
+            self.assertLess(len(minified), len(svg))
+            paths = [len(ElementTree.fromstring(text).findall(".//{*}path"))
+                     for text in (svg, minified)]
+            self.assertEqual(paths[0], paths[1])
+            contents = {minify_svg(chart.read_text(encoding="utf-8"))
+                        for chart in charts}
+        for charts_mode in CHART_MODES:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "report.html"
+                html_export(str(path), self.metadata, self.stats,
+                            charts=charts_mode, single_file=True)
+                self.assertEqual(list(Path(tmp).iterdir()), [path])
+                html = path.read_text(encoding="utf-8")
+            self.assertIn("<style>", html)
+            self.assertNotIn("report_html_files", html)
+            if charts_mode == "js":
+                self.assertIn("var TG_CHARTS", html)
+                continue
+            # одинаковые графики записаны один раз
+            symbols = re.findall(r'<symbol id="(chart-\w+)"', html)
+            self.assertEqual(len(symbols), len(contents))
+            self.assertLess(len(symbols), len(charts))
+            self.assertEqual(set(re.findall(r'<use href="#(chart-\w+)"',
+                                            html)), set(symbols))
+            self.assertEqual(html.count('<svg class="plot"'), len(charts))
+
+    def test_paged_report(self):
+        chat_page = f"report_html_files/chat_{CHAT_ID}.html"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "report.html"
+            with mock.patch("tganalyzer.html_export.PAGED_MIN_CHATS", 0):
+                html_export(str(path), self.metadata, self.stats)
+            html = path.read_text(encoding="utf-8")
+            self.assertIn(f'<a href="{chat_page}">', html)
+            self.assertIn("agg_msg_date.svg", html)
+            self.assertNotIn(f"{CHAT_ID}_msg_date.svg", html)
+            page = (Path(tmp) / chat_page).read_text(encoding="utf-8")
+            self.assertIn('<a href="../report.html">', page)
+            images = re.findall(r'<img class="plot" loading="lazy" '
+                                r'src="\./([^"]+)"', page)
+            self.assertIn(f"{CHAT_ID}_msg_date.svg", images)
+            for image in images:
+                self.assertTrue((Path(tmp) / "report_html_files"
+                                 / image).exists())
+            # средние числа сообщений, слов и символов в день в оглавлении
+            self.assertEqual(len(re.findall(r"<td>\d+\.\d+</td>", html)), 3)
+            self.assertEqual(html.count("<img"), html.count('loading="lazy"'))
+
+            html_export(str(path), self.metadata, self.stats, charts="js",
+                        paged=True)
+            files = Path(tmp) / "report_html_files"
+            for data, expected in (("charts_data.js", "agg_msg_date"),
+                                   (f"chat_{CHAT_ID}_data.js",
+                                    f"{CHAT_ID}_msg_date")):
+                script = (files / data).read_text(encoding="utf-8")
+                names = json.loads(script[len("var TG_CHARTS = "):-2])
+                self.assertIn(expected, names)
+                self.assertTrue(all(name.startswith(expected.split("_")[0])
+                                    for name in names))
+        with self.assertRaises(ValueError):
+            html_export(str(path), self.metadata, self.stats, paged=True,
+                        single_file=True)
+
+
+class CmdTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        environ = mock.patch.dict("os.environ",
+                                  {"TGANALYZER_CACHE": self.tmp.name})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_select_chats(self):
+        chats = start_creator(PATH)
+        chat = chats[0]
+        self.assertEqual(select_chats(chats), [chat])
+        self.assertEqual(select_chats(chats, types=["public_channel"]), [])
+        self.assertEqual(select_chats(chats, ids=[CHAT_ID],
+                                      types=["public_channel"]), [chat])
+        self.assertEqual(select_chats(chats, min_messages=len(chat)), [])
+        self.assertEqual(select_chats(chats, min_messages=len(chat) - 1),
+                         [chat])
+
+    def test_report(self):
+        path = Path(self.tmp.name) / "report.html"
+        argv = ["tg-analyzer", "report", PATH, "-o", str(path),
+                "--from", "2019-01-01", "--to", "2024-12-31", "-f", "msg",
+                "-l", "ru", "--single-file"]
+        for mode in ([], ["--stream"]):
+            with self.subTest(mode=mode), \
+                    mock.patch.object(sys, "argv", argv + mode), \
+                    mock.patch("builtins.print"), \
+                    self.assertRaises(SystemExit) as exit:
+                start_cmd()
+            self.assertEqual(exit.exception.code, 0)
+            html = path.read_text(encoding="utf-8")
+            self.assertIn("Сообщения", html)
+            self.assertNotIn("Символы", html)
+            self.assertIn("2019-01-01 00:00:00+00:00", html)
+
+            with mock.patch.object(sys, "argv",
+                                   argv + mode + ["--chat", "1"]), \
+                    mock.patch("builtins.print"), \
+                    self.assertRaises(SystemExit) as exit:
+                start_cmd()
+            self.assertEqual(exit.exception.code, 1)
+
+    def test_top_words_report(self):
+        path = Path(self.tmp.name) / "report.html"
+        argv = ["tg-analyzer", "report", PATH, "-o", str(path),
+                "--from", "2019-01-01", "--to", "2024-12-31", "-f",
+                "top_words", "-l", "ru", "--single-file", "--charts", "js"]
+        for mode in ([], ["--stream"]):
+            with self.subTest(mode=mode), \
+                    mock.patch.object(sys, "argv", argv + mode), \
+                    mock.patch("builtins.print"), \
+                    self.assertRaises(SystemExit) as exit:
+                start_cmd()
+            self.assertEqual(exit.exception.code, 0)
+            html = path.read_text(encoding="utf-8")
+            self.assertIn("Самые частые слова", html)
+            self.assertIn("Пользователь: Артем Горошко", html)
+            self.assertIn("sought", html)
+        # по агрегатам слова не считаются
+        with mock.patch.object(sys, "argv", argv + ["--incremental"]), \
+                mock.patch("builtins.print"), \
+                self.assertRaises(SystemExit) as exit:
+            start_cmd()
+        self.assertEqual(exit.exception.code, 1)
+
+    def test_no_qt_import(self):
+        code = ("import sys, tganalyzer.cmd; "
+                "print('PySide6' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", code],
+                                capture_output=True, text=True, check=True,
+                                cwd=Path(__file__).resolve().parent.parent)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+class ImportTimeTest(unittest.TestCase):
+    # Бюджет импорта CLI в микросекундах: без matplotlib около 0.2 с, с ним
+    # около 0.8 с
+    CLI_BUDGET = 500_000
+
+    def test_heavy_modules_deferred(self):
+        modules = ["tganalyzer.cmd", "tganalyzer.html_export"]
+        if importlib.util.find_spec("PySide6") is not None:
+            modules.append("tganalyzer.gui")
+        for module in modules:
+            times = import_times(f"import {module}")
+            with self.subTest(module=module):
+                self.assertFalse({"matplotlib", "jinja2", "PIL"} & set(times))
+                if module != "tganalyzer.gui":
+                    self.assertNotIn("PySide6", times)
+
+    def test_analysis_without_matplotlib(self):
+        times = import_times(
+                "from tganalyzer.core.creator import start_creator; "
+                "from tganalyzer.core.analyzer import (DEPENDENCIES, "
+                "start_analyses); "
+                "import datetime, pytz; "
+                f"start_analyses(start_creator({PATH!r}), "
+                "[datetime.datetime(2019, 1, 1, tzinfo=pytz.UTC), "
+                "datetime.datetime(2025, 1, 1, tzinfo=pytz.UTC)], "
+                "dict.fromkeys(DEPENDENCIES, True))")
+        self.assertIn("tganalyzer.core.analyzer", times)
+        self.assertNotIn("matplotlib", times)
+
+    def test_cli_import_budget(self):
+        times = import_times("import tganalyzer.cmd")
+        self.assertLess(times["tganalyzer.cmd"], self.CLI_BUDGET)
@@ -1,30 +1,214 @@
-"""CLI для запуска GUI. Для более подробной информации см. `--help`."""
+"""CLI для запуска GUI и создания отчетов без него.
+
+Для более подробной информации см. `--help` и `report --help`.
+"""
 import argparse
+import datetime
+import os
 import sys
-from PySide6.QtWidgets import QApplication
-from tganalyzer.gui import MainWindow
+import pytz
+from tganalyzer.core.cache import ExportCache
+from tganalyzer.core.aggregates import ChatAggregates
+from tganalyzer.core.analyzer import (DEPENDENCIES, PARALLEL_MIN_MESSAGES,
+                                      needs_text, start_analyses)
+from tganalyzer.core.creator import PARALLEL_MIN_BYTES, start_creator
+from tganalyzer.core.incremental import start_incremental
+from tganalyzer.core.pipeline import start_pipeline
+from tganalyzer.html_export import (CHART_MODES, IMAGE_FORMATS, PATH,
+                                    html_export)
+from tganalyzer.html_export.cache import ChartCache
+
+
+LANGUAGES = {'en': 'en_US.UTF-8',
+             'ru': 'ru_RU.UTF-8',
+             }
+THEMES = sorted(theme.stem for theme in (PATH / 'themes').iterdir())
+# Типы чатов, которые выбираются по умолчанию (как в GUI)
+CHAT_TYPES = ("personal_chat", "private_group", "private_supergroup")
+
+
+def _messages_num(chat) -> int:
+    """Число сообщений чата, в том числе свернутого в агрегаты."""
+    return (chat.messages_num if isinstance(chat, ChatAggregates)
+            else len(chat))
+
+
+def select_chats(chats: list, ids: list[int] = None,
+                 types: list[str] = None, min_messages: int = None) -> list:
+    """Выбор чатов для отчета.
+
+    :param chats: массив чатов.
+    :param ids: ID чатов. Если заданы, типы чатов не проверяются.
+    :param types: типы чатов, по умолчанию ``CHAT_TYPES``.
+    :param min_messages: выбрать только чаты, в которых больше сообщений
+    (как "сложный выбор" в GUI).
+    :return: массив выбранных чатов в порядке ``chats``.
+    """
+    if ids:
+        ids = set(ids)
+        selected = [chat for chat in chats if chat.id in ids]
+    else:
+        types = set(types or CHAT_TYPES)
+        selected = [chat for chat in chats
+                    if chat.type in types and chat.name is not None]
+    if min_messages is not None:
+        selected = [chat for chat in selected
+                    if _messages_num(chat) > min_messages]
+    return selected
+
+
+def _add_report_parser(subparsers):
+    """Добавляет подкоманду report.
+
+    :param subparsers: результат ``ArgumentParser.add_subparsers``.
+    """
+    today = datetime.date.today()
+    # 29 февраля пять лет назад - 1 марта
+    five_years_ago = (datetime.date(today.year - 5, today.month, 1)
+                      + datetime.timedelta(days=today.day - 1))
+    parser = subparsers.add_parser(
+            'report', help='create an HTML report without the GUI',
+            description='Create an HTML report from a Telegram export '
+            'without starting the GUI.')
+    parser.add_argument('export', help='path to result.json of the export')
+    parser.add_argument('-o', '--output',
+                        help='report path (default: index.html next to '
+                        'the export)')
+    parser.add_argument('--chat', type=int, action='append', dest='chats',
+                        metavar='ID', help='chat id to include (repeatable, '
+                        'overrides --type)')
+    parser.add_argument('--type', action='append', dest='types',
+                        metavar='TYPE', help='chat type to include '
+                        f'(repeatable, default: {", ".join(CHAT_TYPES)})')
+    parser.add_argument('--min-messages', type=int, metavar='N',
+                        help='only chats with more than N messages')
+    parser.add_argument('-f', '--feature', action='append', dest='features',
+                        choices=list(DEPENDENCIES),
+                        help='statistic to compute (repeatable, default: '
+                        'all that do not need message texts)')
+    parser.add_argument('--from', type=datetime.date.fromisoformat,
+                        dest='date_from', metavar='YYYY-MM-DD',
+                        default=five_years_ago,
+                        help='first day of the period (default: five years '
+                        'ago)')
+    parser.add_argument('--to', type=datetime.date.fromisoformat,
+                        dest='date_to', metavar='YYYY-MM-DD', default=today,
+                        help='last day of the period (default: today)')
+    parser.add_argument('--theme', choices=THEMES, default='light')
+    parser.add_argument('-l', '--language', choices=list(LANGUAGES),
+                        default=argparse.SUPPRESS)
+    parser.add_argument('-j', '--workers', type=int,
+                        help='number of worker processes (default: number '
+                        'of CPUs for large exports, as in the GUI)')
+    parser.add_argument('--charts', choices=CHART_MODES, default='svg',
+                        help='"js" draws charts in the browser')
+    parser.add_argument('--image-format', choices=IMAGE_FORMATS,
+                        default='auto')
+    parser.add_argument('--single-file', action='store_true',
+                        help='embed styles and charts into the HTML file')
+    parsing = parser.add_mutually_exclusive_group()
+    parsing.add_argument('--incremental', action='store_true',
+                         help='reuse aggregates of a previous export of the '
+                         'same account and parse only new messages')
+    parsing.add_argument('--stream', action='store_true',
+                         help='analyse the export in one pass without '
+                         'keeping messages in memory')
+
+
+def run_report(args):
+    """Создает отчет по аргументам подкоманды report.
+
+    :param args: результат ``ArgumentParser.parse_args``.
+    :return: код завершения.
+    """
+    workers = args.workers
+    time_gap = [
+        datetime.datetime.combine(args.date_from, datetime.time.min,
+                                  pytz.utc),
+        datetime.datetime.combine(args.date_to, datetime.time.max, pytz.utc),
+    ]
+    # опции, которым нужны тексты сообщений, считаются только по запросу:
+    # с ними экспорт разбирается без кэша и занимает больше памяти
+    features = {feature: (feature in args.features
+                          if args.features is not None
+                          else not needs_text({feature: True}))
+                for feature in DEPENDENCIES}
+    if args.stream:
+        stats, parsed_chats = start_pipeline(
+                args.export, time_gap, features,
+                select=lambda chat: bool(select_chats(
+                        [chat], args.chats, args.types, args.min_messages)))
+    else:
+        if args.incremental:
+            # по агрегатам считаются только опции с пакетной функцией
+            unbatched = [feature for feature in DEPENDENCIES
+                         if features[feature]
+                         and "batch_func" not in DEPENDENCIES[feature]]
+            if unbatched:
+                print(f"{', '.join(unbatched)} can not be computed with "
+                      "--incremental", file=sys.stderr)
+                return 1
+            chats = start_incremental(args.export)
+        else:
+            big = os.path.getsize(args.export) >= PARALLEL_MIN_BYTES
+            chats = start_creator(args.export, columnar=True, cache=True,
+                                  workers=workers or (os.cpu_count() if big
+                                                      else None),
+                                  keep_text=needs_text(features))
+        selected = select_chats(chats, args.chats, args.types,
+                                args.min_messages)
+        messages_num = sum(map(_messages_num, selected))
+        stats, parsed_chats = start_analyses(
+                selected, time_gap, features,
+                workers=workers or (os.cpu_count()
+                                    if messages_num >= PARALLEL_MIN_MESSAGES
+                                    else None))
+    if not parsed_chats:
+        print("No chats match the selection", file=sys.stderr)
+        return 1
+    metadata = {
+            "login": "",
+            "chats": parsed_chats,
+            "time_gap": time_gap,
+            }
+    output = args.output or os.path.join(
+            os.path.dirname(os.path.abspath(args.export)), 'index.html')
+    html_export(output, metadata, stats, lang=LANGUAGES[args.language],
+                theme=args.theme, workers=workers or os.cpu_count(),
+                cache=ChartCache(), charts=args.charts,
+                image_format=args.image_format, single_file=args.single_file)
+    print(output)
+    return 0
 
 
 def start_cmd():
     """Запускает CLI интерфейс."""
-    LANGUAGES = {'en': 'en_US.UTF-8',
-                 'ru': 'ru_RU.UTF-8',
-                 }
-
     parser = argparse.ArgumentParser(
             prog='tg-analyzer',
             description='Message analyzer for Telegram')
     parser.add_argument('-l', '--language',
                         default='en')
+    parser.add_argument('--clear-cache', action='store_true',
+                        help='remove cached parsed exports and charts '
+                        'and exit')
+    _add_report_parser(parser.add_subparsers(dest='command'))
     args = parser.parse_args()
-    if args.language in LANGUAGES:
-        print(args.language)
-        app = QApplication(sys.argv)
-        app.setApplicationName("tg-analyzer")
-        window = MainWindow(lang=LANGUAGES[args.language])  # noqa: F841
-        sys.exit(app.exec())
-    else:
+    if args.clear_cache:
+        ExportCache().clear()
+        ChartCache().clear()
+        sys.exit(0)
+    if args.language not in LANGUAGES:
         print(f"Unexpected language: {args.language}", file=sys.stderr)
         print(f"One of these languages was expected: {', '.join(LANGUAGES)}",
               file=sys.stderr)
         sys.exit(1)
+    if args.command == 'report':
+        sys.exit(run_report(args))
+    print(args.language)
+    # Qt загружается только для GUI
+    from PySide6.QtWidgets import QApplication
+    from tganalyzer.gui import MainWindow
+    app = QApplication(sys.argv)
+    app.setApplicationName("tg-analyzer")
+    window = MainWindow(lang=LANGUAGES[args.language])  # noqa: F841
+    sys.exit(app.exec())
@@ -0,0 +1,341 @@
+"""Агрегаты сообщений чатов.
+
+Сообщения колоночного чата сворачиваются в ячейки по автору, типу и
+шестичасовому промежутку суток (четверти суток). Такие ячейки занимают
+намного меньше места, чем сообщения, складываются при появлении новых
+сообщений и анализируются теми же пакетными функциями, что и сами чаты.
+
+Для промежутков из целых дней есть суточные агрегаты (DayCube) с
+префиксными суммами, по которым итоги за любой промежуток считаются без
+прохода по сообщениям.
+"""
+import math
+import numpy as np
+from . import creator
+from . import columnar
+
+
+# Константы
+
+QUARTER = 6 * 60 * 60   # длина четверти суток в секундах
+DAY = 24 * 60 * 60   # длина суток в секундах
+NONE = np.iinfo(np.int64).max   # номер сообщения там, где сообщений нет
+# Колонки ячеек: колонки колоночного чата и еще число сообщений в ячейке и
+# номер первого из них в чате
+CELL_COLUMNS = dict(columnar.COLUMNS, count=np.int64, seq=np.int64)
+
+
+class ChatAggregates(columnar.ColumnarChat):
+    """Чат, сообщения которого свернуты в ячейки.
+
+    Ячейка объединяет сообщения одного автора и типа, отправленные в одну
+    четверть суток. В колонке send_time ячейки лежит начало четверти, в
+    колонках duration, text_len и word_count - суммы по сообщениям ячейки, в
+    count - их число, а в seq - номер первого из них в чате. Ячейки
+    упорядочены по seq, поэтому пакетный подсчет (analyzer.MessageBatch) дает
+    по ним тот же результат и тот же порядок ключей, что и по сообщениям,
+    если границы временного промежутка совпадают с границами четвертей (см.
+    ``check_time_gap``).
+    """
+
+    messages_num = 0   # число свернутых сообщений
+
+    @classmethod
+    def from_chat(cls, chat: creator.Chat):
+        """Сворачивает сообщения чата.
+
+        :param chat: объект класса creator.Chat или columnar.ColumnarChat.
+        """
+        if not isinstance(chat, columnar.ColumnarChat):
+            chat = columnar.ColumnarChat.from_chat(chat)
+        self = cls.__new__(cls)
+        self.name, self.id, self.type = chat.name, chat.id, chat.type
+        self.last_id = chat.last_id
+        self.messages_num = len(chat)
+        columns = dict(chat.columns)
+        columns["send_time"] = columns["send_time"] // QUARTER * QUARTER
+        columns["count"] = np.ones(len(chat), np.int64)
+        columns["seq"] = np.arange(len(chat), dtype=np.int64)
+        self._reduce(chat.authors, columns)
+        return self
+
+    def _reduce(self, authors: list[str], columns: dict):
+        """Складывает строки с одинаковыми автором, типом и четвертью.
+
+        :param authors: таблица авторов.
+        :param columns: колонки ``CELL_COLUMNS`` строк, упорядоченных по seq.
+        """
+        quarter = columns["send_time"] // QUARTER
+        base = quarter.min(initial=0)
+        span = quarter.max(initial=0) - base + 1
+        keys = (columns["author"].astype(np.int64) * span
+                + (quarter - base)) * len(columnar.TYPES) + columns["type"]
+        _, first, inverse = np.unique(keys, return_index=True,
+                                      return_inverse=True)
+        # строки упорядочены по seq, так что первая строка ячейки - самая
+        # ранняя, и ячейки остаются упорядоченными по seq
+        order = np.argsort(columns["seq"][first], kind="stable")
+        cells = {}
+        for name, dtype in CELL_COLUMNS.items():
+            if name in ("duration", "text_len", "word_count", "count"):
+                column = np.bincount(inverse, columns[name], len(first))
+            else:
+                column = columns[name][first]
+            cells[name] = column[order].astype(dtype)
+        self.authors = list(authors)
+        self.columns = cells
+        self.texts = None
+
+    def merge(self, newer):
+        """Добавляет к агрегатам агрегаты более новых сообщений чата.
+
+        :param newer: агрегаты сообщений того же чата, отправленных после
+        всех сообщений этого объекта.
+        :type newer: ChatAggregates
+        :return: новый объект ChatAggregates.
+        """
+        authors = {author: i for i, author in enumerate(self.authors)}
+        remap = np.array([authors.setdefault(author, len(authors))
+                          for author in newer.authors], dtype=np.int32)
+        columns = {}
+        for name in CELL_COLUMNS:
+            column = newer.columns[name]
+            if name == "author":
+                column = remap[column]
+            elif name == "seq":
+                column = column + self.messages_num
+            columns[name] = np.concatenate([self.columns[name], column])
+        merged = self.__class__.__new__(self.__class__)
+        merged.id, merged.type = newer.id, newer.type
+        # имя личного чата определяется по первому подходящему сообщению
+        merged.name = self.name if self.type == "personal_chat" and \
+            self.name is not None else newer.name
+        merged.last_id = self.last_id if newer.last_id is None \
+            else newer.last_id
+        merged.messages_num = self.messages_num + newer.messages_num
+        merged._reduce(list(authors), columns)
+        return merged
+
+    @staticmethod
+    def check_time_gap(time_gap):
+        """Проверяет, что агрегаты можно анализировать на промежутке.
+
+        Промежуток должен начинаться с начала четверти суток и заканчиваться
+        в последнюю секунду четверти, как промежутки из целых дней в GUI.
+        :param time_gap: временной промежуток (aware).
+        """
+        start, end = time_gap[0].timestamp(), time_gap[1].timestamp()
+        if start % QUARTER or math.floor(end) % QUARTER != QUARTER - 1:
+            raise ValueError("Aggregated chats can only be analysed over "
+                             "whole quarters of a day")
+
+
+def whole_days(time_gap) -> bool:
+    """Проверяет, что промежуток состоит из целых суток (по UTC).
+
+    Промежуток должен начинаться в полночь и заканчиваться в последнюю
+    секунду суток, как промежутки, которые задаются в GUI.
+    :param time_gap: временной промежуток (aware).
+    """
+    start, end = time_gap[0].timestamp(), time_gap[1].timestamp()
+    return start % DAY == 0 and math.floor(end) % DAY == DAY - 1
+
+
+def _first_rows(keys, rows: int, width: int, seq):
+    """Находит номер первого сообщения для каждой пары (строка, столбец).
+
+    :param keys: номера пар ``строка * width + столбец`` для сообщений,
+    упорядоченных по seq.
+    :param rows: число строк.
+    :param width: число столбцов.
+    :param seq: номера сообщений в чате.
+    :return: массив (rows, width), NONE там, где сообщений нет.
+    """
+    first = np.full(rows * width, NONE, dtype=np.int64)
+    uniq, index = np.unique(keys, return_index=True)
+    first[uniq] = seq[index]
+    return first.reshape(rows, width)
+
+
+def _next_rows(counts):
+    """Находит для строк ближайшие строки не раньше них с ненулевым значением.
+
+    Поиск идет отдельно по каждому столбцу.
+    :param counts: массив (rows, width).
+    :return: массив (rows + 1, width), rows там, где таких строк нет.
+    """
+    rows = len(counts)
+    index = np.where(counts > 0, np.arange(rows)[:, None], rows)
+    index = np.vstack([index, np.full((1, counts.shape[1]), rows)])
+    return np.minimum.accumulate(index[::-1])[::-1]
+
+
+def _prefix(values):
+    """Префиксные суммы по строкам с нулевой строкой в начале."""
+    return np.vstack([np.zeros((1,) + values.shape[1:], np.int64),
+                      np.cumsum(values, axis=0)])
+
+
+class DayCube():
+    """Суточные агрегаты чата по автору и дню.
+
+    Строки таблицы соответствуют парам (автор, день), в которые автор писал,
+    и упорядочены по автору, а внутри автора по дню. Для строк хранятся
+    префиксные суммы числа сообщений, символов, слов, числа и длительности
+    сообщений каждого типа и числа сообщений в каждую четверть суток, а
+    также номера первых сообщений, чтобы ключи результатов шли в том же
+    порядке, что и при подсчете по сообщениям. Срез на промежуток (см.
+    ``slice``) умеет то же, что analyzer.MessageBatch.
+    """
+
+    def __init__(self, chat: columnar.ColumnarChat):
+        """Строит таблицу по колоночному чату или агрегатам чата.
+
+        :param chat: объект columnar.ColumnarChat или ChatAggregates.
+        """
+        columns = chat.columns
+        size = len(columns["send_time"])
+        count = columns.get("count", np.ones(size, np.int64))
+        seq = columns.get("seq", np.arange(size, dtype=np.int64))
+        send_time = columns["send_time"]
+        day = send_time // DAY
+        quarter = send_time % DAY // QUARTER
+        self.base = day.min(initial=0)
+        self.span = day.max(initial=0) - self.base + 1
+        keys = columns["author"].astype(np.int64) * self.span \
+            + (day - self.base)
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        rows = len(self.keys)
+        types = len(columnar.TYPES)
+        self.authors = chat.authors
+        self.day = self.keys % self.span + self.base
+
+        def sums(index, width, weights):
+            """Суммы весов по парам (строка, столбец)."""
+            return np.bincount(inverse * width + index, weights,
+                               rows * width).astype(np.int64) \
+                .reshape(rows, width)
+
+        zeros = np.zeros(size, np.int64)
+        self.count = sums(zeros, 1, count)[:, 0]
+        self.text_len = sums(zeros, 1, columns["text_len"])[:, 0]
+        self.word_count = sums(zeros, 1, columns["word_count"])[:, 0]
+        self.first = _first_rows(inverse, rows, 1, seq)[:, 0]
+        type_count = sums(columns["type"], types, count)
+        self.type_count = _prefix(type_count)
+        self.type_duration = _prefix(sums(columns["type"], types,
+                                          columns["duration"]))
+        self.type_first = _first_rows(inverse * types + columns["type"],
+                                      rows, types, seq)
+        self.type_next = _next_rows(type_count)
+        quarter_count = sums(quarter, 4, count)
+        self.quarter_count = _prefix(quarter_count)
+        self.quarter_first = _first_rows(inverse * 4 + quarter, rows, 4, seq)
+        self.quarter_next = _next_rows(quarter_count)
+
+    def slice(self, time_gap):
+        """Возвращает срез таблицы на промежуток из целых дней.
+
+        :param time_gap: временной промежуток (aware), см. ``whole_days``.
+        :rtype: DayCubeSlice
+        """
+        if not whole_days(time_gap):
+            raise ValueError("DayCube can only be sliced by whole days")
+        return DayCubeSlice(self, int(time_gap[0].timestamp()) // DAY,
+                            int(time_gap[1].timestamp()) // DAY)
+
+
+class DayCubeSlice():
+    """Суточные агрегаты чата в промежутке дней.
+
+    Метод ``sums`` отвечает так же, как analyzer.MessageBatch.sums, так что
+    срез подходит пакетным функциям анализатора.
+    """
+
+    def __init__(self, cube: DayCube, first_day: int, last_day: int):
+        """Находит строки промежутка для каждого автора.
+
+        :param cube: суточные агрегаты.
+        :param first_day: первый день промежутка, число дней от эпохи.
+        :param last_day: последний день промежутка.
+        """
+        self.cube = cube
+        authors = np.arange(len(cube.authors)) * cube.span - cube.base
+        self.start = np.searchsorted(cube.keys, authors + first_day, "left")
+        self.end = np.searchsorted(cube.keys, authors + last_day, "right")
+        # авторы, писавшие в промежутке, по первому сообщению
+        active = np.flatnonzero(self.end > self.start)
+        self.order = active[np.argsort(cube.first[self.start[active]],
+                                       kind="stable")].tolist()
+
+    def _ordered(self, nexts, firsts, column: int):
+        """Упорядочивает авторов, у которых есть строки с данным столбцом.
+
+        :param nexts: массив ближайших ненулевых строк (см. ``_next_rows``).
+        :param firsts: массив номеров первых сообщений.
+        :param column: столбец.
+        :return: номера авторов по первому сообщению столбца в промежутке.
+        """
+        rows = nexts[self.start, column]
+        active = np.flatnonzero(rows < self.end)
+        first = firsts[rows[active], column]
+        return active[np.argsort(first, kind="stable")].tolist()
+
+    def sums(self, by: str, column: str = None, msg_type: str = None):
+        """Суммирует колонку по группам сообщений.
+
+        Поддерживаются группировки, нужные пакетным функциям: по дням (без
+        типа сообщений), по четвертям суток (число сообщений без типа) и
+        по одним авторам.
+        :param by: второй ключ группировки: "day", "hour" или None.
+        :param column: суммируемая колонка, при None считается число
+        сообщений.
+        :param msg_type: если задан, учитываются только сообщения этого типа.
+        :return: список троек (имя автора, начало, конец) с границами групп
+        каждого автора, список вторых ключей групп и список сумм по группам.
+        """
+        cube = self.cube
+        runs, second, sums = [], [], []
+        if by == "day" and msg_type is None and \
+                column in (None, "text_len", "word_count"):
+            values = {None: cube.count, "text_len": cube.text_len,
+                      "word_count": cube.word_count}[column]
+            position = 0
+            for author in self.order:
+                size = int(self.end[author] - self.start[author])
+                runs.append((cube.authors[author], position,
+                             position + size))
+                position += size
+            index = np.concatenate([np.arange(self.start[author],
+                                              self.end[author])
+                                    for author in self.order]
+                                   + [np.empty(0, np.int64)])
+            return runs, cube.day[index].tolist(), values[index].tolist()
+        if by is None and msg_type is not None and \
+                column in (None, "duration"):
+            code = columnar.TYPE_CODES[msg_type]
+            totals = cube.type_count if column is None else cube.type_duration
+            for author in self._ordered(cube.type_next, cube.type_first,
+                                        code):
+                runs.append((cube.authors[author], len(sums), len(sums) + 1))
+                second.append(0)
+                sums.append(int(totals[self.end[author], code]
+                                - totals[self.start[author], code]))
+            return runs, second, sums
+        if by == "hour" and msg_type is None and column is None:
+            start, end = self.start, self.end
+            quarters = cube.quarter_next[start]
+            for author in self.order:
+                present = [quarter for quarter in range(4)
+                           if quarters[author, quarter] < end[author]]
+                present.sort(key=lambda quarter: cube.quarter_first[
+                        quarters[author, quarter], quarter])
+                runs.append((cube.authors[author], len(sums),
+                             len(sums) + len(present)))
+                second.extend(present)
+                sums.extend(int(cube.quarter_count[end[author], quarter]
+                                - cube.quarter_count[start[author], quarter])
+                            for quarter in present)
+            return runs, second, sums
+        raise ValueError(f"Unsupported grouping: by={by!r}, "
+                         f"column={column!r}, msg_type={msg_type!r}")
@@ -1,12 +1,40 @@
 """Создает статистику по сообщениям."""
 import bisect
 from . import creator
+from . import columnar
+from . import aggregates
+from . import words
 import datetime
+import multiprocessing
+import numpy as np
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import functools
+from functools import partial
 
 
 # Функции подсчета
 
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+SECONDS_IN_DAY = 24 * 60 * 60
+QUARTER = 6 * 60 * 60   # длина четверти суток (времени суток) в секундах
+
+
+@functools.lru_cache(maxsize=4096)
+def _date(day: int) -> datetime.date:
+    """Дата по номеру дня от эпохи."""
+    return datetime.date.fromordinal(EPOCH_ORDINAL + day)
+
+
+def _day(timestamp: int) -> datetime.date:
+    """Дата (по UTC) времени в секундах от эпохи.
+
+    То же, что ``send_time.date()``, но без создания datetime.
+    :param timestamp: время в секундах от эпохи.
+    """
+    return _date(timestamp // SECONDS_IN_DAY)
+
+
 def counter_symbols(
         update: defaultdict[str, defaultdict[datetime.datetime.date, int]],
         message: creator.Message,
@@ -18,7 +46,7 @@ def counter_symbols(
     :param message: анализируемое сообщение.
     :param feature: название цели анализа.
     """
-    update[message.author][message.send_time.date()] += len(message.text)
+    update[message.author][_day(message.timestamp)] += message.text_len
 
 
 def counter_words(
@@ -32,8 +60,7 @@ def counter_words(
     :param message: анализируемое сообщение.
     :param feature: название цели анализа.
     """
-    update[message.author][message.send_time.date()] += \
-        len(message.text.split())
+    update[message.author][_day(message.timestamp)] += message.word_count
 
 
 def counter_msgs(
@@ -47,7 +74,7 @@ def counter_msgs(
     :param message: анализируемое сообщение.
     :param feature: название цели анализа.
     """
-    update[message.author][message.send_time.date()] += 1
+    update[message.author][_day(message.timestamp)] += 1
 
 
 def counter_files(
@@ -95,7 +122,214 @@ def counter_days_nights(
     :param feature: название цели анализа.
     """
     _time = ["night", "morning", "afternoon", "evening"]
-    update[message.author][_time[message.send_time.hour // 6]] += 1
+    update[message.author][
+            _time[message.timestamp % SECONDS_IN_DAY // QUARTER]] += 1
+
+
+def counter_top_words(
+        update: defaultdict[str, words.WordCounter],
+        message: creator.Message,
+        feature: str
+        ):
+    """Подсчитывает слова текстов каждого пользователя (см. words).
+
+    :param update: структура со счетчиками слов пользователей.
+    :param message: анализируемое сообщение.
+    :param feature: название цели анализа.
+    """
+    if message.text:
+        update[message.author].update(words.tokenize(message.text))
+
+
+# Пакетный подсчет для колоночных чатов
+
+
+class MessageBatch():
+    """Сообщения колоночного чата в заданном временном промежутке.
+
+    Хранит срезы массивов чата и кеширует группировки сообщений, общие для
+    нескольких опций, чтобы весь чат обрабатывался за один проход.
+    """
+
+    def __init__(
+            self,
+            chat: columnar.ColumnarChat,
+            time_gap: tuple[datetime.datetime, datetime.datetime]
+            ):
+        """Выбирает сообщения чата из временного промежутка.
+
+        :param chat: анализируемый чат.
+        :param time_gap: временной промежуток рассматриваемых сообщений.
+        Начальная дата и конечная, aware.
+        """
+        send_time = chat.columns["send_time"]
+        start = np.searchsorted(send_time, time_gap[0].timestamp(), "left")
+        end = np.searchsorted(send_time, time_gap[1].timestamp(), "right")
+        self.authors = chat.authors
+        self.columns = {name: column[start:end]
+                        for name, column in chat.columns.items()}
+        self._groups = {}
+
+    def group(self, by: str, msg_type: str = None):
+        """Группирует сообщения по автору и, возможно, еще одному ключу.
+
+        Группы упорядочены так же, как ключи словарей при последовательном
+        подсчете: авторы по первому сообщению, а группы одного автора по
+        первому сообщению в группе.
+        :param by: второй ключ группировки: "day" (день по UTC, число дней
+        от эпохи), "hour" (номер шестичасового промежутка суток) или None.
+        :param msg_type: если задан, учитываются только сообщения этого типа.
+        :return: маска отобранных сообщений (или None), номера групп для
+        отобранных сообщений, список троек (имя автора, начало, конец) с
+        границами групп каждого автора и список вторых ключей групп.
+        """
+        if (by, msg_type) in self._groups:
+            return self._groups[by, msg_type]
+        mask = None
+        authors = self.columns["author"].astype(np.int64)
+        send_time = self.columns["send_time"]
+        if msg_type is not None:
+            mask = self.columns["type"] == columnar.TYPE_CODES[msg_type]
+            authors, send_time = authors[mask], send_time[mask]
+        match by:
+            case "day":
+                second = send_time // SECONDS_IN_DAY
+            case "hour":
+                second = send_time % SECONDS_IN_DAY // QUARTER
+            case _:
+                second = np.zeros_like(authors)
+        count = len(authors)
+        positions = np.arange(count)
+
+        # ранги авторов по первому сообщению
+        first = np.full(len(self.authors), count)
+        np.minimum.at(first, authors, positions)
+        author_order = np.argsort(first, kind="stable")
+        rank = np.empty_like(author_order)
+        rank[author_order] = np.arange(len(author_order))
+
+        # ключ группы упорядочен по рангу автора
+        base = second.min(initial=0)
+        width = second.max(initial=0) - base + 1
+        keys = rank[authors] * width + (second - base)
+        if len(self.authors) * width <= 4 * count + 1024:
+            present = np.bincount(keys, minlength=len(self.authors) * width)
+            uniq = np.flatnonzero(present)
+            inverse = (np.cumsum(present > 0) - 1)[keys]
+        else:   # слишком много возможных ключей для плотного массива
+            uniq, inverse = np.unique(keys, return_inverse=True)
+
+        # внутри автора группы упорядочены по первому сообщению
+        first = np.full(len(uniq), count)
+        np.minimum.at(first, inverse, positions)
+        order = np.lexsort((first, uniq // width))
+        group_rank = np.empty_like(order)
+        group_rank[order] = np.arange(len(order))
+        group_authors = author_order[uniq[order] // width]
+        starts = np.flatnonzero(np.diff(group_authors, prepend=-1))
+        ends = np.append(starts[1:], len(uniq))
+        runs = [(self.authors[author], start, end) for author, start, end
+                in zip(group_authors[starts].tolist(), starts.tolist(),
+                       ends.tolist())]
+        self._groups[by, msg_type] = (mask, group_rank[inverse], runs,
+                                      (uniq[order] % width + base).tolist())
+        return self._groups[by, msg_type]
+
+    def sums(self, by: str, column: str = None, msg_type: str = None):
+        """Суммирует колонку по группам сообщений.
+
+        :param by: второй ключ группировки (см. ``group``).
+        :param column: суммируемая колонка, при None считается число
+        сообщений (если у чата есть колонка ``count`` с числом сообщений в
+        каждой строке, суммируется она).
+        :param msg_type: если задан, учитываются только сообщения этого типа.
+        :return: список троек (имя автора, начало, конец) с границами групп
+        каждого автора, список вторых ключей групп и список сумм по группам.
+        """
+        mask, groups, runs, second = self.group(by, msg_type)
+        weights = None
+        if column is None and "count" in self.columns:
+            column = "count"
+        if column is not None:
+            weights = self.columns[column]
+            if mask is not None:
+                weights = weights[mask]
+        sums = np.bincount(groups, weights, len(second))
+        return runs, second, sums.astype(np.int64).tolist()
+
+
+def batch_by_day(
+        update: defaultdict[str, defaultdict[datetime.datetime.date, int]],
+        batch: MessageBatch,
+        feature: str
+        ):
+    """Подсчитывает символы, слова или сообщения по дням сразу для чата.
+
+    Пакетный аналог counter_symbols, counter_words и counter_msgs.
+    :param update: структура для подсчета.
+    :param batch: сообщения анализируемого чата.
+    :param feature: название цели анализа.
+    """
+    column = {"symb": "text_len", "word": "word_count", "msg": None}[feature]
+    runs, days, sums = batch.sums("day", column)
+    dates = [_date(day) for day in days]
+    for author, start, end in runs:
+        update[author].update(zip(dates[start:end], sums[start:end]))
+
+
+def batch_files(
+        update: defaultdict[str, defaultdict[str, int]],
+        batch: MessageBatch,
+        feature: str
+        ):
+    """Подсчитывает число и длину сообщений-файлов сразу для чата.
+
+    Пакетный аналог counter_files.
+    :param update: структура для подсчета количества и длины сообщений-файлов.
+    :param batch: сообщения анализируемого чата.
+    :param feature: название цели анализа.
+    """
+    runs, _, quantities = batch.sums(None, None, feature)
+    _, _, lengths = batch.sums(None, "duration", feature)
+    for author, start, _ in runs:
+        update[author]["quantity"] = quantities[start]
+        update[author]["length"] = lengths[start]
+
+
+def batch_photos(
+        update: defaultdict[str, int],
+        batch: MessageBatch,
+        feature: str
+        ):
+    """Подсчитывает число фотографий сразу для чата.
+
+    Пакетный аналог counter_photos.
+    :param update: структура для подсчета фотографий.
+    :param batch: сообщения анализируемого чата.
+    :param feature: название цели анализа.
+    """
+    runs, _, quantities = batch.sums(None, None, feature)
+    for author, start, _ in runs:
+        update[author] = quantities[start]
+
+
+def batch_days_nights(
+        update: defaultdict[str, defaultdict[str, int]],
+        batch: MessageBatch,
+        feature: str
+        ):
+    """Подсчитывает сообщения в разное время суток сразу для чата.
+
+    Пакетный аналог counter_days_nights.
+    :param update: структура для подсчета сообщений.
+    :param batch: сообщения анализируемого чата.
+    :param feature: название цели анализа.
+    """
+    _time = ["night", "morning", "afternoon", "evening"]
+    runs, hours, quantities = batch.sums("hour")
+    for author, start, end in runs:
+        update[author].update((_time[hour], quantity) for hour, quantity
+                              in zip(hours[start:end], quantities[start:end]))
 
 
 # Функции подготовки вывода
@@ -114,13 +348,54 @@ def return_text_info(
     update[id] = chat_data
 
 
+def return_top_words(
+        update: dict[int, dict],
+        chat_data: defaultdict[str, words.WordCounter],
+        id: int
+        ):
+    """Собирает самые частые слова чата и каждого пользователя.
+
+    Слова чата считаются объединением счетчиков пользователей.
+    :param update: общая дополняемая структура.
+    :param chat_data: счетчики слов пользователей одного чата.
+    :param id: id чата.
+    """
+    chat = words.WordCounter()
+    for counter in chat_data.values():
+        chat.merge(counter)
+    update[id] = {
+        "chat": dict(chat.most_common(TOP_WORDS)),
+        "users": {user: dict(counter.most_common(TOP_WORDS))
+                  for user, counter in chat_data.items()},
+    }
+
+
+def needs_text(features: dict[str, bool]) -> bool:
+    """Нужны ли для подсчета выбранных опций тексты сообщений.
+
+    :param features: какие статистики надо подсчитать.
+    """
+    return any(DEPENDENCIES[feature].get("needs_text", False)
+               for feature in features.keys() if features[feature])
+
+
 # Константы
 
+# С какого числа сообщений анализировать чаты в нескольких процессах
+PARALLEL_MIN_MESSAGES = 1_000_000
+# Сколько самых частых слов чата и пользователя попадает в статистику
+TOP_WORDS = 10
+# class_ex_type не может быть lambda: результаты Chat_stat должны
+# сериализоваться pickle для передачи из процессов (см. start_analyses)
+# Необязательный ключ needs_text означает, что class_func нужен текст
+# сообщения: потоковый анализ (см. pipeline) хранит тексты только тогда, а
+# колоночные чаты для таких опций создаются с keep_text (см. needs_text)
 DEPENDENCIES = {
         "symb": {
             "class_type": defaultdict,
-            "class_ex_type": lambda: defaultdict(int),
+            "class_ex_type": partial(defaultdict, int),
             "class_func": counter_symbols,
+            "batch_func": batch_by_day,
             "return_type": dict,
             "return_func": return_text_info
         },
@@ -134,8 +409,9 @@ DEPENDENCIES = {
         # }
         "word": {
             "class_type": defaultdict,
-            "class_ex_type": lambda: defaultdict(int),
+            "class_ex_type": partial(defaultdict, int),
             "class_func": counter_words,
+            "batch_func": batch_by_day,
             "return_type": dict,
             "return_func": return_text_info
         },
@@ -149,8 +425,9 @@ DEPENDENCIES = {
         # }
         "msg": {
             "class_type": defaultdict,
-            "class_ex_type": lambda: defaultdict(int),
+            "class_ex_type": partial(defaultdict, int),
             "class_func": counter_msgs,
+            "batch_func": batch_by_day,
             "return_type": dict,
             "return_func": return_text_info
         },
@@ -164,8 +441,9 @@ DEPENDENCIES = {
         # }
         "voice_message": {
             "class_type": defaultdict,
-            "class_ex_type": lambda: defaultdict(int),
+            "class_ex_type": partial(defaultdict, int),
             "class_func": counter_files,
+            "batch_func": batch_files,
             "return_type": dict,
             "return_func": return_text_info
         },
@@ -180,8 +458,9 @@ DEPENDENCIES = {
         # }
         "video_message": {
             "class_type": defaultdict,
-            "class_ex_type": lambda: defaultdict(int),
+            "class_ex_type": partial(defaultdict, int),
             "class_func": counter_files,
+            "batch_func": batch_files,
             "return_type": dict,
             "return_func": return_text_info
         },
@@ -196,8 +475,9 @@ DEPENDENCIES = {
         # }
         "video_file": {
             "class_type": defaultdict,
-            "class_ex_type": lambda: defaultdict(int),
+            "class_ex_type": partial(defaultdict, int),
             "class_func": counter_files,
+            "batch_func": batch_files,
             "return_type": dict,
             "return_func": return_text_info
         },
@@ -214,6 +494,7 @@ DEPENDENCIES = {
             "class_type": defaultdict,
             "class_ex_type": int,
             "class_func": counter_photos,
+            "batch_func": batch_photos,
             "return_type": dict,
             "return_func": return_text_info
         },
@@ -226,11 +507,12 @@ DEPENDENCIES = {
         # }
         "day_night": {
             "class_type": defaultdict,
-            "class_ex_type": lambda: defaultdict(int),
+            "class_ex_type": partial(defaultdict, int),
             "class_func": counter_days_nights,
+            "batch_func": batch_days_nights,
             "return_type": dict,
             "return_func": return_text_info
-        }
+        },
         # day_night structure in final data:
         # "day_night": {
         #   chat.id: {
@@ -242,6 +524,27 @@ DEPENDENCIES = {
         #       }
         #   }
         # }
+        "top_words": {
+            "class_type": defaultdict,
+            "class_ex_type": words.WordCounter,
+            "class_func": counter_top_words,
+            "needs_text": True,
+            "return_type": dict,
+            "return_func": return_top_words
+        }
+        # top_words structure in final data:
+        # "top_words": {
+        #   chat.id: {
+        #       "chat": {
+        #           "word": int
+        #       },
+        #       "users": {
+        #           "username": {
+        #               "word": int
+        #           }
+        #       }
+        #   }
+        # }
     }
 
 
@@ -259,21 +562,50 @@ class Chat_stat():
         """Инициализирует объект класса, подсчитывая статистику по чату.
 
         :param features: какие статистики надо подсчитать.
-        :param chat: анализируемый чат.
+        :param chat: анализируемый чат (creator.Chat,
+        columnar.ColumnarChat или aggregates.ChatAggregates).
         :param time_gap: временной промежуток рассматриваемых сообщений.
         Начальная дата и конечная, aware.
         """
         for feature in DEPENDENCIES.keys():
-            if features[feature]:
+            if features.get(feature, False):
                 setattr(self,
                         feature,
                         DEPENDENCIES[feature]["class_type"](
                                 DEPENDENCIES[feature]["class_ex_type"]))
 
-        start_mes = bisect.bisect_left(chat.messages, time_gap[0],
-                                       key=lambda x: x.send_time)
-        end_mes = bisect.bisect_right(chat.messages, time_gap[1],
-                                      key=lambda x: x.send_time)
+        if isinstance(chat, aggregates.ChatAggregates):
+            chat.check_time_gap(time_gap)
+        if isinstance(chat, columnar.ColumnarChat):
+            # опции с пакетным подсчетом считаются сразу для всего чата, а
+            # на промежутке из целых дней - по суточным агрегатам
+            if aggregates.whole_days(time_gap):
+                batch = chat.day_cube().slice(time_gap)
+            else:
+                batch = MessageBatch(chat, time_gap)
+            features = dict(features)
+            for feature in features.keys():
+                if features[feature] and \
+                        "batch_func" in DEPENDENCIES[feature]:
+                    DEPENDENCIES[feature]["batch_func"](
+                            getattr(self, feature), batch, feature)
+                    features[feature] = False
+            if not any(features.values()):
+                return
+            if isinstance(chat, aggregates.ChatAggregates):
+                raise ValueError("Features without batch_func need messages "
+                                 "and can not be counted by aggregates")
+            if chat.texts is None and needs_text(features):
+                raise ValueError("Features with needs_text need message "
+                                 "texts, create the chat with "
+                                 "keep_text=True")
+
+        start_mes = bisect.bisect_left(chat.messages,
+                                       time_gap[0].timestamp(),
+                                       key=lambda x: x.timestamp)
+        end_mes = bisect.bisect_right(chat.messages,
+                                      time_gap[1].timestamp(),
+                                      key=lambda x: x.timestamp)
         for i in range(start_mes, end_mes):
             msg = chat.messages[i]
             for feature in features.keys():
@@ -287,13 +619,21 @@ class Chat_stat():
 def start_analyses(
         parsed_chats: list[creator.Chat],
         time_gap: tuple[datetime.datetime, datetime.datetime],
-        features: dict[str, bool]
+        features: dict[str, bool],
+        workers: int = None,
+        progress=None
         ) -> tuple[dict, dict[int, creator.Chat]]:
     """Основная функция для анализа.
 
-    :param parsed_chats: массив объектов класса Chat из creator.
+    :param parsed_chats: массив объектов класса Chat из creator или
+    ColumnarChat из columnar.
     :param time_gap: границы временного интервала (aware).
     :param features: словарь с необходимыми для подсчета статистик данными.
+    :param workers: число процессов для параллельного анализа чатов. По
+    умолчанию чаты анализируются последовательно в текущем процессе.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от проанализированных чатов.
+    :type progress: PySide6.QtCore.Signal(int)
     :return: массив, содержащий общую статистику и метаданные на отправку
     для репрезентации. Общая статистика представляет собой словарь, где
     ключом является имя опции, а значением - возврааемая структура опции,
@@ -306,7 +646,8 @@ def start_analyses(
     ret_parsed_chats = {}
     for chat in parsed_chats:
         ret_parsed_chats[chat.id] = chat   # упорядочивание для удобства html
-        analysed_chat = Chat_stat(features, chat, time_gap)
+    for chat, analysed_chat in zip(parsed_chats, _iter_chat_stats(
+            parsed_chats, time_gap, features, workers, progress)):
         for feature in features.keys():
             if features[feature]:
                 DEPENDENCIES[feature]["return_func"](
@@ -318,3 +659,50 @@ def start_analyses(
                  for feature in features.keys() if features[feature]}
 
     return ret_stats, ret_parsed_chats
+
+
+def _iter_chat_stats(
+        parsed_chats: list[creator.Chat],
+        time_gap: tuple[datetime.datetime, datetime.datetime],
+        features: dict[str, bool],
+        workers: int = None,
+        progress=None
+        ):
+    """Выдает объекты Chat_stat для чатов в исходном порядке.
+
+    При ``workers`` больше 1 чаты анализируются пулом процессов. Первыми
+    запускаются самые большие чаты, чтобы один большой чат, начатый
+    последним, не задерживал весь анализ.
+    :param parsed_chats: массив анализируемых чатов.
+    :param time_gap: границы временного интервала (aware).
+    :param features: словарь с необходимыми для подсчета статистик данными.
+    :param workers: число процессов.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от проанализированных чатов.
+    """
+    chats_num = len(parsed_chats)
+    if workers is None or workers <= 1 or chats_num <= 1:
+        for i, chat in enumerate(parsed_chats):
+            analysed_chat = Chat_stat(features, chat, time_gap)
+            if progress is not None:
+                progress.emit((i + 1) * 100 // chats_num)
+            yield analysed_chat
+        return
+
+    # spawn, а не fork: анализ может запускаться из треда GUI
+    with ProcessPoolExecutor(
+            min(workers, chats_num),
+            mp_context=multiprocessing.get_context("spawn")) as executor:
+        # размер чата - число его строк: сообщений, а у агрегатов - ячеек,
+        # по которым и идет подсчет
+        order = sorted(range(chats_num),
+                       key=lambda i: len(parsed_chats[i]),
+                       reverse=True)
+        futures = {executor.submit(Chat_stat, features, parsed_chats[i],
+                                   time_gap): i for i in order}
+        results = [None] * chats_num
+        for done, future in enumerate(as_completed(futures)):
+            results[futures[future]] = future.result()
+            if progress is not None:
+                progress.emit((done + 1) * 100 // chats_num)
+    yield from results
@@ -0,0 +1,252 @@
+"""Кэш разобранных файлов экспорта на диске.
+
+Для каждого экспорта хранится каталог с колонками всех его чатов в файлах
+.npy, которые открываются через mmap, и с файлом ``meta.json``, где лежат
+таблица строк (имена авторов) и описание чатов. Запись ищется по пути,
+размеру и времени изменения файла экспорта, а если они не совпали - по
+хэшу его содержимого, так что скопированный или заново сохраненный, но не
+изменившийся экспорт повторно не разбирается. Общий размер кэша
+ограничен, при превышении удаляются давно не использованные записи.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from .columnar import COLUMNS, ColumnarChat
+
+
+logger = logging.getLogger(__name__)
+
+# Константы
+
+CACHE_ENV = "TGANALYZER_CACHE"   # переменная окружения с каталогом кэша
+SIZE_LIMIT = 2 << 30   # ограничение общего размера кэша в байтах
+FORMAT = 1   # версия формата записи, записи других версий игнорируются
+META = "meta.json"
+HASH_CHUNK = 1 << 20   # размер читаемого за раз при хэшировании куска
+
+
+def default_dir() -> Path:
+    """Возвращает каталог кэша по умолчанию.
+
+    Берется из переменной окружения ``CACHE_ENV``, иначе используется
+    принятый в системе каталог для кэшей пользователя.
+    """
+    if path := os.environ.get(CACHE_ENV):
+        return Path(path)
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or \
+                Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "tganalyzer"
+
+
+def file_hash(path) -> str:
+    """Считает хэш содержимого файла.
+
+    :param path: путь к файлу.
+    :return: шестнадцатеричная строка.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while data := f.read(HASH_CHUNK):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def _source(path) -> list:
+    """Возвращает путь, размер и время изменения файла экспорта.
+
+    :param path: путь к файлу.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    return [str(path), stat.st_size, stat.st_mtime_ns]
+
+
+def _write_meta(entry: Path, meta: dict):
+    """Атомарно записывает описание записи.
+
+    :param entry: каталог записи.
+    :param meta: описание записи.
+    """
+    tmp = entry / (META + ".tmp")
+    tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, entry / META)
+
+
+class ExportCache():
+    """Кэш колоночных чатов (columnar.ColumnarChat) для файлов экспорта."""
+
+    def __init__(self, directory=None, size_limit: int = SIZE_LIMIT):
+        """Создает кэш.
+
+        :param directory: каталог кэша, по умолчанию ``default_dir()``.
+        :param size_limit: ограничение общего размера кэша в байтах.
+        """
+        self.directory = Path(directory) if directory else default_dir()
+        self.size_limit = size_limit
+
+    def _entries(self):
+        """Выдает пары из каталога записи и ее описания."""
+        if not self.directory.is_dir():
+            return
+        for entry in self.directory.iterdir():
+            try:
+                meta = json.loads((entry / META).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue   # не запись или запись еще создается
+            if meta.get("format") == FORMAT:
+                yield entry, meta
+
+    def _find(self, path):
+        """Находит запись для файла экспорта.
+
+        Хэш содержимого считается, только если не нашлось записи с тем же
+        путем, размером и временем изменения, но есть запись того же размера.
+        :param path: путь к файлу экспорта.
+        :return: пара из каталога записи и ее описания или None.
+        """
+        source = _source(path)
+        entries = list(self._entries())
+        for entry, meta in entries:
+            if source in meta["sources"]:
+                return entry, meta
+        if not any(meta["size"] == source[1] for _, meta in entries):
+            return None
+        digest = file_hash(path)
+        for entry, meta in entries:
+            if entry.name == digest:
+                # старые размер и время изменения этого пути уже не нужны
+                meta["sources"] = [old for old in meta["sources"]
+                                   if old[0] != source[0]] + [source]
+                return entry, meta
+        return None
+
+    def load(self, path) -> list[ColumnarChat]:
+        """Загружает чаты файла экспорта из кэша.
+
+        Колонки чатов являются срезами массивов, отображенных в память, и
+        читаются с диска по мере обращения к ним.
+        :param path: путь к файлу экспорта.
+        :return: массив чатов или None, если записи нет.
+        """
+        if (found := self._find(path)) is None:
+            return None
+        entry, meta = found
+        try:
+            columns = {name: np.load(entry / f"{name}.npy",
+                                     mmap_mode="r" if meta["messages"]
+                                     else None)
+                       for name in COLUMNS}
+            meta["used"] = time.time()
+            _write_meta(entry, meta)
+        except (OSError, ValueError) as error:
+            logger.warning("Dropping broken cache entry %s: %s", entry, error)
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        strings = meta["strings"]
+        chats = []
+        for header in meta["chats"]:
+            chat = ColumnarChat.__new__(ColumnarChat)
+            chat.name, chat.id, chat.type = \
+                header["name"], header["id"], header["type"]
+            chat.last_id = header["last_id"]
+            chat.authors = [strings[i] for i in header["authors"]]
+            chat.columns = {name: column[header["start"]:header["stop"]]
+                            for name, column in columns.items()}
+            chats.append(chat)
+        logger.info("Loaded %s from cache %s", path, entry)
+        return chats
+
+    def store(self, path, chats: list[ColumnarChat]):
+        """Сохраняет чаты файла экспорта в кэш.
+
+        Тексты сообщений не сохраняются. После записи лишние записи
+        удаляются (см. ``evict``).
+        :param path: путь к файлу экспорта.
+        :param chats: массив колоночных чатов этого файла.
+        """
+        source = _source(path)
+        digest = file_hash(path)
+        entry = self.directory / digest
+        if (entry / META).exists():
+            return   # тот же экспорт под другим путем найдется по хэшу
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.directory))
+        try:
+            strings = {}
+            headers = []
+            start = 0
+            for chat in chats:
+                stop = start + len(chat)
+                headers.append({
+                        "name": chat.name,
+                        "id": chat.id,
+                        "type": chat.type,
+                        "last_id": chat.last_id,
+                        "start": start,
+                        "stop": stop,
+                        "authors": [strings.setdefault(author, len(strings))
+                                    for author in chat.authors],
+                        })
+                start = stop
+            for name, dtype in COLUMNS.items():
+                column = np.concatenate(
+                        [chat.columns[name] for chat in chats]
+                        + [np.empty(0, dtype)]).astype(dtype, copy=False)
+                np.save(tmp / f"{name}.npy", column)
+            meta = {"format": FORMAT,
+                    "sources": [source],
+                    "size": source[1],
+                    "used": time.time(),
+                    "messages": start,
+                    "strings": list(strings),
+                    "chats": headers}
+            _write_meta(tmp, meta)
+            meta["bytes"] = sum(file.stat().st_size
+                                for file in tmp.iterdir())
+            _write_meta(tmp, meta)
+            os.replace(tmp, entry)
+        except OSError as error:
+            logger.warning("Could not cache %s: %s", path, error)
+            return
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=entry)
+
+    def evict(self, keep: Path = None):
+        """Удаляет давно не использованные записи сверх ограничения размера.
+
+        :param keep: каталог записи, которую удалять нельзя.
+        """
+        entries = sorted(self._entries(), key=lambda item: item[1]["used"])
+        total = sum(meta["bytes"] for _, meta in entries)
+        for entry, meta in entries:
+            if total <= self.size_limit:
+                break
+            if entry != keep:
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= meta["bytes"]
+
+    def clear(self, path=None):
+        """Удаляет записи кэша.
+
+        :param path: путь к файлу экспорта, записи которого нужно удалить.
+        По умолчанию удаляются все записи.
+        """
+        if path is not None:
+            path = str(Path(path).resolve())
+        for entry, meta in list(self._entries()):
+            if path is None or any(source[0] == path
+                                   for source in meta["sources"]):
+                shutil.rmtree(entry, ignore_errors=True)
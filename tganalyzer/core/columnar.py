@@ -0,0 +1,246 @@
+"""Колоночное представление чатов.
+
+Вместо объекта Message на каждое сообщение чат хранит параллельные массивы
+NumPy с нужными для анализа полями, а авторы и типы сообщений кодируются
+небольшими целыми числами.
+"""
+import datetime
+from array import array
+import numpy as np
+from . import creator
+
+
+# Константы
+
+# Все типы сообщений, которые выставляет creator.Message, код типа - индекс
+TYPES = ("simple_text",
+         "sticker",
+         "voice_message",
+         "video_message",
+         "audio_file",
+         "video_file",
+         "animation",
+         "file",
+         "photo",
+         "poll",
+         "contact",
+         "location",
+         "game",
+         "bot_usage",
+         "unknown",
+         "single_call",
+         "group_call")
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+# Колонки и их типы
+COLUMNS = {"send_time": np.int64,   # время отправки, секунды от эпохи (UTC)
+           "author": np.int32,   # индекс в таблице авторов
+           "type": np.int8,   # код типа из TYPES
+           "duration": np.int64,   # длительность медиа или звонка
+           "text_len": np.int64,   # длина текста в символах
+           "word_count": np.int64}   # число слов в тексте
+
+
+# Основные классы
+
+class ColumnarChat(creator.Chat):
+    """Чат, сообщения которого хранятся в параллельных массивах.
+
+    Поля name, id и type такие же, как у creator.Chat. Массивы сообщений
+    лежат в словаре ``columns`` (см. ``COLUMNS``), имена авторов - в списке
+    ``authors``, а тексты сообщений хранятся в ``texts``, только если это
+    запрошено при создании. Поле ``messages`` дает доступ к сообщениям через
+    объекты MessageView.
+    """
+
+    authors = None
+    columns = None
+    texts = None
+    _cube = None
+
+    def __init__(self, chat: dict, messages=None, keep_text: bool = False):
+        """Берет чат и заполняет массивы по его сообщениям.
+
+        :param chat: структура телеграмма, содержащая данные о чате.
+        :param messages: итерируемый объект со структурами сообщений. По
+        умолчанию берутся сообщения из ``chat["messages"]``.
+        :param keep_text: сохранять ли тексты сообщений.
+        """
+        self._init_fields(chat)
+        self._fill(self._iter_messages(chat, messages, keep_text),
+                   keep_text)
+
+    @classmethod
+    def from_chat(cls, chat: creator.Chat, keep_text: bool = False):
+        """Создает колоночный чат из обычного.
+
+        :param chat: объект класса creator.Chat.
+        :param keep_text: сохранять ли тексты сообщений.
+        """
+        self = cls.__new__(cls)
+        self.name, self.id, self.type = chat.name, chat.id, chat.type
+        self.last_id = chat.last_id
+        self._fill(chat.messages, keep_text)
+        return self
+
+    def _fill(self, messages, keep_text: bool):
+        """Заполняет массивы по объектам Message.
+
+        :param messages: итерируемый объект с объектами creator.Message.
+        :param keep_text: сохранять ли тексты сообщений.
+        """
+        authors = {}
+        columns = {name: array("q") for name in COLUMNS}
+        texts = [] if keep_text else None
+        for message in messages:
+            if (author := authors.get(message.author)) is None:
+                author = authors[message.author] = len(authors)
+            columns["send_time"].append(message.timestamp)
+            columns["author"].append(author)
+            columns["type"].append(TYPE_CODES[message.type])
+            columns["duration"].append(message.duration)
+            columns["text_len"].append(message.text_len)
+            columns["word_count"].append(message.word_count)
+            if keep_text:
+                texts.append(message.text)
+        self.authors = list(authors)
+        self.columns = {name: np.array(columns[name], dtype=dtype)
+                        for name, dtype in COLUMNS.items()}
+        self.texts = texts
+
+    def _concat(self, parts: list):
+        """Склеивает массивы частей чата.
+
+        Коды авторов каждой части переводятся в общую таблицу, в которой
+        авторы по-прежнему идут в порядке первого появления.
+        :param parts: массив частей чата в исходном порядке.
+        """
+        authors = {}
+        codes = []
+        for part in parts:
+            remap = np.array([authors.setdefault(author, len(authors))
+                              for author in part.authors], dtype=np.int32)
+            codes.append(remap[part.columns["author"]])
+        self.authors = list(authors)
+        self.columns = {name: np.concatenate(
+                                codes if name == "author"
+                                else [part.columns[name] for part in parts])
+                        for name in COLUMNS}
+        self.texts = None
+        if all(part.texts is not None for part in parts):
+            self.texts = [text for part in parts for text in part.texts]
+
+    def __len__(self):
+        """Число сообщений."""
+        return len(self.columns["send_time"])
+
+    def day_cube(self):
+        """Суточные агрегаты чата (aggregates.DayCube), строятся один раз."""
+        if self._cube is None:
+            from .aggregates import DayCube
+            self._cube = DayCube(self)
+        return self._cube
+
+    @property
+    def messages(self):
+        """Последовательность объектов MessageView по сообщениям чата."""
+        return MessagesView(self)
+
+
+class MessagesView():
+    """Последовательность сообщений колоночного чата."""
+
+    __slots__ = "chat",
+
+    def __init__(self, chat: ColumnarChat):
+        """Создает последовательность.
+
+        :param chat: колоночный чат.
+        """
+        self.chat = chat
+
+    def __len__(self):
+        """Число сообщений."""
+        return len(self.chat)
+
+    def __getitem__(self, idx: int):
+        """Возвращает сообщение по индексу.
+
+        :param idx: индекс сообщения.
+        """
+        if idx < 0:
+            idx += len(self)
+        if idx not in range(len(self)):
+            raise IndexError(f"{self.__class__.__name__} index out of range")
+        return MessageView(self.chat, idx)
+
+    def __iter__(self):
+        """Итерация по сообщениям."""
+        for idx in range(len(self)):
+            yield MessageView(self.chat, idx)
+
+
+class MessageView():
+    """Одно сообщение колоночного чата с полями как у creator.Message.
+
+    Значения читаются из массивов чата при обращении. Поле ``text``
+    доступно, только если чат хранит тексты, иначе оно равно None.
+    """
+
+    __slots__ = "chat", "idx"
+
+    def __init__(self, chat: ColumnarChat, idx: int):
+        """Создает представление сообщения.
+
+        :param chat: колоночный чат.
+        :param idx: индекс сообщения в чате.
+        """
+        self.chat = chat
+        self.idx = idx
+
+    def __repr__(self):
+        """Строковое представление."""
+        return (f"{self.__class__.__name__}({self.author!r}, "
+                f"{self.send_time.isoformat()}, {self.type})")
+
+    @property
+    def author(self) -> str:
+        """Имя автора."""
+        return self.chat.authors[self.chat.columns["author"][self.idx]]
+
+    @property
+    def timestamp(self) -> int:
+        """Время отправки в секундах от эпохи."""
+        return int(self.chat.columns["send_time"][self.idx])
+
+    @property
+    def send_time(self) -> datetime.datetime:
+        """Время отправки (aware, UTC)."""
+        return datetime.datetime.fromtimestamp(self.timestamp,
+                                               datetime.timezone.utc)
+
+    @property
+    def type(self) -> str:
+        """Тип сообщения."""
+        return TYPES[self.chat.columns["type"][self.idx]]
+
+    @property
+    def duration(self) -> int:
+        """Длительность медиа или звонка в секундах."""
+        return int(self.chat.columns["duration"][self.idx])
+
+    @property
+    def text_len(self) -> int:
+        """Длина текста в символах."""
+        return int(self.chat.columns["text_len"][self.idx])
+
+    @property
+    def word_count(self) -> int:
+        """Число слов в тексте."""
+        return int(self.chat.columns["word_count"][self.idx])
+
+    @property
+    def text(self) -> str:
+        """Текст сообщения, если чат хранит тексты."""
+        if self.chat.texts is None:
+            return None
+        return self.chat.texts[self.idx]
@@ -1,11 +1,56 @@
 """Специальный модуль для создания массива чатов."""
-import json
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+import functools
+import itertools
+import multiprocessing
+import os
+import sys
+import numpy as np
+from . import jsonstream
+from .jsonstream import JsonStream, count_raw_items, find_raw_items, \
+    get_backend
 
 
 # Константы и массивы
 
 ZERO = '.000000+00:00'   # для перевода времени в datetime
+CALL_TYPES = ("single_call", "group_call")   # типы служебных сообщений
+_MISSING = object()   # признак отсутствующего поля сообщения
+# Общие для всех сообщений пары (автор, тип)
+_KINDS = {}
+# Сколько дат сообщений переводится в числа за раз
+DECODE_BATCH = 1024
+# Типы медиа по значению media_type
+MEDIA_TYPES = {"sticker": "sticker",   # стикер
+               "voice_message": "voice_message",   # гска
+               "video_message": "video_message",   # кружочек
+               "audio_file": "audio_file",   # аудио файл
+               "video_file": "video_file",   # видео
+               "animation": "animation"}   # гифка
+# Остальные типы по наличию ключа, в порядке проверки
+KEY_TYPES = (("mime_type", "file"),   # сообщение с файлом
+             ("photo", "photo"),   # сообщение с фото
+             ("poll", "poll"),   # опросник
+             ("contact_information", "contact"),   # контакт
+             ("location_information", "location"),   # геолокация
+             ("game_title", "game"),   # игры
+             ("via_bot", "bot_usage"))   # использование бота
+# Типы звонков по значению action
+SERVICE_TYPES = {"phone_call": "single_call", "group_call": "group_call"}
+# Сколько частей чатов на процесс может ждать обработки при параллельном
+# разборе, прежде чем чтение файла приостановится
+PENDING_PER_WORKER = 4
+# С какого размера в байтах разбирать чаты в нескольких процессах: запуск
+# процессов окупается только на больших файлах
+PARALLEL_MIN_BYTES = 64 << 20
+# Служебные сообщения и звонки среди них в неразобранном json экспорта.
+# Ключ action и значение service поля type встречаются только у служебных
+# сообщений, а кавычки внутри строк экранируются, поэтому в тексте они не
+# найдутся.
+SERVICE_MARK = '"type": "service"'
+CALL_MARKS = ('"action": "phone_call"', '"action": "group_call"')
 required_fields_message = ['date',
                            'date_unixtime',
                            'from',
@@ -66,10 +111,76 @@ optional_fields_service = ['boosts',
                            'score',
                            'title',
                            'width']
+# Ключи, при которых сообщение без других ключей считается simple_text
+SIMPLE_TEXT_FIELDS = frozenset(required_fields_message
+                               + ['edited',
+                                  'edited_unixtime',
+                                  'forwarded_from',
+                                  'reply_to_message_id',
+                                  'reply_to_peer_id'])
 
 # Доп функции
 
 
+def decode_dates(dates: list[str]) -> list[int]:
+    """Переводит даты сообщений в секунды от эпохи одним вызовом numpy.
+
+    Даты экспорта записаны без часового пояса и, как и раньше,
+    считаются временем UTC. Поля ``date_unixtime`` для этого не подходят:
+    в них настоящее время отправки, которое отличается от ``date`` на
+    часовой пояс экспорта.
+    :param dates: даты вида ``2024-05-24T06:12:44``.
+    """
+    return np.array(dates, dtype="datetime64[s]").astype(np.int64).tolist()
+
+
+def _intern(value):
+    """Интернирует строку.
+
+    Остальные значения (например, None у автора удаленного аккаунта)
+    возвращаются как есть.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@functools.lru_cache(maxsize=1024)
+def _key_rule(keys: tuple[str, ...]) -> tuple[str, dict, str]:
+    """Правило определения типа для сообщений с данным набором ключей.
+
+    Тип почти всегда определяется одними ключами сообщения, поэтому
+    правило вычисляется один раз для каждого набора ключей (в экспорте их
+    немного).
+    :param keys: ключи структуры сообщения в порядке следования.
+    :return: тройка (поле, таблица, тип по умолчанию): тип сообщения равен
+    ``таблица.get(message[поле], тип по умолчанию)``, а если поле None -
+    типу по умолчанию.
+    """
+    present = frozenset(keys)
+    if "action" in present:   # служебное сообщение, звонок
+        return "action", SERVICE_TYPES, "group_call"
+    if present <= SIMPLE_TEXT_FIELDS:
+        return None, None, "simple_text"
+    default = next((msg_type for key, msg_type in KEY_TYPES
+                    if key in present), "unknown")
+    if "media_type" in present:
+        return "media_type", MEDIA_TYPES, default
+    return None, None, default
+
+
+def classify(message: dict) -> str:
+    """Определяет тип сообщения по его структуре.
+
+    Используется при создании Message, а значит, и колоночными чатами, и
+    потоковым разбором. Служебные сообщения, кроме звонков, должны быть
+    отброшены раньше.
+    :param message: структура телеграмма, содержащая данные о сообщении.
+    """
+    field, table, default = _key_rule(tuple(message))
+    if field is None:
+        return default
+    return table.get(message[field], default)
+
+
 def game_parcer(message: dict):
     """Вспомогательная функция, составляет таблицу пользователей.
 
@@ -88,19 +199,105 @@ def game_parcer(message: dict):
 class Extraction():
     """Этот класс достает информацию из json файла."""
 
-    def __init__(self, data_path: str):
+    data = None
+    stream = None
+    messages_offset = None   # смещение в байтах массива сообщений чата
+
+    def __init__(
+            self,
+            data_path: str,
+            stream: bool = False,
+            backend: str = None
+            ):
         """Достает информацию из json.
 
         :param data_path: путь к json файлу.
+        :param stream: если True, файл не загружается целиком, а читается
+        потоково методом ``iter_chats``.
+        :param backend: имя бэкенда разбора json (см.
+        ``jsonstream.get_backend``), по умолчанию самый быстрый из
+        установленных.
         """
-        with open(data_path, encoding='utf-8') as f:
-            self.data = json.load(f)
+        self.data_path = data_path
+        self.backend = get_backend(backend)
+        if not stream:
+            with open(data_path, "rb") as f:
+                self.data = self.backend.loads(f.read())
 
     def chats_ex(self):
         """Возвращает словарь из чатов."""
         self.chats = self.data['chats']['list']
         return self.chats
 
+    @property
+    def bytes_read(self) -> int:
+        """Количество уже прочитанных при потоковом разборе байт файла."""
+        return self.stream.bytes_read if self.stream is not None else 0
+
+    def iter_chats(self, raw: bool = False):
+        """Потоково обходит ``chats.list`` файла.
+
+        Для каждого чата выдает пару из словаря с полями чата (без сообщений)
+        и итератора по структурам сообщений. Итератор нужно исчерпать до
+        перехода к следующему чату, иначе оставшиеся сообщения пропускаются.
+        В памяти одновременно находится не больше одной пачки сообщений
+        размером около куска файла.
+        :param raw: если True, итератор выдает не сообщения, а их пачки:
+        списки структур или неразобранный текст json массива (см.
+        ``JsonStream.iter_batches``).
+        Смещение массива сообщений текущего чата в файле доступно в поле
+        ``messages_offset``.
+        """
+        with open(self.data_path, "rb") as f:
+            self.stream = stream = JsonStream(f, backend=self.backend)
+            for key in stream.iter_object():
+                if key != "chats":
+                    stream.skip_value()
+                    continue
+                for key in stream.iter_object():
+                    if key != "list":
+                        stream.skip_value()
+                        continue
+                    for _ in stream.iter_array():
+                        yield from self._chat_ex(stream, raw)
+
+    def _chat_ex(self, stream: JsonStream, raw: bool = False):
+        """Разбирает один чат из ``chats.list``.
+
+        :param stream: поток, стоящий на начале объекта чата.
+        :param raw: выдавать ли пачки сообщений вместо сообщений.
+        """
+        chat = {}
+        done = False
+        for key in stream.iter_object():
+            if key == "messages":
+                stream.peek()
+                self.messages_offset = stream.tell()
+            if key == "messages" and "id" in chat and "type" in chat:
+                messages = self._messages_ex(stream, raw)
+                yield chat, messages
+                for _ in messages:
+                    pass   # пропуск недочитанных сообщений
+                done = True
+            else:
+                chat[key] = stream.read_value()
+        if not done:   # поля чата идут после сообщений
+            messages = chat.pop("messages", [])
+            yield chat, iter([messages] if raw else messages)
+
+    @staticmethod
+    def _messages_ex(stream: JsonStream, raw: bool = False):
+        """Выдает сообщения чата по одному.
+
+        :param stream: поток, стоящий на начале массива сообщений.
+        :param raw: выдавать ли пачки сообщений вместо сообщений.
+        """
+        for batch in stream.iter_batches(raw):
+            if raw:
+                yield batch
+            else:
+                yield from batch
+
 
 class Chat():
     """Объект класса Chat состоит из полей чата телеграмма.
@@ -112,151 +309,657 @@ class Chat():
     id = None
     type = None
     messages = None
+    last_id = None   # id последнего сообщения чата в файле
 
-    def __init__(self, chat: dict):
+    def __init__(self, chat: dict, messages=None, keep_text: bool = True):
         """Берет чат и создает объект с упомянутыми выше полями.
 
         Еще итерирутеся по сообщениям чата и создает массив объектов Message.
+        :param chat: структура телеграмма, содержащая данные о чате.
+        :param messages: итерируемый объект со структурами сообщений. По
+        умолчанию берутся сообщения из ``chat["messages"]``.
+        :param keep_text: сохранять ли тексты сообщений. Для подсчета
+        статистик они не нужны, а занимают большую часть памяти сообщений.
+        """
+        self._init_fields(chat)
+        self.messages = list(self._iter_messages(chat, messages, keep_text))
+
+    @classmethod
+    def concat(cls, parts: list):
+        """Собирает чат из частей, созданных по подряд идущим сообщениям.
+
+        Имя личного чата берется из первой части, в которой оно найдено, как
+        если бы все сообщения разбирались одним объектом.
+        :param parts: непустой массив частей одного чата в исходном порядке.
+        """
+        if len(parts) == 1:
+            return parts[0]
+        self = cls.__new__(cls)
+        self.id, self.type = parts[0].id, parts[0].type
+        self.name = next((part.name for part in parts
+                          if part.name is not None), None)
+        self.last_id = next((part.last_id for part in reversed(parts)
+                             if part.last_id is not None), None)
+        self._concat(parts)
+        return self
+
+    def _concat(self, parts: list):
+        """Склеивает сообщения частей чата.
+
+        :param parts: массив частей чата в исходном порядке.
+        """
+        self.messages = [message for part in parts
+                         for message in part.messages]
+
+    def __len__(self):
+        """Число сообщений."""
+        return len(self.messages)
+
+    def _init_fields(self, chat: dict):
+        """Заполняет поля чата, кроме сообщений.
+
         :param chat: структура телеграмма, содержащая данные о чате.
         """
         self.name = chat["name"] if "name" in chat.keys() and \
                                     chat["type"] != "personal_chat" else None
         self.id = chat["id"]
         self.type = chat["type"]
-        messages = []
-        for message in chat['messages']:
-            if self.name is None and \
-                    self.type == "personal_chat" and \
-                    "from_id" in message.keys() and \
-                    message["from_id"] == "user" + str(self.id):
-                # Поиск полного имени контакта для определения имени чата
-                self.name = message["from"]
-            if message["type"] == "service" and \
-                    message["action"] != "phone_call" and \
-                    message["action"] != "group_call":
-                continue   # если сообщение типа service и не call, пропуск
-            messages.append(Message(message, chat))
-        self.messages = messages
+
+    def _iter_messages(self, chat: dict, messages=None,
+                       keep_text: bool = True):
+        """Создает объекты Message по структурам сообщений.
+
+        Попутно определяет имя личного чата и запоминает id последнего
+        сообщения.
+        :param chat: структура телеграмма, содержащая данные о чате.
+        :param messages: итерируемый объект со структурами сообщений. По
+        умолчанию берутся сообщения из ``chat["messages"]``.
+        :param keep_text: сохранять ли тексты в объектах Message.
+        """
+        if messages is None:
+            messages = chat['messages']
+        messages = iter(messages)
+        # даты переводятся в числа пачками по DECODE_BATCH сообщений
+        while batch := list(itertools.islice(messages, DECODE_BATCH)):
+            timestamps = decode_dates([message["date"]
+                                       for message in batch])
+            for message, timestamp in zip(batch, timestamps):
+                self.last_id = message["id"]
+                self._find_name(message)
+                if message["type"] == "service" and \
+                        message["action"] != "phone_call" and \
+                        message["action"] != "group_call":
+                    continue   # если сообщение типа service и не call
+                yield Message(message, chat, keep_text, timestamp)
+
+    def _find_name(self, message: dict):
+        """Определяет имя личного чата по сообщению контакта.
+
+        :param message: структура телеграмма, содержащая данные о сообщении.
+        """
+        if self.name is None and \
+                self.type == "personal_chat" and \
+                "from_id" in message.keys() and \
+                message["from_id"] == "user" + str(self.id):
+            # Поиск полного имени контакта для определения имени чата
+            self.name = message["from"]
 
 
 class Message():
     """Объект класса Message состоит из полей телеграмма.
 
     Еще есть некоторые поля, такие как тип, игровое место и тп.
+
+    Сообщения хранятся компактно, без ``__dict__``. Имя автора и тип
+    сообщения интернируются и хранятся одной общей для всех сообщений парой
+    (``_kind``), время отправки - числом секунд от эпохи (``timestamp``), а
+    datetime создается при обращении к ``send_time``. Редкие поля
+    (edit_time, forwarded_from, duration, sticker_emoji, game_title,
+    game_table) и сохраненный текст лежат в кортеже ``_extra`` из пар имя -
+    значение, который создается только у сообщений с такими полями. Они
+    читаются как обычные атрибуты, и у сообщения без поля обращение к нему,
+    как и раньше, вызывает AttributeError.
     """
 
-    author = None
-    send_time = None
-    type = None
-    text = ""
-    edited = None
-    forwarded = None
+    __slots__ = "_kind", "timestamp", "text_len", "word_count", "_extra"
 
-    def __init__(self, message: dict, chat: dict):
+    def __init__(self, message: dict, chat: dict, keep_text: bool = True,
+                 timestamp: int = None):
         """Берет сообщение и создает объект.
 
         Если сообщение типа service, то заведомо оно есть call.
         :param message: структура телеграмма, содержащая данные о сообщении.
         :param chat: структура телеграмма, содержащая данные о чате.
+        :param keep_text: сохранять ли текст сообщения. Длина текста и число
+        слов сохраняются всегда.
+        :param timestamp: время отправки в секундах от эпохи, если оно уже
+        получено из ``message["date"]`` (см. ``decode_dates``).
         """
-        send_time = datetime.fromisoformat(message["date"] + ZERO)
-        self.send_time = send_time
+        extra = []
+        if timestamp is None:
+            timestamp = decode_dates([message["date"]])[0]
+        self.timestamp = timestamp
         if isinstance(message["text"], list):
+            text = ""
             for i in message["text"]:
                 if isinstance(i, str):
-                    self.text += " " + i
+                    text += " " + i
                 else:
-                    self.text += " " + i["text"]
-            self.text = self.text.strip()
+                    text += " " + i["text"]
+            text = text.strip()
         else:
-            self.text = message["text"].strip()
+            text = message["text"].strip()
+        self.text_len = len(text)
+        self.word_count = len(text.split())
+        if keep_text and text:
+            extra += "text", text
+        msg_type = classify(message)
         if message["type"] == "service":
-            self.author = message["actor"]
-            if message["action"] == "phone_call":
-                self.duration = message["duration_seconds"] if \
-                        "duration_seconds" in message.keys() else 0
-                self.type = "single_call"
+            author = message["actor"]
+            if msg_type == "single_call":
+                duration = message.get("duration_seconds", 0)
             else:
-                self.duration = message["duration"] if \
-                        "duration" in message.keys() else 0
-                self.type = "group_call"
+                duration = message.get("duration", 0)
         else:
-            self.author = message["from"]
+            author = message["from"]
+            duration = 0
             if "edited" in message.keys():
-                self.edited = True
-                edit_time = datetime.fromisoformat(message["edited"] + ZERO)
-                self.edit_time = edit_time
-            else:
-                self.edited = False
+                # дата правки разбирается только при обращении
+                extra += "edit_time", message["edited"]
             if "forwarded_from" in message.keys():
-                self.forwarded = True
-                self.forwarded_from = message["forwarded_from"]
-            else:
-                self.forwarded = False
-            tmp_simple_text = True   # флаг для simple text сообщения
-            for key in message.keys():
-                if key not in required_fields_message and \
-                        key not in ['edited',
-                                    'edited_unixtime',
-                                    'forwarded_from',
-                                    'reply_to_message_id',
-                                    'reply_to_peer_id']:
-                    tmp_simple_text = False
-            if tmp_simple_text:
-                self.type = "simple_text"
-            elif "media_type" in message.keys() and \
-                    message["media_type"] in ["sticker",  # стикер
-                                              "voice_message",  # гска
-                                              "video_message",  # кружочек
-                                              "audio_file",  # аудио файл
-                                              "video_file",  # видео
-                                              "animation"]:  # гифка
-                self.type = message["media_type"]
-                if self.type == "sticker":
-                    if "sticker_emoji" in message.keys():
-                        self.sticker_emoji = message["sticker_emoji"]
-                    else:
-                        self.sticker_emoji = None
-                if "duration_seconds" in message.keys():
-                    self.duration = message["duration_seconds"]
-                else:
-                    self.duration = 0
-            elif "mime_type" in message.keys():   # сообщение с файлом
-                self.type = "file"
-            elif "photo" in message.keys():   # сообщение с фото
-                self.type = "photo"
-            elif "poll" in message.keys():   # опросник
-                self.type = "poll"
-            elif "contact_information" in message.keys():   # контакт
-                self.type = "contact"
-            elif "location_information" in message.keys():   # геолокация
-                self.type = "location"
-            elif "game_title" in message.keys():   # игры
-                self.type = "game"
-                self.game_title = message["game_title"]
-                self.game_table = game_parcer(message)
-            elif "via_bot" in message.keys():   # использование бота
-                self.type = "bot_usage"
-            else:
-                self.type = "unknown"
+                extra += "forwarded_from", _intern(message["forwarded_from"])
+            if msg_type in MEDIA_TYPES:
+                if msg_type == "sticker":
+                    extra += "sticker_emoji", \
+                        _intern(message.get("sticker_emoji"))
+                duration = message.get("duration_seconds", 0)
+            elif msg_type == "game":
+                extra += "game_title", message["game_title"]
+                extra += "game_table", game_parcer(message)
+        if duration:
+            extra += "duration", duration
+        kind = _intern(author), _intern(msg_type)
+        self._kind = _KINDS.setdefault(kind, kind)
+        self._extra = tuple(extra) if extra else None
+
+    def _get(self, name: str, *default):
+        """Возвращает редкое поле сообщения из ``_extra``.
+
+        :param name: имя поля.
+        :param default: значение, если поля нет. Если не задано, вызывается
+        AttributeError.
+        """
+        extra = self._extra
+        if extra is not None:
+            for i in range(0, len(extra), 2):
+                if extra[i] == name:
+                    return extra[i + 1]
+        if not default:
+            raise AttributeError(f"{self.__class__.__name__!r} object has "
+                                 f"no attribute {name!r}")
+        return default[0]
+
+    def __getattr__(self, name: str):
+        """Возвращает редкое поле сообщения, которого нет в слотах.
+
+        :param name: имя поля.
+        """
+        # служебные имена не ищутся в _extra: слот может быть еще не
+        # заполнен, например при восстановлении из pickle
+        if name.startswith("_"):
+            raise AttributeError(f"{self.__class__.__name__!r} object has "
+                                 f"no attribute {name!r}")
+        return self._get(name)
+
+    @property
+    def author(self) -> str:
+        """Имя автора."""
+        return self._kind[0]
+
+    @property
+    def type(self) -> str:
+        """Тип сообщения."""
+        return self._kind[1]
+
+    @property
+    def send_time(self) -> datetime:
+        """Время отправки (aware, UTC)."""
+        return datetime.fromtimestamp(self.timestamp, timezone.utc)
+
+    @property
+    def edit_time(self) -> datetime:
+        """Время правки (aware, UTC), есть только у измененных сообщений."""
+        return datetime.fromisoformat(self._get("edit_time") + ZERO)
+
+    @property
+    def text(self) -> str:
+        """Текст сообщения или None, если текст не сохранялся."""
+        if not self.text_len:
+            return ""
+        return self._get("text", None)
+
+    @property
+    def duration(self) -> int:
+        """Длительность медиа или звонка в секундах."""
+        return self._get("duration", 0)
+
+    @property
+    def edited(self) -> bool:
+        """Редактировалось ли сообщение (None у звонков)."""
+        if self.type in CALL_TYPES:
+            return None
+        return self._get("edit_time", None) is not None
+
+    @property
+    def forwarded(self) -> bool:
+        """Переслано ли сообщение (None у звонков)."""
+        if self.type in CALL_TYPES:
+            return None
+        return self._get("forwarded_from", _MISSING) is not _MISSING
+
+
+class LazyChat(Chat):
+    """Чат, сообщения которого еще не разобраны.
+
+    Хранит поля чата, число сообщений и положение массива сообщений в
+    файле, а сами сообщения создаются методом ``load``. Используется, чтобы
+    быстро показать список чатов и разбирать только выбранные.
+    """
+
+    path = None
+    header = None   # структура телеграмма с полями чата без сообщений
+    messages_num = 0
+    offset = None   # смещение массива сообщений в файле в байтах
+    size = 0   # размер массива сообщений в байтах
+    backend = None
+
+    def __len__(self):
+        """Число сообщений."""
+        return self.messages_num
+
+    @property
+    def messages(self):
+        """Сообщения создаются только методом ``load``."""
+        raise AttributeError("Messages of a LazyChat are not loaded, "
+                             "use load()")
+
+    def load(self, columnar: bool = False, progress=None,
+             keep_text: bool = None) -> Chat:
+        """Разбирает сообщения чата.
+
+        :param columnar: если True, создается columnar.ColumnarChat.
+        :param progress: функция, которой передается число прочитанных байт
+        массива сообщений.
+        :param keep_text: сохранять ли тексты сообщений. None - как принято
+        для класса чата: объекты Message хранят тексты, колоночный чат нет.
+        :return: полноценный чат.
+        """
+        chat_class = _chat_class(columnar, keep_text)
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            stream = JsonStream(f, backend=get_backend(self.backend))
+            messages = Extraction._messages_ex(stream)
+            if progress is not None:
+                messages = _report(messages, stream, progress)
+            return chat_class(self.header, messages)
+
+
+def _chat_class(columnar: bool, keep_text: bool = None):
+    """Класс создаваемых чатов.
+
+    :param columnar: если True, создается columnar.ColumnarChat.
+    :param keep_text: сохранять ли тексты сообщений, None - как принято для
+    класса.
+    :return: класс или функция, создающая чат по заголовку и сообщениям.
+    """
+    chat_class = Chat
+    if columnar:
+        from .columnar import ColumnarChat as chat_class
+    if keep_text is None:
+        return chat_class
+    return functools.partial(chat_class, keep_text=keep_text)
+
+
+def _report(items, stream: JsonStream, progress):
+    """Выдает элементы, передавая после каждого число прочитанных байт."""
+    for item in items:
+        yield item
+        progress(stream.bytes_read)
+
+
+def _count_batch(chat: LazyChat, batch, backend):
+    """Учитывает пачку сообщений при сканировании чата.
+
+    Сообщения считаются так же, как их создает Chat: без служебных
+    сообщений, кроме звонков. Из неразобранной пачки разбираются только
+    сообщения, в которых может найтись имя личного чата.
+    :param chat: сканируемый чат.
+    :param batch: пачка из ``Extraction.iter_chats(raw=True)``.
+    :param backend: бэкенд разбора json.
+    """
+    if isinstance(batch, str) and \
+            (count := count_raw_items(batch)) is not None:
+        chat.messages_num += count - batch.count(SERVICE_MARK) \
+            + sum(batch.count(mark) for mark in CALL_MARKS)
+        if chat.name is None and chat.type == "personal_chat":
+            # значение from_id контакта
+            for message in find_raw_items(batch, f'"user{chat.id}"',
+                                          backend):
+                chat._find_name(message)
+                if chat.name is not None:
+                    break
+        return
+    if isinstance(batch, str):
+        batch = backend.loads(batch)
+    for message in batch:
+        chat._find_name(message)
+        if message["type"] != "service" or \
+                message["action"] in ("phone_call", "group_call"):
+            chat.messages_num += 1
+
+
+def scan_chats(
+        path: str,
+        progress=None,
+        backend: str = None
+        ) -> list[LazyChat]:
+    """Быстро находит чаты файла json, не создавая сообщений.
+
+    Для каждого чата определяются поля, число сообщений и положение
+    массива сообщений в файле. Сообщения при этом по возможности не
+    разбираются: они считаются по неразобранному тексту пачек.
+    :param path: путь к анализируемому файлу json.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от прочитанных байт файла.
+    :type progress: PySide6.QtCore.Signal(int)
+    :param backend: имя бэкенда разбора json.
+    :return: массив объектов LazyChat.
+    """
+    extractor = Extraction(path, stream=True, backend=backend)
+    tracker = BytesProgress(extractor, progress) \
+        if progress is not None else None
+    chats = []
+    end = os.path.getsize(path)
+    for header, batches in extractor.iter_chats(raw=True):
+        chat = LazyChat.__new__(LazyChat)
+        chat._init_fields(header)
+        chat.path, chat.header = path, header
+        chat.offset = extractor.messages_offset
+        chat.backend = extractor.backend.name
+        if tracker is not None:
+            batches = tracker.track(batches)
+        for batch in batches:
+            _count_batch(chat, batch, extractor.backend)
+        chats.append(chat)
+    # размер массива оценивается по началу следующего, чтобы не считать
+    # позицию в файле лишний раз
+    for chat in reversed(chats):
+        chat.size, end = max(end - chat.offset, 0), chat.offset
+    if progress is not None:
+        progress.emit(100)
+    return chats
+
+
+def load_chats(
+        chats: list[Chat],
+        progress=None,
+        columnar: bool = False,
+        workers: int = None,
+        keep_text: bool = None
+        ) -> list[Chat]:
+    """Разбирает сообщения выбранных чатов, найденных ``scan_chats``.
+
+    :param chats: массив чатов. Уже разобранные чаты возвращаются как есть.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от прочитанных байт массивов сообщений.
+    :type progress: PySide6.QtCore.Signal(int)
+    :param columnar: если True, создаются объекты columnar.ColumnarChat.
+    :param workers: если больше 1, чаты разбираются таким числом процессов.
+    :param keep_text: сохранять ли тексты сообщений (см. LazyChat.load).
+    :return: массив разобранных чатов в том же порядке.
+    """
+    lazy = [chat for chat in chats if isinstance(chat, LazyChat)]
+    total = sum(chat.size for chat in lazy) or 1
+    loaded = {}
+    if workers is not None and workers > 1 and len(lazy) > 1:
+        # spawn, а не fork: разбор может запускаться из треда GUI
+        with ProcessPoolExecutor(
+                min(workers, len(lazy)),
+                mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+            # первыми запускаются самые большие чаты
+            futures = {executor.submit(chat.load, columnar, None,
+                                       keep_text): chat
+                       for chat in sorted(lazy, key=lambda chat: chat.size,
+                                          reverse=True)}
+            done = 0
+            for future in as_completed(futures):
+                loaded[id(futures[future])] = future.result()
+                done += futures[future].size
+                if progress is not None:
+                    progress.emit(min(done * 100 // total, 99))
+    else:
+        done = 0
+        percent = 0
+
+        def report(bytes_read: int):
+            """Сообщает о прогрессе по прочитанным байтам чата."""
+            nonlocal percent
+            if (now := min((done + bytes_read) * 100 // total, 99)) \
+                    > percent:
+                percent = now
+                progress.emit(now)
+
+        for chat in lazy:
+            loaded[id(chat)] = chat.load(
+                    columnar, report if progress is not None else None,
+                    keep_text)
+            done += chat.size
+    if progress is not None:
+        progress.emit(100)
+    return [loaded.get(id(chat), chat) for chat in chats]
+
+
+class BytesProgress():
+    """Сообщает о прогрессе разбора в процентах от прочитанных байт файла."""
+
+    def __init__(self, extractor: Extraction, progress):
+        """Создает счетчик прогресса.
+
+        :param extractor: объект, читающий файл потоково.
+        :param progress: сигнал для GUI.
+        """
+        self.extractor = extractor
+        self.progress = progress
+        self.size = os.path.getsize(extractor.data_path) or 1
+        self.percent = 0
+
+    def update(self):
+        """Отправляет новый процент, если он изменился."""
+        # 100% отправляется только после разбора всего файла
+        now = min(self.extractor.bytes_read * 100 // self.size, 99)
+        if now > self.percent:
+            self.percent = now
+            self.progress.emit(now)
+
+    def track(self, items):
+        """Выдает элементы, сообщая о прогрессе после каждого.
+
+        :param items: итерируемый объект, читающий файл.
+        """
+        for item in items:
+            yield item
+            self.update()
+
+
+@functools.cache
+def _worker_backend(name: str):
+    """Бэкенд разбора json в процессе-исполнителе, создается один раз."""
+    return get_backend(name)
+
+
+def _build_part(chat: dict, batches: list, backend: str, columnar: bool,
+                keep_text: bool = None):
+    """Создает часть чата по пачкам его подряд идущих сообщений.
+
+    Выполняется в процессе-исполнителе.
+    :param chat: структура телеграмма с полями чата без сообщений.
+    :param batches: пачки сообщений из ``Extraction.iter_chats(raw=True)``.
+    :param backend: имя бэкенда разбора json.
+    :param columnar: создавать ли columnar.ColumnarChat.
+    :param keep_text: сохранять ли тексты сообщений (см. LazyChat.load).
+    :return: чат, содержащий только эти сообщения.
+    """
+    loads = _worker_backend(backend).loads
+    messages = (message for batch in batches
+                for message in (loads(batch) if isinstance(batch, str)
+                                else batch))
+    return _chat_class(columnar, keep_text)(chat, messages)
+
+
+def _parallel_creator(
+        path: str,
+        progress=None,
+        backend: str = None,
+        columnar: bool = False,
+        workers: int = 2,
+        keep_text: bool = None
+        ) -> list[Chat]:
+    """Разбирает файл json пулом процессов.
+
+    Основной процесс только находит в файле границы пачек сообщений, а
+    разбор json и создание объектов выполняют процессы-исполнители. Пачки
+    одного чата объединяются в части размером около куска файла, так что
+    большие чаты делятся на диапазоны сообщений, а маленькие передаются
+    целиком. Готовые части склеиваются методом ``concat`` в исходном
+    порядке. Параметры такие же, как у ``start_creator``.
+    :param workers: число процессов.
+    :return: массив объектов класса Chat.
+    """
+    chat_class = Chat
+    if columnar:
+        from .columnar import ColumnarChat as chat_class
+    extractor = Extraction(path, stream=True, backend=backend)
+    tracker = BytesProgress(extractor, progress) \
+        if progress is not None else None
+    chats = []
+    pending = deque()
+    # spawn, а не fork: разбор может запускаться из треда GUI
+    with ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn")) as executor:
+
+        def submit(chat: dict, batches: list):
+            """Отправляет часть чата исполнителям."""
+            future = executor.submit(_build_part, chat, batches,
+                                     extractor.backend.name, columnar,
+                                     keep_text)
+            pending.append(future)
+            while len(pending) > PENDING_PER_WORKER * workers:
+                pending.popleft().result()
+            return future
+
+        for chat, batches in extractor.iter_chats(raw=True):
+            futures, part, part_size = [], [], 0
+            if tracker is not None:
+                batches = tracker.track(batches)
+            for batch in batches:
+                part.append(batch)
+                part_size += len(batch) if isinstance(batch, str) else 1
+                if part_size >= jsonstream.CHUNK_SIZE:
+                    futures.append(submit(chat, part))
+                    part, part_size = [], 0
+            if part or not futures:
+                futures.append(submit(chat, part))
+            chats.append(futures)
+        chats = [chat_class.concat([future.result() for future in futures])
+                 for futures in chats]
+    if progress is not None:
+        progress.emit(100)
+    return chats
+
+
+def iter_creator(
+        path: str,
+        progress=None,
+        backend: str = None,
+        columnar: bool = False,
+        keep_text: bool = None
+        ):
+    """Потоково разбирает файл json, выдавая объекты класса Chat по одному.
+
+    Файл целиком в память не загружается: одновременно хранится только
+    создаваемый чат.
+    :param path: путь к анализируемому файлу json.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от прочитанных байт файла.
+    :type progress: PySide6.QtCore.Signal(int)
+    :param backend: имя бэкенда разбора json.
+    :param columnar: если True, выдаются объекты columnar.ColumnarChat.
+    :param keep_text: сохранять ли тексты сообщений (см. LazyChat.load).
+    """
+    chat_class = _chat_class(columnar, keep_text)
+    extractor = Extraction(path, stream=True, backend=backend)
+    tracker = BytesProgress(extractor, progress) \
+        if progress is not None else None
+    for chat, messages in extractor.iter_chats():
+        if tracker is not None:
+            messages = tracker.track(messages)
+        yield chat_class(chat, messages)
+    if progress is not None:
+        progress.emit(100)
 
 
-def start_creator(path: str, progress=None) -> list[Chat]:
+def start_creator(
+        path: str,
+        progress=None,
+        backend: str = None,
+        columnar: bool = False,
+        workers: int = None,
+        cache=None,
+        keep_text: bool = None
+        ) -> list[Chat]:
     """Анализирует файл json и возвращает массив с объектами класса Chat.
 
     :param path: путь к анализируемому файлу json.
     :param progress: сигнал для GUI, который отображает прогресс выполнения
-    задачи в процентах.
+    задачи в процентах от прочитанных байт файла.
     :type progress: PySide6.QtCore.Signal(int)
+    :param backend: имя бэкенда разбора json (см. ``jsonstream.BACKENDS``),
+    по умолчанию берется из переменной окружения ``TGANALYZER_JSON`` или
+    выбирается самый быстрый из установленных.
+    :param columnar: если True, сообщения хранятся не объектами Message, а
+    в массивах (см. columnar.ColumnarChat).
+    :param workers: если больше 1, разбор json и создание сообщений
+    выполняются таким числом процессов. Результат тот же, что и при
+    последовательном разборе.
+    :param cache: кэш разобранных файлов (cache.ExportCache) или True для
+    кэша в каталоге по умолчанию. Если файл уже есть в кэше, он не
+    разбирается, иначе результат разбора сохраняется в кэш. Работает только
+    вместе с ``columnar``.
+    :param keep_text: сохранять ли тексты сообщений. None - как принято для
+    класса чата: объекты Message хранят тексты, колоночные чаты нет. Без
+    текстов объекты Message занимают в несколько раз меньше памяти. Тексты
+    в кэше не хранятся, поэтому с ``keep_text`` файл разбирается заново, а
+    кэш только обновляется.
     :return: массив объектов класса Chat.
     """
-    extractor = Extraction(path)
-    old_chats = extractor.chats_ex()
-    ret_chats = []
-    old_chats_num = len(old_chats)
-    for i, chat in enumerate(old_chats):
-        ret_chats.append(Chat(chat))
-        if progress is not None:
-            progress.emit((i + 1) * 100 // old_chats_num)
-
-    return ret_chats
+    if cache:
+        if not columnar:
+            raise ValueError("Only columnar chats can be cached")
+        from .cache import ExportCache
+        if cache is True:
+            cache = ExportCache()
+        if not keep_text and (chats := cache.load(path)) is not None:
+            if progress is not None:
+                progress.emit(100)
+            return chats
+    if workers is not None and workers > 1:
+        chats = _parallel_creator(path, progress, backend, columnar, workers,
+                                  keep_text)
+    else:
+        chats = list(iter_creator(path, progress, backend, columnar,
+                                  keep_text))
+    if cache:
+        cache.store(path, chats)
+    return chats
@@ -0,0 +1,219 @@
+"""Инкрементальный разбор новых экспортов того же аккаунта.
+
+Агрегаты чатов (aggregates.ChatAggregates) сохраняются на диск вместе с id
+последнего сообщения каждого чата. Когда открывается более новый экспорт,
+в котором встречаются те же чаты, из него разбираются только сообщения с
+большими id, а их агрегаты складываются с сохраненными. Экспорт считается
+продолжением сохраненного, то есть старые сообщения в нем не меняются.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import time
+import uuid
+import numpy as np
+from .aggregates import CELL_COLUMNS, ChatAggregates
+from .cache import default_dir
+from .columnar import ColumnarChat
+from .creator import BytesProgress, Extraction
+from .jsonstream import last_raw_item
+
+
+logger = logging.getLogger(__name__)
+
+# Константы
+
+MAX_STATES = 8   # сколько сохраненных состояний хранить
+FORMAT = 1   # версия формата состояния, состояния других версий игнорируются
+META = "meta.json"
+CELLS = "cells.npz"
+
+
+class AggregateStore():
+    """Хранилище агрегатов разобранных экспортов.
+
+    Каждое состояние - это агрегаты всех чатов одного экспорта. Состояние
+    находится по id чата, а после разбора нового экспорта заменяется новым.
+    """
+
+    def __init__(self, directory=None, max_states: int = MAX_STATES):
+        """Создает хранилище.
+
+        :param directory: каталог хранилища, по умолчанию подкаталог
+        aggregates каталога кэша (см. ``cache.default_dir``).
+        :param max_states: сколько состояний хранить. Лишние удаляются,
+        начиная с давно не использованных.
+        """
+        self.directory = Path(directory) if directory else \
+            default_dir() / "aggregates"
+        self.max_states = max_states
+
+    def _states(self):
+        """Выдает пары из каталога состояния и его описания."""
+        if not self.directory.is_dir():
+            return
+        for entry in self.directory.iterdir():
+            try:
+                meta = json.loads((entry / META).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if meta.get("format") == FORMAT:
+                yield entry, meta
+
+    def find(self, chat_id: int):
+        """Загружает последнее использованное состояние, где есть чат.
+
+        :param chat_id: id чата.
+        :return: пара из каталога состояния и словаря агрегатов его чатов по
+        их id или None, если такого состояния нет.
+        """
+        states = sorted(self._states(), key=lambda item: item[1]["used"],
+                        reverse=True)
+        for entry, meta in states:
+            if any(header["id"] == chat_id for header in meta["chats"]):
+                try:
+                    with np.load(entry / CELLS) as cells:
+                        cells = {name: cells[name] for name in CELL_COLUMNS}
+                except (OSError, ValueError, KeyError) as error:
+                    logger.warning("Dropping broken state %s: %s", entry,
+                                   error)
+                    shutil.rmtree(entry, ignore_errors=True)
+                    continue
+                return entry, {header["id"]: self._chat(header, cells)
+                               for header in meta["chats"]}
+        return None
+
+    @staticmethod
+    def _chat(header: dict, cells: dict) -> ChatAggregates:
+        """Создает агрегаты чата по описанию и общим колонкам ячеек.
+
+        :param header: описание чата из meta.json.
+        :param cells: колонки ячеек всех чатов состояния.
+        """
+        chat = ChatAggregates.__new__(ChatAggregates)
+        chat.name, chat.id, chat.type = \
+            header["name"], header["id"], header["type"]
+        chat.last_id = header["last_id"]
+        chat.messages_num = header["messages"]
+        chat.authors = header["authors"]
+        chat.columns = {name: column[header["start"]:header["stop"]]
+                        for name, column in cells.items()}
+        return chat
+
+    def save(self, chats: list[ChatAggregates], replace: Path = None):
+        """Сохраняет агрегаты чатов экспорта как новое состояние.
+
+        :param chats: агрегаты всех чатов экспорта.
+        :param replace: каталог состояния, которое новое заменяет.
+        """
+        headers = []
+        start = 0
+        for chat in chats:
+            stop = start + len(chat)
+            headers.append({"name": chat.name,
+                            "id": chat.id,
+                            "type": chat.type,
+                            "last_id": chat.last_id,
+                            "messages": chat.messages_num,
+                            "authors": chat.authors,
+                            "start": start,
+                            "stop": stop})
+            start = stop
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.directory))
+        try:
+            np.savez(tmp / CELLS, **{
+                    name: np.concatenate([chat.columns[name]
+                                          for chat in chats]
+                                         + [np.empty(0, dtype)])
+                    .astype(dtype, copy=False)
+                    for name, dtype in CELL_COLUMNS.items()})
+            (tmp / META).write_text(
+                    json.dumps({"format": FORMAT,
+                                "used": time.time(),
+                                "chats": headers}, ensure_ascii=False),
+                    encoding="utf-8")
+            os.replace(tmp, self.directory / uuid.uuid4().hex)
+        except OSError as error:
+            logger.warning("Could not save aggregates: %s", error)
+            return
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        if replace is not None:
+            shutil.rmtree(replace, ignore_errors=True)
+        states = sorted(self._states(), key=lambda item: item[1]["used"],
+                        reverse=True)
+        for entry, _ in states[self.max_states:]:
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def clear(self):
+        """Удаляет все состояния."""
+        for entry, _ in list(self._states()):
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def _new_messages(batches, mark: int, backend):
+    """Выдает сообщения чата с id больше сохраненного.
+
+    Пачки, последнее сообщение которых не новее ``mark``, пропускаются без
+    разбора.
+    :param batches: пачки сообщений из ``Extraction.iter_chats(raw=True)``.
+    :param mark: id последнего уже учтенного сообщения или None.
+    :param backend: бэкенд разбора json.
+    """
+    for batch in batches:
+        if isinstance(batch, str):
+            if mark is not None and \
+                    (last := last_raw_item(batch, backend)) is not None and \
+                    last["id"] <= mark:
+                continue
+            batch = backend.loads(batch)
+        for message in batch:
+            if mark is None or message["id"] > mark:
+                yield message
+
+
+def start_incremental(
+        path: str,
+        progress=None,
+        backend: str = None,
+        store: AggregateStore = None
+        ) -> list[ChatAggregates]:
+    """Разбирает файл json, используя агрегаты прошлого экспорта.
+
+    Состояние прошлого экспорта выбирается по первому чату файла, который
+    в нем есть. Чаты из этого состояния разбираются начиная с сообщения,
+    следующего за последним учтенным, остальные чаты - целиком. Результат
+    сохраняется как новое состояние вместо старого.
+    :param path: путь к анализируемому файлу json.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от прочитанных байт файла.
+    :type progress: PySide6.QtCore.Signal(int)
+    :param backend: имя бэкенда разбора json.
+    :param store: хранилище агрегатов, по умолчанию в каталоге кэша.
+    :return: массив агрегатов чатов, который можно передать в
+    analyzer.start_analyses вместо массива чатов.
+    """
+    store = store or AggregateStore()
+    extractor = Extraction(path, stream=True, backend=backend)
+    tracker = BytesProgress(extractor, progress) \
+        if progress is not None else None
+    state = None
+    chats = []
+    for chat, batches in extractor.iter_chats(raw=True):
+        if tracker is not None:
+            batches = tracker.track(batches)
+        if state is None:
+            state = store.find(chat["id"])
+        old = state[1].get(chat["id"]) if state is not None else None
+        mark = old.last_id if old is not None else None
+        new = ChatAggregates.from_chat(ColumnarChat(
+                chat, _new_messages(batches, mark, extractor.backend)))
+        chats.append(old.merge(new) if old is not None else new)
+    store.save(chats, state[0] if state is not None else None)
+    if progress is not None:
+        progress.emit(100)
+    return chats
@@ -0,0 +1,413 @@
+"""Потоковое чтение больших json файлов без загрузки их целиком в память.
+
+Для разбора значений используется самая быстрая из установленных
+библиотек (см. ``BACKENDS``), иначе стандартный модуль json.
+"""
+import codecs
+import gc
+import importlib.util
+import json
+import logging
+import os
+import re
+
+
+logger = logging.getLogger(__name__)
+
+# Константы
+
+CHUNK_SIZE = 1 << 20   # размер читаемого за раз куска файла в байтах
+LOOKBEHIND = 80   # сколько символов перед текущей позицией хранить в буфере
+BACKEND_ENV = "TGANALYZER_JSON"   # переменная окружения для выбора бэкенда
+# Бэкенды разбора json в порядке предпочтения: имя модуля и его функция
+# разбора, принимающая str или bytes
+BACKENDS = {
+        "orjson": "loads",
+        "simdjson": "loads",
+        "json": "loads",
+        }
+# Участок json без скобок, в котором строки (вместе со скобками внутри них)
+# встречаются только целиком. Позволяет искать конец значения, останавливаясь
+# только на скобках, а не на каждой строке.
+_RUN = re.compile(r'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR = re.compile(r'[^\s,:\]}]+')
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+WHITESPACE = " \t\n\r"
+
+
+class JsonBackend():
+    """Бэкенд разбора json: имя и функция ``loads``."""
+
+    def __init__(self, name: str, loads):
+        """Создает бэкенд.
+
+        :param name: имя модуля бэкенда.
+        :param loads: функция разбора str или bytes в объекты python.
+        """
+        self.name = name
+        self._loads = loads
+
+    def loads(self, data):
+        """Разбирает json.
+
+        На время разбора сборщик циклического мусора отключается: разбор
+        создает миллионы объектов без циклов, и повторные проходы сборщика по
+        ним занимают больше времени, чем сам разбор.
+        :param data: строка или байты с json.
+        """
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._loads(data)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def __repr__(self):
+        """Строковое представление."""
+        return f"{self.__class__.__name__}({self.name!r})"
+
+
+def available_backends() -> list[str]:
+    """Возвращает имена установленных бэкендов в порядке предпочтения."""
+    return [name for name in BACKENDS
+            if importlib.util.find_spec(name) is not None]
+
+
+def get_backend(name: str = None) -> JsonBackend:
+    """Выбирает бэкенд разбора json.
+
+    :param name: имя бэкенда из ``BACKENDS``. Если не задано, берется из
+    переменной окружения ``BACKEND_ENV``, а если нет и ее, то выбирается
+    первый установленный.
+    :return: выбранный бэкенд.
+    """
+    name = name or os.environ.get(BACKEND_ENV) or "auto"
+    if name == "auto":
+        name = available_backends()[0]
+    elif name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {name!r}. One of these was "
+                         f"expected: auto, {', '.join(BACKENDS)}")
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        raise ValueError(f"JSON backend {name!r} is not installed") from None
+    logger.info("Using %s JSON backend", name)
+    return JsonBackend(name, getattr(module, BACKENDS[name]))
+
+
+class JsonStream():
+    """Последовательно читает json из бинарного файла кусками.
+
+    В памяти хранится только текущий кусок файла и разбираемое значение.
+    Объекты и массивы обходятся генераторами ``iter_object`` и
+    ``iter_array``, а отдельные значения читаются ``read_value`` или
+    пропускаются ``skip_value``.
+    """
+
+    def __init__(
+            self,
+            file,
+            chunk_size: int = None,
+            backend: JsonBackend = None
+            ):
+        """Создает поток.
+
+        :param file: файл, открытый в бинарном режиме.
+        :param chunk_size: размер читаемого за раз куска в байтах.
+        :param backend: бэкенд разбора значений, по умолчанию json.
+        """
+        self.file = file
+        try:   # смещение начала чтения, если файл уже не в начале
+            self.start = file.tell()
+        except (AttributeError, OSError):
+            self.start = 0
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.backend = backend or JsonBackend("json", json.loads)
+        self.bytes_read = 0   # сколько байт файла уже прочитано
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._batched = True
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Дочитывает следующий кусок файла, отбрасывая разобранную часть.
+
+        Перед текущей позицией остается не больше ``LOOKBEHIND`` символов,
+        поэтому индексы в буфере сдвигаются, а смещения от ``self.pos`` нет.
+        :return: False, если файл уже закончился.
+        """
+        if self.eof:
+            return False
+        data = self.file.read(self.chunk_size)
+        self.bytes_read += len(data)
+        self.eof = not data
+        start = max(self.pos - LOOKBEHIND, 0)
+        self.buf = self.buf[start:] + self._utf8.decode(data, self.eof)
+        self.pos -= start
+        return True
+
+    def tell(self) -> int:
+        """Возвращает смещение текущей позиции в файле в байтах."""
+        pending = len(self._utf8.getstate()[0])   # недекодированные байты
+        return self.start + self.bytes_read - pending \
+            - len(self.buf[self.pos:].encode("utf-8"))
+
+    def peek(self) -> str:
+        """Пропускает пробельные символы и возвращает следующий символ.
+
+        :return: следующий значимый символ или "" в конце файла.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        """Пропускает ожидаемый символ.
+
+        :param char: ожидаемый символ.
+        """
+        got = self.peek()
+        if got != char:
+            raise ValueError(f"Expected {char!r}, got {got!r} "
+                             f"near byte {self.bytes_read}")
+        self.pos += 1
+
+    def _value_end(self) -> int:
+        """Находит конец следующего значения, дочитывая файл при нужде.
+
+        :return: индекс в ``self.buf`` сразу после значения.
+        """
+        char = self.peek()
+        if char in "{[":
+            offset, depth = 0, 0
+            while True:
+                buf = self.buf
+                pos = _RUN.match(buf, self.pos + offset).end()
+                if pos < len(buf) and buf[pos] != '"':
+                    depth += 1 if buf[pos] in "{[" else -1
+                    offset = pos + 1 - self.pos
+                    if depth == 0:
+                        return pos + 1
+                    continue
+                # строка или значение обрывается на границе куска
+                offset = pos - self.pos
+                if not self._fill():
+                    raise ValueError("Unexpected end of json file")
+        pattern = _STRING if char == '"' else _SCALAR
+        while True:
+            match = pattern.match(self.buf, self.pos)
+            if match is not None and (match.end() < len(self.buf)
+                                      or self.eof):
+                return match.end()
+            if not self._fill():
+                raise ValueError("Unexpected end of json file")
+
+    def read_value(self):
+        """Читает и возвращает следующее значение."""
+        self.peek()
+        if self.backend.name != "json":
+            # сторонним бэкендам нужен ровно один целый json
+            end = self._value_end()
+            value = self.backend.loads(self.buf[self.pos:end])
+            self.pos = end
+            return value
+        try:
+            value, end = self._decoder.raw_decode(self.buf, self.pos)
+        except json.JSONDecodeError:
+            end = None
+        if end is None or end == len(self.buf) and not self.eof:
+            # значение обрезано границей куска
+            self._value_end()
+            value, end = self._decoder.raw_decode(self.buf, self.pos)
+        self.pos = end
+        return value
+
+    def skip_value(self):
+        """Пропускает следующее значение, не разбирая его."""
+        self.pos = self._value_end()
+
+    def iter_object(self):
+        """Обходит объект, выдавая его ключи.
+
+        После получения ключа значение нужно прочитать или пропустить до
+        следующей итерации.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+    def _read_batch(self, raw: bool = False):
+        """Пробует прочитать несколько объектов массива одним разбором.
+
+        В файле с отступами (как экспорт Telegram) за объектом массива, после
+        которого есть еще объекты, следуют перевод строки с отступом
+        открывающей скобки, закрывающая скобка и запятая, а закрывающая
+        скобка массива стоит с меньшим отступом. Строки json не содержат
+        переводов строк, поэтому такие места ищутся простым поиском, и все
+        объекты до последнего из них в пределах куска разбираются бэкендом за
+        один вызов. Правильность разбиения проверяется самим разбором, и при
+        ошибке пачками этот массив больше не читается.
+        :param raw: если True, пачка не разбирается, а возвращается текстом
+        json массива (и разбиение не проверяется).
+        :return: список объектов, текст или None, если так прочитать не
+        вышло.
+        """
+        if self.peek() != "{":
+            return None
+        line_start = self.buf.rfind("\n", 0, self.pos) + 1
+        indent = self.buf[line_start:self.pos]
+        if line_start == 0 or indent.strip(WHITESPACE):
+            return None   # нет отступов
+        while len(self.buf) - self.pos < self.chunk_size and self._fill():
+            pass
+        limit = self.pos + self.chunk_size
+        array_end = re.compile(r"\n[ \t]{0,%d}\]" % (len(indent) - 1))
+        if (match := array_end.search(self.buf, self.pos, limit)) is not None:
+            limit = match.start()
+        closing = "\n" + indent + "},"
+        end = self.buf.rfind(closing, self.pos, limit)
+        if end == -1:   # объект длиннее куска или последний в массиве
+            return None
+        end += len(closing) - 1
+        if raw:
+            batch = "[" + self.buf[self.pos:end] + "]"
+            self.pos = end
+            return batch
+        try:
+            batch = self.backend.loads("[" + self.buf[self.pos:end] + "]")
+        except ValueError:
+            self._batched = False
+            return None
+        self.pos = end
+        return batch
+
+    def iter_batches(self, raw: bool = False):
+        """Обходит массив, выдавая его элементы списками.
+
+        Объекты массива по возможности разбираются пачками размером около
+        куска файла (см. ``_read_batch``), что быстрее поштучного чтения,
+        особенно для сторонних бэкендов, которые не умеют находить конец
+        значения сами. Остальные объекты (например, последний) читаются
+        поштучно.
+        :param raw: если True, пачки выдаются неразобранным текстом json
+        массива, чтобы их можно было разобрать в другом процессе. Объекты,
+        прочитанные поштучно, по-прежнему выдаются списками.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        self._batched = True
+        while True:
+            batch = self._read_batch(raw) if self._batched else None
+            yield batch if batch is not None else [self.read_value()]
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+    def iter_array(self):
+        """Обходит массив, выдавая порядковые номера элементов.
+
+        После получения номера элемент нужно прочитать или пропустить до
+        следующей итерации.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        i = 0
+        while True:
+            yield i
+            i += 1
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+
+def _raw_indent(batch: str) -> str:
+    """Находит отступ объектов неразобранной пачки.
+
+    Пачка, выданная ``JsonStream.iter_batches(raw=True)``, заканчивается
+    закрывающей скобкой объекта на отдельной строке, а объекты в ней
+    начинаются с открывающей скобки и заканчиваются закрывающей после
+    перевода строки с тем же отступом.
+    :param batch: текст json массива из ``iter_batches(raw=True)``.
+    :return: отступ или None, если пачка устроена иначе.
+    """
+    close = batch.rfind("\n", 0, len(batch) - 2)
+    indent = batch[close + 1:-2]
+    if close == -1 or indent.strip(WHITESPACE):
+        return None
+    return indent
+
+
+def count_raw_items(batch: str) -> int:
+    """Считает объекты неразобранной пачки, не разбирая ее.
+
+    :param batch: текст json массива из ``iter_batches(raw=True)``.
+    :return: число объектов или None, если пачка устроена иначе.
+    """
+    if (indent := _raw_indent(batch)) is None:
+        return None
+    return batch.count("\n" + indent + "},") + 1
+
+
+def last_raw_item(batch: str, backend: JsonBackend):
+    """Разбирает только последний объект неразобранной пачки.
+
+    Последний объект находится по отступу (см. ``_raw_indent``) без разбора
+    остальных.
+    :param batch: текст json массива из ``iter_batches(raw=True)``.
+    :param backend: бэкенд разбора.
+    :return: последний объект или None, если его не удалось выделить.
+    """
+    if (indent := _raw_indent(batch)) is None:
+        return None
+    close = batch.rfind("\n", 0, len(batch) - 2)
+    start = batch.rfind("\n" + indent + "{", 0, close)
+    try:
+        return backend.loads(batch[start if start != -1 else 1:-1])
+    except ValueError:
+        return None
+
+
+def find_raw_items(batch: str, needle: str, backend: JsonBackend):
+    """Разбирает только те объекты неразобранной пачки, где есть подстрока.
+
+    :param batch: текст json массива из ``iter_batches(raw=True)``.
+    :param needle: искомая подстрока.
+    :param backend: бэкенд разбора.
+    :return: генератор разобранных объектов в порядке следования.
+    """
+    if (indent := _raw_indent(batch)) is None:
+        yield from (item for item in backend.loads(batch)
+                    if needle in json.dumps(item, ensure_ascii=False))
+        return
+    pos = batch.find(needle)
+    while pos != -1:
+        start = batch.rfind("\n" + indent + "{", 0, pos)
+        start = 1 if start == -1 else start
+        end = batch.find("\n" + indent + "}", pos) + len(indent) + 2
+        yield backend.loads(batch[start:end])
+        pos = batch.find(needle, end)
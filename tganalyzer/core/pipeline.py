@@ -0,0 +1,185 @@
+"""Потоковый анализ экспорта без хранения сообщений.
+
+Сообщения читаются из файла по одному (creator.Extraction.iter_chats),
+собираются в небольшие части колоночного чата, части сразу сворачиваются
+в агрегаты (aggregates.ChatAggregates) и отбрасываются. Когда чат
+прочитан, статистика считается по его агрегатам теми же пакетными
+функциями, что и в analyzer.start_analyses, а от самих агрегатов остаются
+только поля чата (ChatSummary). Опции без пакетной функции считаются
+функциями ``class_func`` по сообщениям каждой части, и тексты сообщений
+разбираются, только если они нужны такой опции (ключ ``needs_text`` в
+analyzer.DEPENDENCIES).
+
+Так в памяти одновременно находятся одна часть сообщений, агрегаты одного
+чата (их размер зависит от длины периода переписки, а не от числа
+сообщений) и итоговая статистика, и пиковое потребление памяти не растет
+с размером экспорта.
+"""
+import datetime
+import itertools
+import numpy as np
+from .aggregates import DAY, ChatAggregates
+from .analyzer import DEPENDENCIES, Chat_stat
+from .columnar import ColumnarChat
+from .creator import BytesProgress, Extraction
+
+
+# Константы
+
+PART_MESSAGES = 50_000   # сколько сообщений чата сворачивается за раз
+
+
+class ChatSummary():
+    """Поля проанализированного чата без сообщений.
+
+    Заменяет чат в метаданных отчета (см. html_export.html_export), где
+    нужны только имя, id и тип чата.
+    """
+
+    __slots__ = "name", "id", "type", "last_id", "messages_num"
+
+    def __init__(self, chat: ChatAggregates):
+        """Берет поля чата из его агрегатов.
+
+        :param chat: агрегаты всех сообщений чата.
+        """
+        self.name, self.id, self.type = chat.name, chat.id, chat.type
+        self.last_id = chat.last_id
+        self.messages_num = chat.messages_num
+
+    def __len__(self):
+        """Число сообщений чата."""
+        return self.messages_num
+
+
+def _cut(part: ColumnarChat, time_gap):
+    """Оставляет в части чата только сообщения из временного промежутка.
+
+    :param part: часть колоночного чата, сообщения упорядочены по времени.
+    :param time_gap: временной промежуток (aware).
+    """
+    send_time = part.columns["send_time"]
+    start = np.searchsorted(send_time, time_gap[0].timestamp(), "left")
+    end = np.searchsorted(send_time, time_gap[1].timestamp(), "right")
+    part.columns = {name: column[start:end]
+                    for name, column in part.columns.items()}
+    if part.texts is not None:
+        part.texts = part.texts[start:end]
+
+
+def _whole_days(time_gap) -> tuple[datetime.datetime, datetime.datetime]:
+    """Наименьший промежуток из целых суток (по UTC), содержащий данный.
+
+    :param time_gap: временной промежуток (aware).
+    """
+    start = int(time_gap[0].timestamp()) // DAY * DAY
+    end = (int(np.floor(time_gap[1].timestamp())) // DAY + 1) * DAY - 1
+    return (datetime.datetime.fromtimestamp(start, datetime.timezone.utc),
+            datetime.datetime.fromtimestamp(end, datetime.timezone.utc))
+
+
+def analyse_stream(
+        chats,
+        time_gap: tuple[datetime.datetime, datetime.datetime],
+        features: dict[str, bool],
+        select=None
+        ) -> tuple[dict, dict[int, ChatSummary]]:
+    """Анализирует поток чатов, не храня их сообщения.
+
+    :param chats: итерируемый объект с парами (структура телеграмма с
+    полями чата, итерируемый объект со структурами его сообщений), как у
+    ``Extraction.iter_chats``. Сообщения чата нужно выдавать до перехода к
+    следующему чату.
+    :param time_gap: границы временного интервала (aware).
+    :param features: словарь с необходимыми для подсчета статистик данными.
+    :param select: функция, которая по агрегатам прочитанного чата решает,
+    анализировать ли его (например, по числу сообщений). По умолчанию
+    анализируются все чаты.
+    :return: то же, что analyzer.start_analyses, но вместо чатов -
+    объекты ChatSummary.
+    """
+    features_type = {feature: DEPENDENCIES[feature]["return_type"]()
+                     for feature in features.keys() if features[feature]}
+    # опции с пакетной функцией считаются по агрегатам, остальные - по
+    # сообщениям частей
+    batch_features = {feature: features[feature] and
+                      "batch_func" in DEPENDENCIES[feature]
+                      for feature in features.keys()}
+    message_features = [feature for feature in features.keys()
+                        if features[feature] and not batch_features[feature]]
+    keep_text = any(DEPENDENCIES[feature].get("needs_text", False)
+                    for feature in message_features)
+    # сообщения вне промежутка отбрасываются до сворачивания, поэтому
+    # агрегаты можно анализировать на охватывающих его целых сутках
+    days_gap = _whole_days(time_gap)
+
+    summaries = {}
+    for chat, messages in chats:
+        counters = {feature: DEPENDENCIES[feature]["class_type"](
+                            DEPENDENCIES[feature]["class_ex_type"])
+                    for feature in message_features}
+        aggregated = None
+        messages = iter(messages)
+        for first in messages:
+            part = ColumnarChat(chat, itertools.chain(
+                    [first], itertools.islice(messages, PART_MESSAGES - 1)),
+                    keep_text)
+            messages_num = len(part)
+            _cut(part, time_gap)
+            for message in part.messages:
+                for feature in message_features:
+                    DEPENDENCIES[feature]["class_func"](
+                            counters[feature], message, feature)
+            cells = ChatAggregates.from_chat(part)
+            # в числе сообщений чата учитываются и сообщения вне промежутка
+            cells.messages_num = messages_num
+            aggregated = cells if aggregated is None \
+                else aggregated.merge(cells)
+        if aggregated is None:   # чат без сообщений
+            aggregated = ChatAggregates.from_chat(ColumnarChat(chat, []))
+        if select is not None and not select(aggregated):
+            continue
+        analysed_chat = Chat_stat(batch_features, aggregated, days_gap)
+        for feature, counter in counters.items():
+            setattr(analysed_chat, feature, counter)
+        for feature in features_type.keys():
+            DEPENDENCIES[feature]["return_func"](
+                    features_type[feature],
+                    getattr(analysed_chat, feature),
+                    aggregated.id)
+        summaries[aggregated.id] = ChatSummary(aggregated)
+
+    return features_type, summaries
+
+
+def start_pipeline(
+        path: str,
+        time_gap: tuple[datetime.datetime, datetime.datetime],
+        features: dict[str, bool],
+        progress=None,
+        backend: str = None,
+        select=None
+        ) -> tuple[dict, dict[int, ChatSummary]]:
+    """Разбирает и анализирует файл json за один проход.
+
+    Заменяет связку creator.start_creator и analyzer.start_analyses, когда
+    чаты не нужно хранить после анализа.
+    :param path: путь к анализируемому файлу json.
+    :param time_gap: границы временного интервала (aware).
+    :param features: словарь с необходимыми для подсчета статистик данными.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от прочитанных байт файла.
+    :type progress: PySide6.QtCore.Signal(int)
+    :param backend: имя бэкенда разбора json.
+    :param select: функция выбора чатов (см. ``analyse_stream``).
+    :return: то же, что ``analyse_stream``.
+    """
+    extractor = Extraction(path, stream=True, backend=backend)
+    chats = extractor.iter_chats()
+    if progress is not None:
+        tracker = BytesProgress(extractor, progress)
+        chats = ((chat, tracker.track(messages)) for chat, messages in chats)
+    result = analyse_stream(chats, time_gap, features, select)
+    if progress is not None:
+        progress.emit(100)
+    return result
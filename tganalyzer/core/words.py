@@ -0,0 +1,153 @@
+"""Частые слова сообщений.
+
+Слова выделяются из текстов функцией ``tokenize``, а считаются объектами
+WordCounter. Пока разных слов не больше емкости счетчика, он считает
+точно. Дальше работает алгоритм Space-Saving (Metwally, Agrawal,
+El Abbadi, 2005): хранится не больше ``capacity`` слов, и новое слово
+вытесняет самое редкое из хранимых, получая его счет. Так память счетчика
+не зависит от длины переписки, а любое слово, встретившееся больше
+N / capacity раз из N, остается в счетчике, и его счет завышен не больше
+чем на N / capacity.
+"""
+import heapq
+import re
+
+
+# Константы
+
+CAPACITY = 5000   # сколько разных слов хранит счетчик
+# Слово - буквы, возможно, через дефис или апостроф ("кто-то", "don't")
+WORD_RE = re.compile(r"[^\W\d_]+(?:['-][^\W\d_]+)*")
+# Служебные слова, которые не считаются
+STOP_WORDS = frozenset("""
+    а без бы был была были было быть в вам вас весь во вот все всего всех
+    вы где да даже для до его ее если есть еще же за здесь и из или им их
+    к как ко когда кто ли либо между меня мне мной мы на над надо наш не
+    него нее нет ни них но ну о об однако он она они оно от очень по под
+    после при про с со так также такой там те тем то того тоже той только
+    том ты у уже хотя чего чей чем что чтобы чье чья эта эти это этого этой
+    этом этот я
+    a about after all also am an and any are as at be been but by can could
+    did do does for from had has have he her him his how i if in into is it
+    its just me my no not of on or our out she so than that the their them
+    then there they this to too up us was we were what when which who will
+    with would you your
+    """.split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Слова текста для подсчета частоты.
+
+    Слова приводятся к нижнему регистру (casefold), "ё" заменяется на "е",
+    а числа, однобуквенные и служебные слова (``STOP_WORDS``) отбрасываются.
+    :param text: текст сообщения.
+    """
+    text = text.casefold().replace("ё", "е").replace("’", "'")
+    return [word for word in WORD_RE.findall(text)
+            if len(word) > 1 and word not in STOP_WORDS]
+
+
+class WordCounter():
+    """Счетчик слов с ограниченной памятью (см. описание модуля).
+
+    Сумма счетов хранимых слов всегда равна числу учтенных слов ``total``.
+    Пока ни одно слово не вытеснено (``exact``), счета точные. Объекты
+    сериализуются pickle, поэтому их можно передавать из процессов.
+    """
+
+    __slots__ = "capacity", "counts", "errors", "total", "_heap"
+
+    def __init__(self, capacity: int = CAPACITY):
+        """Создает пустой счетчик.
+
+        :param capacity: сколько разных слов хранить. None - хранить все
+        слова и всегда считать точно.
+        """
+        self.capacity = capacity
+        self.counts = {}   # слово: счет
+        self.errors = {}   # слово: на сколько его счет может быть завышен
+        self.total = 0
+        self._heap = None   # пары (счет, слово), создаются при вытеснении
+
+    def __len__(self):
+        """Число хранимых слов."""
+        return len(self.counts)
+
+    @property
+    def exact(self) -> bool:
+        """Точны ли все счета (не было ни одного вытеснения)."""
+        return not self.errors
+
+    def add(self, word: str, count: int = 1):
+        """Учитывает ``count`` повторений слова.
+
+        :param word: слово.
+        :param count: число повторений.
+        """
+        counts = self.counts
+        self.total += count
+        if word in counts:
+            counts[word] += count
+        elif self.capacity is None or len(counts) < self.capacity:
+            counts[word] = count
+        else:
+            self._replace(word, count)
+
+    def update(self, words):
+        """Учитывает слова по одному повторению.
+
+        :param words: итерируемый объект со словами.
+        """
+        counts = self.counts
+        known = 0
+        for word in words:
+            if word in counts:
+                counts[word] += 1
+                known += 1
+            else:
+                self.add(word)
+        self.total += known
+
+    def merge(self, other: "WordCounter") -> "WordCounter":
+        """Добавляет слова другого счетчика (например, другого автора).
+
+        :param other: добавляемый счетчик.
+        :return: этот же счетчик.
+        """
+        for word, count in other.counts.items():
+            self.add(word, count)
+        for word, error in other.errors.items():
+            if word in self.counts:
+                self.errors[word] = self.errors.get(word, 0) + error
+        return self
+
+    def most_common(self, n: int) -> list[tuple[str, int]]:
+        """``n`` самых частых слов с их счетами.
+
+        Слова с равным счетом упорядочены по алфавиту.
+        :param n: число слов.
+        """
+        return heapq.nsmallest(n, self.counts.items(),
+                               key=lambda item: (-item[1], item[0]))
+
+    def _replace(self, word: str, count: int):
+        """Вытесняет самое редкое из хранимых слов новым словом.
+
+        Куча создается при первом вытеснении и не обновляется при росте
+        счетов: устаревшая пара с вершины возвращается в кучу с текущим
+        счетом, пока на вершине не окажется пара с настоящим минимумом.
+        """
+        counts, heap = self.counts, self._heap
+        if heap is None:
+            heap = self._heap = [(count, word)
+                                 for word, count in counts.items()]
+            heapq.heapify(heap)
+        least, victim = heap[0]
+        while counts[victim] != least:
+            heapq.heapreplace(heap, (counts[victim], victim))
+            least, victim = heap[0]
+        del counts[victim]
+        self.errors.pop(victim, None)
+        counts[word] = least + count
+        self.errors[word] = least
+        heapq.heapreplace(heap, (least + count, word))
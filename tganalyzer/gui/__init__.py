@@ -8,14 +8,19 @@ from PySide6.QtWidgets import (QMainWindow, QFileDialog, QWidget, QVBoxLayout,
 from pathlib import Path
 import datetime
 import gettext
+import os
 import pytz
 import webbrowser
 import traceback
 import sys
 
-from tganalyzer.core.creator import start_creator
-from tganalyzer.core.analyzer import start_analyses
+from tganalyzer.core.cache import ExportCache
+from tganalyzer.core.creator import (PARALLEL_MIN_BYTES, LazyChat,
+                                     load_chats, scan_chats)
+from tganalyzer.core.analyzer import (PARALLEL_MIN_MESSAGES, needs_text,
+                                      start_analyses)
 from tganalyzer.html_export import html_export
+from tganalyzer.html_export.cache import ChartCache
 
 
 PO_PATH = Path(__file__).resolve().parent.parent / 'po'
@@ -27,6 +32,35 @@ THEMES_PATH = Path(__file__).resolve().parent.parent / 'html_export' / 'themes'
 THEMES = [theme.name.partition('.')[0] for theme in THEMES_PATH.iterdir()]
 
 
+def open_export(path: str, progress=None) -> list:
+    """Открывает файл экспорта для выбора чатов.
+
+    Если файл уже разобран и лежит в кэше, возвращаются готовые чаты, иначе
+    файл только сканируется (см. creator.scan_chats), а сообщения выбранных
+    чатов разбираются при создании отчета.
+    :param path: путь к файлу экспорта.
+    :param progress: сигнал прогресса.
+    :return: массив чатов.
+    """
+    if (chats := ExportCache().load(path)) is not None:
+        if progress is not None:
+            progress.emit(100)
+        return chats
+    return scan_chats(path, progress)
+
+
+def store_export(path: str, chats: list):
+    """Сохраняет чаты файла экспорта в кэш, если разобраны все чаты.
+
+    Пока хоть один чат не разобран (LazyChat), кэш не пополняется: в нем
+    хранятся только экспорты целиком.
+    :param path: путь к файлу экспорта.
+    :param chats: все чаты файла в порядке ``open_export``.
+    """
+    if chats and not any(isinstance(chat, LazyChat) for chat in chats):
+        ExportCache().store(path, chats)
+
+
 class WorkerSignals(QObject):
     """
     Определяет сигналы доступные в выполняющемся треде класса Worker.
@@ -93,6 +127,32 @@ class Worker(QRunnable):
             self.signals.finished.emit()
 
 
+class ProgressPart():
+    """
+    Переводит прогресс подзадачи в часть прогресса всей задачи.
+
+    :param progress: сигнал прогресса всей задачи или None.
+    :param start: процент всей задачи в начале подзадачи.
+    :param end: процент всей задачи в конце подзадачи.
+    """
+
+    def __init__(self, progress, start, end):
+        """Переводит прогресс подзадачи в часть прогресса всей задачи."""
+        self.progress = progress
+        self.start = start
+        self.end = end
+
+    def emit(self, percent):
+        """
+        Отправляет прогресс подзадачи.
+
+        :param percent: Процент выполнения подзадачи.
+        """
+        if self.progress is not None:
+            self.progress.emit(self.start
+                               + percent * (self.end - self.start) // 100)
+
+
 class ProgressBarDialog(QDialog):
     """
     Диалог, отображающий сообщение и индикатор выполнения в процентах.
@@ -154,6 +214,7 @@ class MainWindow(QMainWindow):
                 "photo": self.locale.gettext("Photo counting"),
                 "day_night": self.locale.gettext("Activity at different times"
                                                  "of the day"),
+                "top_words": self.locale.gettext("Most frequent words"),
                 }
         self.chat_checkboxes = []
         self.feature_checkboxes = []
@@ -260,7 +321,9 @@ class MainWindow(QMainWindow):
         for feature in self.features:
             checkbox = QCheckBox(self.features[feature], self)
             checkbox.feature_name = feature
-            checkbox.setCheckState(Qt.CheckState.Checked)
+            # опции, которым нужны тексты сообщений, выбираются вручную
+            if not needs_text({feature: True}):
+                checkbox.setCheckState(Qt.CheckState.Checked)
             self.feature_checkboxes.append(checkbox)
             self.features_layout.addWidget(checkbox)
         features_area.setVerticalScrollBarPolicy(
@@ -277,6 +340,12 @@ class MainWindow(QMainWindow):
         theme_layout = QHBoxLayout()
         theme_layout.addWidget(theme_label)
         theme_layout.addWidget(self.theme_combobox)
+        self.interactive_checkbox = QCheckBox(
+                self.locale.gettext("Draw charts in the browser"), self)
+        theme_layout.addWidget(self.interactive_checkbox)
+        self.single_file_checkbox = QCheckBox(
+                self.locale.gettext("Save report as a single file"), self)
+        theme_layout.addWidget(self.single_file_checkbox)
 
         # Button that create a report
         create_report_button = QPushButton(
@@ -337,7 +406,7 @@ class MainWindow(QMainWindow):
                                         "the export file."),
                     self
                     )
-            worker = Worker(start_creator, path, progress_flag=True)
+            worker = Worker(open_export, path, progress_flag=True)
             worker.signals.progress.connect(dialog.update_progressbar)
             worker.signals.result.connect(self.create_and_show_chats)
             self.threadpool.start(worker)
@@ -407,8 +476,7 @@ class MainWindow(QMainWindow):
         """
         self.choice_nothing_chat()
         n = self.complex_choice_spin.value()
-        chat_ids = {chat.id for chat in self.chats
-                    if len(chat.messages) > n}
+        chat_ids = {chat.id for chat in self.chats if len(chat) > n}
         for checkbox in self.chat_checkboxes:
             if checkbox.chat_id in chat_ids:
                 checkbox.setCheckState(Qt.CheckState.Checked)
@@ -442,7 +510,29 @@ class MainWindow(QMainWindow):
         """
         chat_ids = {checkbox.chat_id for checkbox in self.chat_checkboxes
                     if checkbox.isChecked()}
-        parsed_chats = [chat for chat in self.chats if chat.id in chat_ids]
+        selected = [chat for chat in self.chats if chat.id in chat_ids]
+        features = {checkbox.feature_name:
+                    checkbox.isChecked()
+                    for checkbox in self.feature_checkboxes}
+        keep_text = needs_text(features)
+        if keep_text and any(getattr(chat, "texts", False) is None
+                             for chat in selected):
+            # в разобранных и взятых из кэша чатах нет текстов сообщений
+            scanned = {chat.id: chat
+                       for chat in scan_chats(str(self.data_path))}
+            selected = [scanned[chat.id] for chat in selected]
+        size = sum(chat.size for chat in selected
+                   if isinstance(chat, LazyChat))
+        parsed_chats = load_chats(
+                selected, ProgressPart(progress, 0, 30), columnar=True,
+                workers=os.cpu_count() if size >= PARALLEL_MIN_BYTES
+                else None, keep_text=keep_text)
+        # разобранные чаты запоминаются для следующих отчетов
+        loaded = {chat.id: chat for chat in parsed_chats}
+        self.chats = [loaded.get(chat.id, chat) for chat in self.chats]
+        if any(isinstance(chat, LazyChat) for chat in selected):
+            # если разобраны последние чаты файла, он сохраняется в кэш
+            store_export(str(self.data_path), self.chats)
         from_datetime = datetime.datetime.combine(
                 self.from_date.date().toPython(),
                 datetime.datetime.min.time()
@@ -454,12 +544,12 @@ class MainWindow(QMainWindow):
         from_datetime = from_datetime.replace(tzinfo=pytz.utc)
         to_datetime = to_datetime.replace(tzinfo=pytz.utc)
         time_gap = [from_datetime, to_datetime]
-        features = {checkbox.feature_name:
-                    checkbox.isChecked()
-                    for checkbox in self.feature_checkboxes}
-        ret_stats, ret_parsed_chats = start_analyses(parsed_chats,
-                                                     time_gap,
-                                                     features)
+        messages_num = sum(len(chat) for chat in parsed_chats)
+        workers = (os.cpu_count() if messages_num >= PARALLEL_MIN_MESSAGES
+                   else None)
+        ret_stats, ret_parsed_chats = start_analyses(
+                parsed_chats, time_gap, features, workers=workers,
+                progress=ProgressPart(progress, 30, 40))
         metadata = {
                 "login": "TODO LOGIN",
                 "chats": ret_parsed_chats,
@@ -470,6 +560,12 @@ class MainWindow(QMainWindow):
             html_export(self.report_info["path"], metadata, ret_stats,
                         lang=self.lang,
                         theme=self.theme_combobox.currentText(),
-                        progress=progress)
+                        workers=os.cpu_count(),
+                        progress=ProgressPart(progress, 40, 100),
+                        cache=ChartCache(),
+                        charts=("js" if self.interactive_checkbox.isChecked()
+                                else "svg"),
+                        image_format="auto",
+                        single_file=self.single_file_checkbox.isChecked())
         except Exception as e:
             print(type(e), e)
@@ -1,23 +1,81 @@
-"""Модуль для сборки наглядного и читаемого HTML-файла."""
+"""Модуль для сборки наглядного и читаемого HTML-файла.
 
+matplotlib, jinja2 и переводы загружаются только при построении отчета:
+импорт модуля не должен замедлять запуск GUI и CLI.
+"""
+
+import contextlib
 import datetime
 import gettext
-import jinja2
-import matplotlib
+import inspect
+import json
+import multiprocessing
+import numpy as np
 import os
 import shutil
+import tempfile
 from collections import defaultdict
-from matplotlib import pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from tganalyzer.html_export.inline import InlineCharts, inline_script
 
 
 PATH = Path(__file__).resolve().parent
-LOCALES = {
-    "en_US.UTF-8": gettext.NullTranslations(),
-    "ru_RU.UTF-8": gettext.translation("html_export",
-                                       PATH.parent / "po",
-                                       ["ru"]),
-}
+# Меньше графиков строится в текущем процессе: запуск процессов и импорт в
+# них matplotlib дороже
+PARALLEL_MIN_CHARTS = 16
+# Способы вывода графиков: файлы, построенные matplotlib, или данные
+# графиков, которые рисует в браузере скрипт scripts/charts.js
+CHART_MODES = ("svg", "js")
+# Форматы файлов графиков. "auto" - svg, а для графиков больше
+# RASTER_MIN_POINTS точек - AUTO_RASTER: браузер долго разбирает и рисует
+# svg с десятками тысяч вершин, а растровое изображение - нет
+IMAGE_FORMATS = ("svg", "png", "webp", "auto")
+RASTER_MIN_POINTS = 2000
+AUTO_RASTER = "webp"
+# Разрешение растровых графиков в точках на дюйм
+DPI = 100
+# С какого числа чатов отчет по умолчанию делится на страницы
+PAGED_MIN_CHATS = 20
+# Опции, средние значения которых выводятся в оглавлении чатов
+INDEX_FEATURES = ("msg", "word", "symb")
+# Сколько точек ряда рисуется на графике по дате. Если дней больше, значения
+# усредняются по неделям или месяцам
+DATE_POINTS = 500
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+# Основа идентификаторов элементов svg вместо случайной
+SVG_SALT = "tganalyzer"
+# Сколько слов на графиках частых слов и для скольких самых многословных
+# пользователей чата строятся такие графики
+TOP_WORDS = 10
+TOP_WORDS_USERS = 5
+# Размеры фигур по видам графиков в дюймах (None - размер по умолчанию)
+FIGURE_SIZES = {"bar": (12, 6), "date": (12, 6), "pie": None}
+
+
+class _Locales(dict):
+    """Переводы по языковым строкам, загружаемые при первом обращении."""
+
+    LANGUAGES = ("en_US.UTF-8", "ru_RU.UTF-8")
+
+    def __missing__(self, lang: str):
+        """Загрузка перевода.
+
+        :param lang: языковая строка (напр., "en_US.UTF-8").
+        """
+        if lang not in self.LANGUAGES:
+            raise KeyError(lang)
+        if lang == "en_US.UTF-8":
+            translation = gettext.NullTranslations()
+        else:
+            translation = gettext.translation(
+                    "html_export", PATH.parent / "po",
+                    [lang.partition("_")[0]])
+        self[lang] = translation
+        return translation
+
+
+LOCALES = _Locales()
 
 
 def translate_text(lang="en_US.UTF-8"):
@@ -33,6 +91,8 @@ def translate_text(lang="en_US.UTF-8"):
         "na": LOCALES[lang].gettext("Not available"),
         "empty_list": LOCALES[lang].gettext("No features selected"),
         "to_top": LOCALES[lang].gettext("Back to top"),
+        "to_report": LOCALES[lang].gettext("Back to report"),
+        "chat": LOCALES[lang].gettext("Chat"),
         "features": {
             "symb": {
                 "name": LOCALES[lang].gettext("Symbols"),
@@ -67,6 +127,9 @@ def translate_text(lang="en_US.UTF-8"):
                     "evening": LOCALES[lang].gettext("Evening"),
                 },
             },
+            "top_words": {
+                "name": LOCALES[lang].gettext("Most Frequent Words"),
+            },
         },
         "types": {
             "chat": LOCALES[lang].gettext("By chat"),
@@ -75,6 +138,7 @@ def translate_text(lang="en_US.UTF-8"):
             "avg": LOCALES[lang].gettext("Average"),
             "quantity": LOCALES[lang].gettext("By quantity"),
             "length": LOCALES[lang].gettext("By total length"),
+            "top": LOCALES[lang].gettext("Overall"),
         },
         "other": LOCALES[lang].gettext("Others"),
     }
@@ -132,20 +196,283 @@ class daterange:
     __repr__ = __str__
 
 
-def draw_top_bar(path: Path, data: dict, topsize: int = 3):
-    """Построение отсортированной столбчатой диаграммы топ-``topsize``.
+def _plain(data):
+    """Копия вложенных словарей без defaultdict (их фабрики не сериализуются).
+
+    :param data: данные графика.
+    """
+    if isinstance(data, dict):
+        return {key: _plain(value) for key, value in data.items()}
+    return data
+
+
+class ChartJob:
+    """Задание на построение одного графика.
+
+    Задания не зависят друг от друга и могут выполняться в других
+    процессах: в них хранятся функция построения, путь к файлу и данные.
+    """
+
+    __slots__ = "draw", "path", "data", "params"
+
+    def __init__(self, draw, path: Path, data: dict, **params):
+        """Создание задания.
+
+        :param draw: функция построения вида ``draw(path, data, **params)``.
+        :param path: путь к конечному файлу.
+        :param data: данные графика.
+        :param params: остальные параметры функции построения.
+        """
+        self.draw, self.path, self.params = draw, path, params
+        self.data = _plain(data)
+
+    def __call__(self):
+        """Построение графика."""
+        self.draw(self.path, self.data, **self.params)
 
+    def __repr__(self):
+        """Строковое представление."""
+        return f"{self.__class__.__name__}({self.draw.__name__}, {self.path})"
+
+
+def _add_chart(jobs: list, draw, path: Path, data: dict, **params):
+    """Добавление задания в список или построение графика сразу.
+
+    :param jobs: список заданий или None.
+    :param draw: функция построения.
     :param path: путь к конечному файлу.
+    :param data: данные графика.
+    :param params: остальные параметры функции построения.
+    """
+    job = ChartJob(draw, path, data, **params)
+    if jobs is None:
+        job()
+    else:
+        jobs.append(job)
+
+
+def _init_worker(lang: str):
+    """Подготовка процесса, строящего графики.
+
+    :param lang: языковая строка (напр., "en_US.UTF-8").
+    """
+    global TEXT
+    TEXT = translate_text(lang)
+
+
+def run_charts(jobs: list, lang: str = "en_US.UTF-8",
+               workers: int = None, progress=None, cache=None):
+    """Построение графиков по заданиям.
+
+    Графики, найденные в кэше, копируются из него. Остальные при
+    ``workers`` больше 1 и не меньше ``PARALLEL_MIN_CHARTS`` графиках
+    строятся пулом процессов и сохраняются в кэш.
+    :param jobs: список объектов ChartJob.
+    :param lang: языковая строка (напр., "en_US.UTF-8").
+    :param workers: число процессов.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от построенных графиков.
+    :type progress: PySide6.QtCore.Signal(int)
+    :param cache: кэш графиков (cache.ChartCache).
+    """
+    jobs_num = len(jobs)
+    done = 0
+
+    def finish(job, key):
+        """Учет построенного графика."""
+        nonlocal done
+        if key is not None:
+            cache.store(key, job.path)
+        done += 1
+        if progress is not None:
+            progress.emit(done * 100 // jobs_num)
+
+    pending = []   # пары из задания и его ключа в кэше
+    for job in jobs:
+        key = cache.key(job, lang) if cache is not None else None
+        if key is not None and cache.fetch(key, job.path):
+            finish(job, None)
+        else:
+            pending.append((job, key))
+
+    if workers is None or workers <= 1 or len(pending) < PARALLEL_MIN_CHARTS:
+        for job, key in pending:
+            job()
+            finish(job, key)
+    else:
+        # spawn, а не fork: экспорт может запускаться из треда GUI
+        with ProcessPoolExecutor(
+                min(workers, len(pending)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(lang,)) as executor:
+            futures = {executor.submit(job): (job, key)
+                       for job, key in pending}
+            for future in as_completed(futures):
+                future.result()
+                finish(*futures[future])
+    if cache is not None:
+        cache.evict()
+
+
+class FigurePool:
+    """Фигуры matplotlib, которые очищаются и используются снова.
+
+    Для каждого вида графика (см. ``FIGURE_SIZES``) хранится одна фигура с
+    одной осью. Фигуры создаются без pyplot, поэтому не попадают в его
+    глобальный список и не требуют интерактивного бэкенда. Пул не
+    потокобезопасен: графики в одном процессе строятся по очереди.
+    """
+
+    def __init__(self):
+        """Создание пустого пула."""
+        self.figures = {}
+
+    def subplots(self, kind: str):
+        """Чистые фигура и ось для графика вида ``kind``.
+
+        Ось круговой диаграммы не сбрасывается целиком (это около трети
+        времени построения диаграммы): ``Axes.pie`` сам задает пределы,
+        деления и рамку, поэтому достаточно убрать прежние секторы, подписи
+        и легенду и начать цвета сначала. Файл получается тем же, что и с
+        новой фигурой.
+        :param kind: вид графика, ключ ``FIGURE_SIZES``.
+        :return: пара из фигуры и оси, как у ``pyplot.subplots``.
+        """
+        if (pair := self.figures.get(kind)) is None:
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=FIGURE_SIZES[kind])
+            pair = self.figures[kind] = fig, fig.add_subplot()
+        elif kind == "pie":
+            ax = pair[1]
+            for artist in [*ax.patches, *ax.texts]:
+                artist.remove()
+            if ax.legend_ is not None:
+                ax.legend_.remove()
+            ax.set_prop_cycle(None)
+        else:
+            pair[1].clear()
+        return pair
+
+
+FIGURES = FigurePool()
+
+
+def _save(fig, path: Path, dpi: int = DPI):
+    """Запись графика в файл в формате по расширению пути.
+
+    В svg дата создания не записывается, а идентификаторы элементов не
+    случайны, так что одинаковые графики дают побайтно одинаковые файлы.
+    :param fig: фигура с графиком (matplotlib.figure.Figure).
+    :param path: путь к конечному файлу (svg, png или webp).
+    :param dpi: разрешение растрового графика.
+    """
+    image_format = Path(path).suffix[1:]
+    if image_format != "svg":
+        fig.savefig(path, format=image_format, dpi=dpi, transparent=True,
+                    bbox_inches="tight")
+        return
+    import matplotlib
+    with matplotlib.rc_context({"svg.hashsalt": SVG_SALT}):
+        fig.savefig(path, format="svg", transparent=True,
+                    bbox_inches="tight", metadata={"Date": None})
+
+
+def _top(data: dict, size: int) -> tuple[list, list]:
+    """Метки и значения топ-``size`` в порядке убывания значения.
+
+    Элементы за пределами топа объединяются в один.
     :param data: словарь данных с ключами-метками.
-    :param topsize: количество элементов в топе.
+    :param size: количество элементов в топе.
     """
-    fig, ax = plt.subplots(figsize=(12, 6))
     data_sorted = dict(
         sorted(data.items(), key=lambda it: it[1], reverse=True)
     )   # предварительная сортировка (в порядке убывания) по значению
-    x, y = list(data_sorted.keys()), list(data_sorted.values())
-    if len(y) > topsize:
-        x[topsize:], y[topsize:] = [TEXT["other"]], [sum(y[topsize:])]
+    labels, values = list(data_sorted.keys()), list(data_sorted.values())
+    if len(values) > size:
+        labels[size:] = [TEXT["other"]]
+        values[size:] = [sum(values[size:])]
+    return labels, values
+
+
+def _date_resolution(days: int, points: int) -> str:
+    """Выбор шага ряда по дате: день, неделя или месяц.
+
+    :param days: число дней между первой и последней датой графика.
+    :param points: наибольшее желаемое число точек ряда.
+    :return: "D", "W" или "M".
+    """
+    if days <= points:
+        return "D"
+    if days / 7 <= points:
+        return "W"
+    return "M"
+
+
+def _bucket_starts(days: np.ndarray, resolution: str) -> np.ndarray:
+    """Начала недель (с понедельника) или месяцев, в которые попали дни.
+
+    :param days: массив datetime64[D].
+    :param resolution: шаг из ``_date_resolution``.
+    """
+    if resolution == "W":
+        # 1970-01-01, от которого отсчитываются даты, - четверг
+        return days - (days.astype(np.int64) + 3) % 7
+    if resolution == "M":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    return days
+
+
+def _date_series(data: dict[str, dict], points: int = DATE_POINTS):
+    """Ряды данных по дате с нулями в днях без данных.
+
+    Если дней больше ``points``, значения усредняются по неделям или
+    месяцам, так что число точек ряда не растет с длиной истории, а
+    значения остаются средними за день.
+    :param data: словарь данных вида {имя пользователя: {дата: данные}}.
+    :param points: наибольшее желаемое число точек ряда.
+    :return: первая и последняя даты всех рядов (datetime.date), шаг из
+        ``_date_resolution`` и список троек из имени пользователя, массива
+        дат точек (datetime64[D]) и массива значений.
+    """
+    daily = []
+    for user, userdata in data.items():
+        # через порядковые номера дат: так намного быстрее, чем из объектов
+        days = (np.fromiter(map(datetime.date.toordinal, userdata),
+                            np.int64, len(userdata))
+                - EPOCH_ORDINAL).astype("datetime64[D]")
+        counts = np.array(list(userdata.values()))
+        first = days.min()
+        values = np.zeros((days.max() - first).astype(np.int64) + 1,
+                          dtype=counts.dtype)
+        values[(days - first).astype(np.int64)] = counts
+        daily.append((user, first, values))
+    date_min = min(first for _, first, _ in daily)
+    date_max = max(first + len(values) - 1 for _, first, values in daily)
+    resolution = _date_resolution(
+            (date_max - date_min).astype(np.int64) + 1, points)
+    series = []
+    for user, first, values in daily:
+        days = first + np.arange(len(values))
+        if resolution != "D":
+            days, idx = np.unique(_bucket_starts(days, resolution),
+                                  return_inverse=True)
+            values = np.bincount(idx, values) / np.bincount(idx)
+        series.append((user, days, values))
+    date_min = min(days[0] for _, days, _ in series)
+    return date_min.item(), date_max.item(), resolution, series
+
+
+def draw_top_bar(path: Path, data: dict, topsize: int = 3,
+                 dpi: int = DPI):
+    """Построение отсортированной столбчатой диаграммы топ-``topsize``.
+
+    :param path: путь к конечному файлу.
+    :param data: словарь данных с ключами-метками.
+    :param topsize: количество элементов в топе.
+    :param dpi: разрешение растрового графика.
+    """
+    fig, ax = FIGURES.subplots("bar")
+    x, y = _top(data, topsize)
 
     bar = ax.bar(range(len(x)), y)
     ax.set_xticks(
@@ -154,30 +481,27 @@ def draw_top_bar(path: Path, data: dict, topsize: int = 3):
     )
     ax.bar_label(bar)
     ax.grid(axis="y")
-    fig.savefig(path, format="svg", transparent=True, bbox_inches="tight")
-    plt.close(fig)
+    _save(fig, path, dpi)
 
 
 # TODO Решить проблему с 10 цветами matplotlib
-def draw_date_plot(path: Path, data: dict[str, dict], label_max: int = 7):
+def draw_date_plot(
+    path: Path, data: dict[str, dict], label_max: int = 7,
+    points: int = DATE_POINTS, dpi: int = DPI,
+):
     """Построение графика данных по дате.
 
     :param path: путь к конечному файлу.
     :param data: словарь данных вида {имя пользователя: {дата: данные}}.
     :param label_max: максимальное количество меток на оси дат.
+    :param points: наибольшее желаемое число точек ряда (см.
+        ``_date_series``).
+    :param dpi: разрешение растрового графика.
     """
-    fig, ax = plt.subplots(figsize=(12, 6))
-    date_min, date_max = datetime.date.max, datetime.date.min
-    for user, userdata in data.items():
-        tmp = sorted(userdata.keys())
-        if tmp[0] < date_min:
-            date_min = tmp[0]
-        if tmp[-1] > date_max:
-            date_max = tmp[-1]
-        data_sorted = {dt: userdata[dt] for dt in daterange(
-            tmp[0], tmp[-1] + datetime.timedelta(days=1)
-        )}  # предварительная сортировка по ключу (дате) с включением 0
-        ax.plot(data_sorted.keys(), data_sorted.values(), label=user)
+    fig, ax = FIGURES.subplots("date")
+    date_min, date_max, _, series = _date_series(data, points)
+    for user, days, values in series:
+        ax.plot(days, values, label=user)
 
     ax.set_xticks(list(daterange(
         date_min, date_max,
@@ -185,13 +509,12 @@ def draw_date_plot(path: Path, data: dict[str, dict], label_max: int = 7):
     )))
     ax.legend(loc="center left", bbox_to_anchor=(1, 0.5), frameon=False)
     ax.grid(axis="both")
-    fig.savefig(path, format="svg", transparent=True, bbox_inches="tight")
-    plt.close(fig)
+    _save(fig, path, dpi)
 
 
 def draw_pie(
     path: Path, data: dict, pieces: int = 5,
-    pct: bool = True, amounts: bool = False,
+    pct: bool = True, amounts: bool = False, dpi: int = DPI,
 ):
     """Построение отсортированной круговой диаграммы топ-``pieces``.
 
@@ -200,15 +523,10 @@ def draw_pie(
     :param pieces: количество элементов в топе.
     :param pct: отображать ли подписи процентов (да/нет).
     :param amounts: отображать ли подписи значений (да/нет).
+    :param dpi: разрешение растрового графика.
     """
-    fig, ax = plt.subplots()
-    data_sorted = dict(
-        sorted(data.items(), key=lambda it: it[1], reverse=True)
-    )   # предварительная сортировка (в порядке убывания) по значению
-    labels, values = list(data_sorted.keys()), list(data_sorted.values())
-    if len(values) > pieces:
-        labels[pieces:] = [TEXT["other"]]
-        values[pieces:] = [sum(values[pieces:])]
+    fig, ax = FIGURES.subplots("pie")
+    labels, values = _top(data, pieces)
 
     wedges, *_ = ax.pie(
         values,
@@ -221,8 +539,109 @@ def draw_pie(
         wedges, labels,
         loc="center left", bbox_to_anchor=(1, 0.5), frameon=False
     )
-    fig.savefig(path, format="svg", transparent=True, bbox_inches="tight")
-    plt.close(fig)
+    _save(fig, path, dpi)
+
+
+def draw_tod_pie(path: Path, data: dict, dpi: int = DPI):
+    """Построение круговой диаграммы по времени суток.
+
+    :param path: путь к конечному файлу.
+    :param data: словарь вида {название времени суток: количество}.
+    :param dpi: разрешение растрового графика.
+    """
+    fig, ax = FIGURES.subplots("pie")
+    ax.pie(
+        data.values(), labels=data.keys(),
+        autopct="%1.1f%%", counterclock=False, startangle=90
+    )
+    _save(fig, path, dpi)
+
+
+def _arguments(job: ChartJob) -> dict:
+    """Все аргументы функции построения, включая значения по умолчанию.
+
+    :param job: задание на построение графика.
+    """
+    args = inspect.signature(job.draw).bind(job.path, job.data, **job.params)
+    args.apply_defaults()
+    return args.arguments
+
+
+def chart_points(job: ChartJob) -> int:
+    """Число точек графика: точек рядов по дате или элементов данных.
+
+    :param job: задание на построение графика.
+    """
+    if job.draw is draw_date_plot:
+        series = _date_series(job.data, _arguments(job)["points"])[3]
+        return sum(len(values) for _, _, values in series)
+    return len(job.data)
+
+
+def set_image_format(job: ChartJob, image_format: str, dpi: int = DPI):
+    """Выбор формата файла графика: замена расширения пути задания.
+
+    :param job: задание на построение графика.
+    :param image_format: формат из ``IMAGE_FORMATS``.
+    :param dpi: разрешение, если график растровый.
+    """
+    if image_format == "auto":
+        image_format = (AUTO_RASTER if chart_points(job) > RASTER_MIN_POINTS
+                        else "svg")
+    job.path = job.path.with_suffix("." + image_format)
+    if image_format != "svg":
+        # разрешение svg не влияет на файл и не должно менять его ключ в кэше
+        job.params["dpi"] = dpi
+
+
+def chart_spec(job: ChartJob) -> dict:
+    """Описание графика для отрисовки в браузере (см. scripts/charts.js).
+
+    Данные подготавливаются так же, как для matplotlib, а ряды по дате
+    хранятся массивами дней от первой даты и значений.
+    :param job: задание на построение графика.
+    :return: словарь, сериализуемый в json.
+    """
+    args = _arguments(job)
+    if job.draw is draw_top_bar:
+        labels, values = _top(job.data, args["topsize"])
+        return {"kind": "bar", "labels": labels, "values": values}
+    if job.draw is draw_pie:
+        labels, values = _top(job.data, args["pieces"])
+        return {"kind": "pie", "labels": labels, "values": values,
+                "pct": args["pct"], "amounts": args["amounts"]}
+    if job.draw is draw_tod_pie:
+        return {"kind": "pie", "labels": list(job.data),
+                "values": list(job.data.values()),
+                "pct": True, "amounts": False, "clockwise": True}
+    if job.draw is draw_date_plot:
+        date_min, _, resolution, series = _date_series(job.data,
+                                                       args["points"])
+        start = np.datetime64(date_min, "D")
+        return {"kind": "line", "start": date_min.isoformat(),
+                "resolution": resolution,
+                "label_max": args["label_max"],
+                "series": [{"label": user,
+                            "x": (days - start).astype(np.int64).tolist(),
+                            "values": (values if resolution == "D"
+                                       else values.round(3)).tolist()}
+                           for user, days, values in series]}
+    raise ValueError(f"No browser renderer for {job.draw.__name__}")
+
+
+def write_chart_data(path: Path, jobs: list):
+    """Запись данных всех графиков в один скрипт.
+
+    Данные присваиваются переменной ``TG_CHARTS`` по именам графиков, а не
+    загружаются как json, потому что браузеры не дают читать локальные
+    файлы из страницы, открытой с диска.
+    :param path: путь к конечному файлу.
+    :param jobs: список объектов ChartJob.
+    """
+    data = json.dumps({job.path.stem: chart_spec(job) for job in jobs},
+                      ensure_ascii=False, separators=(",", ":"))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"var TG_CHARTS = {data};\n")
 
 
 def draw_symb_msg_word(
@@ -230,6 +649,7 @@ def draw_symb_msg_word(
     data: dict[int, dict[str, dict[datetime.date, int]]],
     chatnames: dict[int, str],
     feature: str,
+    jobs: list = None,
 ) -> dict[str]:
     """Отрисовка графиков и сбор статистики символов/сообщений/слов.
 
@@ -238,7 +658,10 @@ def draw_symb_msg_word(
         {ID чата: {имя пользователя: {дата: количество}}}.
     :param chatnames: словарь вида {ID чата: имя чата} (для отрисовки).
     :param feature: код опции ("symb", "msg" или "word").
-    :return: имена файлов изображений или числовые характеристики вида
+    :param jobs: список, в который добавляются задания ChartJob вместо
+        построения графиков (см. ``run_charts``).
+    :return: имена изображений (без расширения) или числовые характеристики
+        вида
         {ID чата: {"user": имя, "date": имя, "avg": число}} или
         {"agg": {"chat": имя, "date": имя}}.
     """
@@ -271,10 +694,12 @@ def draw_symb_msg_word(
     if not by_chat_agg:
         return ans
 
-    draw_top_bar(path / f"agg_{feature}_chat.svg", by_chat_agg, 10)
-    ans["agg"]["chat"] = f"agg_{feature}_chat.svg"
-    draw_date_plot(path / f"agg_{feature}_date.svg", by_date_agg, 10)
-    ans["agg"]["date"] = f"agg_{feature}_date.svg"
+    _add_chart(jobs, draw_top_bar,
+               path / f"agg_{feature}_chat.svg", by_chat_agg, topsize=10)
+    ans["agg"]["chat"] = f"agg_{feature}_chat"
+    _add_chart(jobs, draw_date_plot,
+               path / f"agg_{feature}_date.svg", by_date_agg, label_max=10)
+    ans["agg"]["date"] = f"agg_{feature}_date"
 
     for chatid in data:
         ans[chatid] = {}
@@ -282,12 +707,15 @@ def draw_symb_msg_word(
             continue
 
         if sum(by_user[chatid].values()) > 0:
-            draw_pie(path / f"{chatid}_{feature}_user.svg", by_user[chatid], 5)
-            ans[chatid]["user"] = f"{chatid}_{feature}_user.svg"
+            _add_chart(jobs, draw_pie, path / f"{chatid}_{feature}_user.svg",
+                       by_user[chatid], pieces=5)
+            ans[chatid]["user"] = f"{chatid}_{feature}_user"
         else:
             ans[chatid]["user"] = None
-        draw_date_plot(path / f"{chatid}_{feature}_date.svg", data[chatid], 10)
-        ans[chatid]["date"] = f"{chatid}_{feature}_date.svg"
+        _add_chart(jobs, draw_date_plot,
+                   path / f"{chatid}_{feature}_date.svg", data[chatid],
+                   label_max=10)
+        ans[chatid]["date"] = f"{chatid}_{feature}_date"
         ans[chatid]["avg"] = by_chat_agg[chatnames[chatid]] / len_days[chatid]
 
     return ans
@@ -299,6 +727,7 @@ def draw_voicemsg_videomsg_videos_photos(
     data: dict[int, dict],
     chatnames: dict[int, str],
     feature: str,
+    jobs: list = None,
 ):
     """Отрисовка графиков статистики видео-/голосовых сообщений, видео и фото.
 
@@ -311,7 +740,9 @@ def draw_voicemsg_videomsg_videos_photos(
     :param chatnames: словарь вида {ID чата: имя чата} (для отрисовки).
     :param feature: код опции
         ("voice_message", "video_message", "video_file" или "photo").
-    :return: имена файлов изображений вида:
+    :param jobs: список, в который добавляются задания ChartJob вместо
+        построения графиков (см. ``run_charts``).
+    :return: имена изображений (без расширения) вида:
         ("voice_message" и "video_message")
         {ID чата: {"quantity": имя, "length": имя, "avg": имя}} или
         {"agg": {"quantity": имя, "length": имя}};
@@ -352,20 +783,20 @@ def draw_voicemsg_videomsg_videos_photos(
         return ans
 
     if sum(quantity_agg.values()) > 0:
-        draw_pie(
-            path / f"agg_{feature}_quantity.svg",
-            quantity_agg, 5, pct=False, amounts=True
+        _add_chart(
+            jobs, draw_pie, path / f"agg_{feature}_quantity.svg",
+            quantity_agg, pieces=5, pct=False, amounts=True
         )
-        ans["agg"]["quantity"] = f"agg_{feature}_quantity.svg"
+        ans["agg"]["quantity"] = f"agg_{feature}_quantity"
     else:
         ans["agg"]["quantity"] = None
     if msg_mode:
         if sum(length_agg.values()) > 0:
-            draw_pie(
-                path / f"agg_{feature}_length.svg",
-                length_agg, 5, pct=False, amounts=True
+            _add_chart(
+                jobs, draw_pie, path / f"agg_{feature}_length.svg",
+                length_agg, pieces=5, pct=False, amounts=True
             )
-            ans["agg"]["length"] = f"agg_{feature}_length.svg"
+            ans["agg"]["length"] = f"agg_{feature}_length"
         else:
             ans["agg"]["length"] = None
 
@@ -375,26 +806,27 @@ def draw_voicemsg_videomsg_videos_photos(
             continue
 
         if sum(quantity[chatid].values()) > 0:
-            draw_pie(
-                path / f"{chatid}_{feature}_quantity.svg",
-                quantity[chatid], 5, pct=False, amounts=True
+            _add_chart(
+                jobs, draw_pie, path / f"{chatid}_{feature}_quantity.svg",
+                quantity[chatid], pieces=5, pct=False, amounts=True
             )
-            ans[chatid]["quantity"] = f"{chatid}_{feature}_quantity.svg"
+            ans[chatid]["quantity"] = f"{chatid}_{feature}_quantity"
         else:
             ans[chatid]["quantity"] = None
         if msg_mode:
             if sum(length[chatid].values()) > 0:
-                draw_pie(
-                    path / f"{chatid}_{feature}_length.svg",
-                    length[chatid], 5, pct=False, amounts=True
+                _add_chart(
+                    jobs, draw_pie, path / f"{chatid}_{feature}_length.svg",
+                    length[chatid], pieces=5, pct=False, amounts=True
                 )
-                ans[chatid]["length"] = f"{chatid}_{feature}_length.svg"
+                ans[chatid]["length"] = f"{chatid}_{feature}_length"
             else:
                 ans[chatid]["length"] = None
-            draw_top_bar(
+            _add_chart(
+                jobs, draw_top_bar,
                 path / f"{chatid}_{feature}_lenavg.svg", len_avg[chatid]
             )
-            ans[chatid]["avg"] = f"{chatid}_{feature}_lenavg.svg"
+            ans[chatid]["avg"] = f"{chatid}_{feature}_lenavg"
 
     return ans
 
@@ -403,13 +835,16 @@ def draw_voicemsg_videomsg_videos_photos(
 def draw_timesofday(
     path: Path,
     data: dict[int, dict[str, dict[str, int]]],
+    jobs: list = None,
 ):
     """Отрисовка графиков статистики по времени суток.
 
     :param path: путь к папке, в которой сохранить изображения.
     :param data: сведения о чатах вида:
         {ID чата: {имя пользователя: {время суток: количество}}}.
-    :return: имена файлов изображений вида:
+    :param jobs: список, в который добавляются задания ChartJob вместо
+        построения графиков (см. ``run_charts``).
+    :return: имена изображений (без расширения) вида:
         {ID чата или "agg": имя}}.
     """
     # Возвращаемый словарь имен
@@ -435,17 +870,9 @@ def draw_timesofday(
         for tod, value in quantity_agg.items()
     }
     if sum(quantity_agg.values()) > 0:
-        fig, ax = plt.subplots()
-        ax.pie(
-            quantity_agg.values(), labels=quantity_agg.keys(),
-            autopct="%1.1f%%", counterclock=False, startangle=90
-        )
-        fig.savefig(
-            path / "agg_timesofday.svg",
-            format="svg", transparent=True, bbox_inches="tight"
-        )
-        plt.close(fig)
-        ans["agg"]["quantity"] = "agg_timesofday.svg"
+        _add_chart(jobs, draw_tod_pie,
+                   path / "agg_timesofday.svg", quantity_agg)
+        ans["agg"]["quantity"] = "agg_timesofday"
     else:
         ans["agg"]["quantity"] = None
 
@@ -459,87 +886,282 @@ def draw_timesofday(
             for tod, value in quantity[chatid].items()
         }
         if sum(quantity[chatid].values()) > 0:
-            fig, ax = plt.subplots()
-            ax.pie(
-                quantity[chatid].values(), labels=quantity[chatid].keys(),
-                autopct="%1.1f%%", counterclock=False, startangle=90
-            )
-            fig.savefig(
-                path / f"{chatid}_timesofday.svg",
-                format="svg", transparent=True, bbox_inches="tight"
-            )
-            plt.close(fig)
-            ans[chatid]["quantity"] = f"{chatid}_timesofday.svg"
+            _add_chart(jobs, draw_tod_pie,
+                       path / f"{chatid}_timesofday.svg", quantity[chatid])
+            ans[chatid]["quantity"] = f"{chatid}_timesofday"
         else:
             ans[chatid]["quantity"] = None
 
     return ans
 
 
-def html_export(
-    path: str,
-    metadata: dict,
-    chatdata: dict[str, dict[int, dict]],
-    lang: str = "en_US.UTF-8",
-    theme: str = "light",
-    progress=None
+def draw_top_words(
+    path: Path,
+    data: dict[int, dict[str, dict]],
+    jobs: list = None,
 ):
-    """Создание HTML-файла из данных о пользователе и чатах.
+    """Отрисовка графиков самых частых слов.
 
-    :param path: путь к конечному файлу.
-    :param metadata: данные о пользователе вида {поле: значение}.
-    :param chatdata: данные о чатах вида {опция: данные}.
-    :param lang: языковая строка (напр., "en_US.UTF-8").
-    :param theme: название темы.
-    :param progress: сигнал для GUI, который отображает прогресс выполнения
-    задачи в процентах.
-    :type progress: PySide6.QtCore.Signal(int)
+    Слова всех чатов складываются из топов отдельных чатов, поэтому общий
+    топ приблизителен: слово, не вошедшее в топы чатов, в нем не учтено.
+    :param path: путь к папке, в которой сохранить изображения.
+    :param data: сведения о чатах вида:
+        {ID чата: {"chat": {слово: количество},
+                   "users": {имя пользователя: {слово: количество}}}}.
+    :param jobs: список, в который добавляются задания ChartJob вместо
+        построения графиков (см. ``run_charts``).
+    :return: имена изображений (без расширения) вида:
+        {ID чата: {"top": имя, ("user", имя пользователя): имя}} или
+        {"agg": {"top": имя}}.
     """
-    global TEXT
-    # перегенерация строк, если язык не английский
-    if lang != "en_US.UTF-8":
-        TEXT = translate_text(lang)
-    matplotlib.use("svg")   # отключение интерактивного бэкенда
+    # Возвращаемый словарь имен
+    ans = {}
+    # Слова всех чатов
+    words_agg = defaultdict(int)
 
-    abspath = Path(path).resolve()
-    files_dir = abspath.parent / f"{abspath.name.replace('.', '_')}_files"
-    os.makedirs(files_dir, exist_ok=True)
-    shutil.copyfile(PATH / "themes" / f"{theme}.css", files_dir / "style.css")
+    for chatdata in data.values():
+        for word, count in chatdata["chat"].items():
+            words_agg[word] += count
+
+    ans["agg"] = {}
+    if not words_agg:
+        return ans
+
+    # без слова "Другие": в топе только сами слова
+    top_agg = dict(sorted(words_agg.items(),
+                          key=lambda it: (-it[1], it[0]))[:TOP_WORDS])
+    _add_chart(jobs, draw_top_bar, path / "agg_top_words.svg", top_agg,
+               topsize=TOP_WORDS)
+    ans["agg"]["top"] = "agg_top_words"
+
+    for chatid, chatdata in data.items():
+        ans[chatid] = {}
+        if not chatdata["chat"]:
+            continue
+
+        _add_chart(jobs, draw_top_bar, path / f"{chatid}_top_words.svg",
+                   chatdata["chat"], topsize=TOP_WORDS)
+        ans[chatid]["top"] = f"{chatid}_top_words"
+        users = sorted(
+            (user for user, userdata in chatdata["users"].items()
+             if userdata),
+            key=lambda user: sum(chatdata["users"][user].values()),
+            reverse=True,
+        )
+        for i, user in enumerate(users[:TOP_WORDS_USERS]):
+            _add_chart(jobs, draw_top_bar,
+                       path / f"{chatid}_top_words_{i}.svg",
+                       chatdata["users"][user], topsize=TOP_WORDS)
+            ans[chatid]["user", user] = f"{chatid}_top_words_{i}"
 
+    return ans
+
+
+def _report_charts(files_dir: Path, metadata: dict, chatdata: dict,
+                   lang: str, workers: int, progress, cache, charts: str,
+                   image_format: str, dpi: int):
+    """Построение графиков отчета и сбор его данных по чатам.
+
+    Параметры те же, что у ``html_export``.
+    :param files_dir: каталог для файлов графиков.
+    :return: данные для шаблона вида {ID чата или "agg": {опция: данные}} и
+        список заданий ChartJob (в режиме "js" графики по ним не строятся).
+    """
     chatnames = {
         chatid: chat.name for chatid, chat in metadata["chats"].items()
     }
     features = defaultdict(lambda: defaultdict(str))
-    features_num = len(TEXT["features"])
-    for i, feat in enumerate(TEXT["features"]):
+    jobs = []
+    for feat in TEXT["features"]:
         if feat not in chatdata:
             continue
         match feat:
             case "symb" | "msg" | "word":
                 features[feat] = draw_symb_msg_word(
-                    files_dir, chatdata[feat], chatnames, feat
+                    files_dir, chatdata[feat], chatnames, feat, jobs
                 )
             case "voice_message" | "video_message" | "video_file" | "photo":
                 features[feat] = draw_voicemsg_videomsg_videos_photos(
-                    files_dir, chatdata[feat], chatnames, feat
+                    files_dir, chatdata[feat], chatnames, feat, jobs
                 )
             case "day_night":
-                features[feat] = draw_timesofday(files_dir, chatdata[feat])
-        if progress is not None:
-            progress.emit((i + 1) * 100 // features_num)
+                features[feat] = draw_timesofday(
+                    files_dir, chatdata[feat], jobs
+                )
+            case "top_words":
+                features[feat] = draw_top_words(
+                    files_dir, chatdata[feat], jobs
+                )
+    if charts == "js":
+        shutil.copyfile(PATH / "scripts" / "charts.js",
+                        files_dir / "charts.js")
+    else:
+        for job in jobs:
+            set_image_format(job, image_format, dpi)
+        run_charts(jobs, lang, workers, progress, cache)
+    if progress is not None and (not jobs or charts == "js"):
+        progress.emit(100)
 
     chatstat = defaultdict(lambda: defaultdict(str))
     for feat, featdata in features.items():
         for chat, stat in featdata.items():
             chatstat[chat][feat] = stat
 
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(PATH / "templates")
-    )
-    tmpl = env.get_template("index.html.jinja2")
-    tmpl.stream(
-        files_dir=files_dir.name,
-        text=TEXT,
-        metadata=metadata,
-        chatstat=chatstat,
-    ).dump(path)
+    return chatstat, jobs
+
+
+def _chart_names(stat: dict) -> list[str]:
+    """Имена графиков из данных чата для шаблона.
+
+    :param stat: данные вида {опция: {тип: имя графика или число}}.
+    """
+    return [res for featdata in stat.values() for res in featdata.values()
+            if isinstance(res, str)]
+
+
+def _chat_index(chatstat: dict, pages: dict, features: list) -> list[tuple]:
+    """Строки оглавления чатов разбитого на страницы отчета.
+
+    :param chatstat: данные для шаблона по чатам.
+    :param pages: пути к страницам чатов относительно главной страницы.
+    :param features: опции из ``INDEX_FEATURES``, которые есть в отчете.
+    :return: тройки из ID чата, пути к его странице и средних значений
+        опций за день (None, если значения нет).
+    """
+    return [(chat, pages[chat],
+             [stat[feat].get("avg") if feat in stat else None
+              for feat in features])
+            for chat, stat in chatstat.items() if chat != "agg"]
+
+
+def html_export(
+    path: str,
+    metadata: dict,
+    chatdata: dict[str, dict[int, dict]],
+    lang: str = "en_US.UTF-8",
+    theme: str = "light",
+    workers: int = None,
+    progress=None,
+    cache=None,
+    charts: str = "svg",
+    image_format: str = "svg",
+    dpi: int = DPI,
+    single_file: bool = False,
+    paged: bool = None,
+):
+    """Создание HTML-файла из данных о пользователе и чатах.
+
+    :param path: путь к конечному файлу.
+    :param metadata: данные о пользователе вида {поле: значение}.
+    :param chatdata: данные о чатах вида {опция: данные}.
+    :param lang: языковая строка (напр., "en_US.UTF-8").
+    :param theme: название темы.
+    :param workers: число процессов для построения графиков. По умолчанию
+    графики строятся в текущем процессе.
+    :param progress: сигнал для GUI, который отображает прогресс выполнения
+    задачи в процентах от построенных графиков.
+    :type progress: PySide6.QtCore.Signal(int)
+    :param cache: кэш графиков (cache.ChartCache), из которого берутся
+    неизменившиеся графики.
+    :param charts: способ вывода графиков из ``CHART_MODES``. В режиме "js"
+    графики не строятся, а их данные записываются в один файл и рисуются
+    в браузере.
+    :param image_format: формат файлов графиков из ``IMAGE_FORMATS``.
+    :param dpi: разрешение растровых графиков.
+    :param single_file: записать отчет в один файл: стили и графики (или
+    скрипты режима "js") встраиваются в страницу, а каталог файлов не
+    создается.
+    :param paged: разбить отчет на страницы: на главной остаются общая
+    статистика и оглавление чатов со средними значениями, а у каждого чата
+    своя страница в каталоге файлов. Так время открытия главной страницы
+    почти не зависит от числа чатов. По умолчанию отчет разбивается, если
+    чатов больше ``PAGED_MIN_CHATS``, а не в один файл.
+    """
+    if charts not in CHART_MODES:
+        raise ValueError(f"Unknown chart mode: {charts}")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format: {image_format}")
+    if paged and single_file:
+        raise ValueError("A paged report can not be a single file")
+    global TEXT
+    # перегенерация строк, если язык не английский
+    if lang != "en_US.UTF-8":
+        TEXT = translate_text(lang)
+
+    abspath = Path(path).resolve()
+    with contextlib.ExitStack() as stack:
+        if single_file:
+            # файлы графиков нужны только до записи страницы
+            files_dir = Path(stack.enter_context(
+                    tempfile.TemporaryDirectory()))
+        else:
+            files_dir = (abspath.parent
+                         / f"{abspath.name.replace('.', '_')}_files")
+            os.makedirs(files_dir, exist_ok=True)
+            shutil.copyfile(PATH / "themes" / f"{theme}.css",
+                            files_dir / "style.css")
+        chatstat, jobs = _report_charts(
+                files_dir, metadata, chatdata, lang, workers, progress,
+                cache, charts, image_format, dpi)
+        jobs = {job.path.stem: job for job in jobs}
+        if paged is None:
+            paged = not single_file and len(chatstat) - 1 > PAGED_MIN_CHATS
+
+        import jinja2
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(PATH / "templates")
+        )
+        tmpl = env.get_template("index.html.jinja2")
+        page = {
+            "text": TEXT,
+            "metadata": metadata,
+            "charts": charts,
+            # имена файлов графиков по именам графиков
+            "images": {name: job.path.name for name, job in jobs.items()},
+        }
+        if paged:
+            # страницы чатов лежат рядом с графиками и стилями
+            pages = {}
+            for chat, stat in chatstat.items():
+                if chat == "agg":
+                    continue
+                name = f"chat_{chat}"
+                if charts == "js":
+                    write_chart_data(files_dir / f"{name}_data.js",
+                                     [jobs[res] for res in _chart_names(stat)])
+                tmpl.stream(
+                    files_dir=".",
+                    chatstat={chat: stat},
+                    chart_data=f"{name}_data.js",
+                    index=f"../{abspath.name}",
+                    **page,
+                ).dump(str(files_dir / f"{name}.html"))
+                pages[chat] = f"{files_dir.name}/{name}.html"
+            page["index_features"] = [feat for feat in INDEX_FEATURES
+                                      if feat in chatdata]
+            page["chat_index"] = _chat_index(chatstat, pages,
+                                             page["index_features"])
+            chatstat = {chat: stat for chat, stat in chatstat.items()
+                        if chat == "agg"}
+        if charts == "js":
+            write_chart_data(
+                    files_dir / "charts_data.js",
+                    [jobs[res] for stat in chatstat.values()
+                     for res in _chart_names(stat)])
+        if single_file:
+            page["style"] = (PATH / "themes" / f"{theme}.css").read_text(
+                    encoding="utf-8")
+            if charts == "js":
+                page["scripts"] = [
+                        inline_script(files_dir / "charts_data.js"),
+                        inline_script(files_dir / "charts.js")]
+            else:
+                page["inline"] = InlineCharts(
+                        {name: files_dir / file
+                         for name, file in page["images"].items()})
+        tmpl.stream(
+            files_dir=files_dir.name,
+            chatstat=chatstat,
+            chart_data="charts_data.js",
+            **page,
+        ).dump(path)
@@ -0,0 +1,132 @@
+"""Кэш построенных графиков отчета.
+
+Файл графика хранится под хэшем всего, от чего зависит его содержимое:
+функции построения, ее параметров, данных, языка отчета и версии
+matplotlib. Поэтому при повторной сборке отчета неизменившиеся графики
+копируются из кэша, а не строятся заново. Общий размер кэша ограничен, при
+превышении удаляются давно не использованные графики.
+"""
+import hashlib
+import logging
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from tganalyzer.core.cache import default_dir
+
+
+logger = logging.getLogger(__name__)
+
+# Константы
+
+SIZE_LIMIT = 256 << 20   # ограничение общего размера кэша в байтах
+FORMAT = 1   # версия ключа, меняется вместе с кодом построения графиков
+
+
+class ChartCache():
+    """Кэш файлов графиков, адресуемых по содержимому."""
+
+    def __init__(self, directory=None, size_limit: int = SIZE_LIMIT):
+        """Создает кэш.
+
+        :param directory: каталог кэша, по умолчанию подкаталог charts
+        каталога кэша (см. ``core.cache.default_dir``).
+        :param size_limit: ограничение общего размера кэша в байтах.
+        """
+        self.directory = Path(directory) if directory else \
+            default_dir() / "charts"
+        self.size_limit = size_limit
+
+    @staticmethod
+    def key(job, lang: str) -> str:
+        """Считает ключ графика.
+
+        Порядок элементов данных учитывается: от него зависят порядок
+        легенды и столбцов с равными значениями.
+        :param job: задание на построение графика (html_export.ChartJob).
+        :param lang: языковая строка (напр., "en_US.UTF-8").
+        :return: шестнадцатеричная строка.
+        """
+        import matplotlib
+        digest = hashlib.blake2b(repr((
+                FORMAT, matplotlib.__version__, lang,
+                job.draw.__module__, job.draw.__qualname__,
+                sorted(job.params.items()), job.data,
+                )).encode("utf-8"), digest_size=16)
+        return digest.hexdigest()
+
+    def _entry(self, key: str, path: Path) -> Path:
+        """Путь к файлу графика в кэше.
+
+        :param key: ключ графика.
+        :param path: путь к конечному файлу (важно его расширение).
+        """
+        return self.directory / (key + Path(path).suffix)
+
+    def fetch(self, key: str, path: Path) -> bool:
+        """Копирует график из кэша, если он там есть.
+
+        :param key: ключ графика.
+        :param path: путь к конечному файлу.
+        :return: найден ли график.
+        """
+        entry = self._entry(key, path)
+        try:
+            shutil.copyfile(entry, path)
+            os.utime(entry)   # время изменения - время использования
+        except FileNotFoundError:
+            return False
+        except OSError as error:
+            logger.warning("Could not use cached chart %s: %s", entry, error)
+            return False
+        return True
+
+    def store(self, key: str, path: Path):
+        """Сохраняет построенный график в кэш.
+
+        Лишние графики удаляются отдельно (см. ``evict``).
+        :param key: ключ графика.
+        :param path: путь к построенному файлу.
+        """
+        entry = self._entry(key, path)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+            os.close(fd)
+            try:
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, entry)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        except OSError as error:
+            logger.warning("Could not cache chart %s: %s", path, error)
+
+    def _entries(self):
+        """Выдает пары из файла графика и его os.stat_result."""
+        if not self.directory.is_dir():
+            return
+        for entry in self.directory.iterdir():
+            if entry.name.startswith(".tmp-"):
+                continue
+            try:
+                yield entry, entry.stat()
+            except OSError:
+                continue
+
+    def evict(self):
+        """Удаляет давно не использованные графики сверх ограничения."""
+        entries = sorted(self._entries(), key=lambda item: item[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+        for entry, stat in entries:
+            if total <= self.size_limit:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total -= stat.st_size
+
+    def clear(self):
+        """Удаляет все графики."""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,105 @@
+"""Встраивание графиков в страницу отчета, собранного в один файл.
+
+Графики svg встраиваются в разметку страницы, растровые - в элемент
+``<image>`` с data URI. Каждый график оформляется как ``<symbol>`` с
+идентификатором по хэшу содержимого, поэтому одинаковые графики (например,
+общий и единственного чата) записываются один раз, а в остальных местах на
+них ссылается ``<use>``.
+"""
+import base64
+import hashlib
+from pathlib import Path
+import re
+
+
+# Константы
+
+MIME_TYPES = {".png": "image/png", ".webp": "image/webp"}
+
+_PROLOG = re.compile(r"<\?xml.*?\?>|<!DOCTYPE.*?>|<!--.*?-->|"
+                     r"<metadata>.*?</metadata>", re.DOTALL)
+_PATH_DATA = re.compile(r' d="([^"]*)"')
+_ID = re.compile(r' id="([^"]*)"')
+_REFERENCE = re.compile(r'#([^)"\s]+)')
+_ROOT = re.compile(r"<svg([^>]*)>(.*)</svg>", re.DOTALL)
+_ATTRIBUTE = re.compile(r'([\w:]+)="([^"]*)"')
+
+
+def minify_svg(svg: str) -> str:
+    """Сжатие разметки svg, построенной matplotlib.
+
+    Удаляются пролог, комментарии, метаданные, пробелы между элементами и
+    в данных контуров, а также идентификаторы, на которые нет ссылок
+    (matplotlib помечает ими каждую группу). Вид графика не меняется.
+    :param svg: разметка svg.
+    """
+    svg = _PROLOG.sub("", svg)
+    svg = _PATH_DATA.sub(lambda m: ' d="' + " ".join(m[1].split()) + '"',
+                         svg)
+    svg = re.sub(r">\s+<", "><", svg).strip()
+    referenced = set(_REFERENCE.findall(svg))
+    return _ID.sub(lambda m: m[0] if m[1] in referenced else "", svg)
+
+
+class InlineCharts:
+    """Разметка графиков для вставки в страницу по их именам.
+
+    Файлы графиков читаются по одному во время записи страницы, так что в
+    памяти не держится больше одного графика.
+    """
+
+    def __init__(self, images: dict[str, Path]):
+        """Создание объекта.
+
+        :param images: пути к файлам графиков по именам графиков.
+        """
+        self.images = images
+        self.written = set()   # идентификаторы уже вставленных графиков
+
+    def _parts(self, path: Path) -> tuple[dict, str]:
+        """Атрибуты корневого элемента svg и содержимое графика.
+
+        :param path: путь к файлу графика.
+        """
+        if path.suffix == ".svg":
+            root, content = _ROOT.search(
+                    minify_svg(path.read_text(encoding="utf-8"))).groups()
+            attrs = dict(_ATTRIBUTE.findall(root))
+            return ({key: attrs[key] for key in ("width", "height",
+                                                 "viewBox")},
+                    content)
+        from PIL import Image
+        with Image.open(path) as image:
+            width, height = image.size
+        data = base64.b64encode(path.read_bytes()).decode("ascii")
+        return ({"width": width, "height": height,
+                 "viewBox": f"0 0 {width} {height}"},
+                f'<image width="{width}" height="{height}" '
+                f'href="data:{MIME_TYPES[path.suffix]};base64,{data}"/>')
+
+    def __call__(self, name: str) -> str:
+        """Разметка графика.
+
+        При первой вставке графика с данным содержимым в нее входит само
+        содержимое, при следующих - только ссылка на него.
+        :param name: имя графика.
+        """
+        attrs, content = self._parts(self.images[name])
+        chart_id = "chart-" + hashlib.blake2b(
+                content.encode("utf-8"), digest_size=8).hexdigest()
+        svg = '<svg class="plot" xmlns="http://www.w3.org/2000/svg" ' + \
+            " ".join(f'{key}="{value}"' for key, value in attrs.items()) + ">"
+        if chart_id not in self.written:
+            self.written.add(chart_id)
+            svg += (f'<symbol id="{chart_id}" viewBox="{attrs["viewBox"]}">'
+                    f"{content}</symbol>")
+        return svg + f'<use href="#{chart_id}"/></svg>'
+
+
+def inline_script(path: Path) -> str:
+    """Текст скрипта для вставки в элемент ``<script>`` страницы.
+
+    :param path: путь к файлу скрипта.
+    """
+    # "</script>" в строках данных закрыл бы элемент раньше времени
+    return Path(path).read_text(encoding="utf-8").replace("</", "<\\/")
@@ -0,0 +1,295 @@
+/*
+ * Отрисовка графиков отчета в браузере без сторонних библиотек.
+ *
+ * Данные графиков лежат в переменной TG_CHARTS (файл charts_data.js) по
+ * именам, а место графика на странице задается элементом с атрибутом
+ * data-chart. Графики рисуются в SVG, когда элемент появляется на экране.
+ * Описания графиков формирует html_export.chart_spec, и число точек рядов
+ * в них уже ограничено.
+ */
+(function () {
+    "use strict";
+
+    var NS = "http://www.w3.org/2000/svg";
+    // Цвета по умолчанию matplotlib (tab10)
+    var COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+                  "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"];
+    var DAY = 86400000;
+
+    function node(parent, name, attrs, text) {
+        var el = document.createElementNS(NS, name);
+        for (var key in attrs) {
+            el.setAttribute(key, attrs[key]);
+        }
+        if (text !== undefined) {
+            el.textContent = text;
+        }
+        if (parent) {
+            parent.appendChild(el);
+        }
+        return el;
+    }
+
+    function canvas(el, width, height) {
+        return node(el, "svg", {
+            viewBox: "0 0 " + width + " " + height,
+            width: "100%",
+            "font-family": "sans-serif",
+            "font-size": 12,
+            fill: "currentColor"
+        });
+    }
+
+    function format(value) {
+        return Math.round(value * 1000) / 1000 + "";
+    }
+
+    // Круглые значения делений оси от 0 до max
+    function ticks(max, count) {
+        if (!(max > 0)) {
+            return [0, 1];
+        }
+        var raw = max / count;
+        var power = Math.pow(10, Math.floor(Math.log10(raw)));
+        var step = [1, 2, 2.5, 5, 10].map(function (k) {
+            return k * power;
+        }).filter(function (s) {
+            return s >= raw;
+        })[0];
+        var result = [];
+        for (var v = 0; v < max + step; v += step) {
+            result.push(v);
+        }
+        return result;
+    }
+
+    function yAxis(svg, box, values) {
+        var scale = values[values.length - 1];
+        values.forEach(function (v) {
+            var y = box.y + box.h - v / scale * box.h;
+            node(svg, "line", {x1: box.x, x2: box.x + box.w, y1: y, y2: y,
+                               stroke: "currentColor",
+                               "stroke-opacity": 0.2});
+            node(svg, "text", {x: box.x - 6, y: y + 4,
+                               "text-anchor": "end"}, format(v));
+        });
+        return function (v) {
+            return box.y + box.h - v / scale * box.h;
+        };
+    }
+
+    function legend(svg, x, y, labels) {
+        labels.forEach(function (label, i) {
+            var row = y + i * 20;
+            node(svg, "rect", {x: x, y: row - 10, width: 14, height: 10,
+                               fill: COLORS[i % COLORS.length]});
+            node(svg, "text", {x: x + 20, y: row}, label);
+        });
+    }
+
+    function bar(el, spec) {
+        var svg = canvas(el, 720, 420);
+        var box = {x: 70, y: 20, w: 630, h: 260};
+        var y = yAxis(svg, box, ticks(Math.max.apply(null, spec.values), 5));
+        var slot = box.w / spec.values.length;
+        spec.values.forEach(function (value, i) {
+            var x = box.x + i * slot + slot * 0.1;
+            var rect = node(svg, "rect", {
+                x: x, y: y(value), width: slot * 0.8,
+                height: box.y + box.h - y(value), fill: COLORS[0]
+            });
+            node(rect, "title", {}, spec.labels[i] + ": " + format(value));
+            node(svg, "text", {x: x + slot * 0.4, y: y(value) - 4,
+                               "text-anchor": "middle"}, format(value));
+            var lx = x + slot * 0.4, ly = box.y + box.h + 14;
+            node(svg, "text", {
+                x: lx, y: ly, "text-anchor": "end",
+                transform: "rotate(-45 " + lx + " " + ly + ")"
+            }, spec.labels[i]);
+        });
+    }
+
+    function pie(el, spec) {
+        // подписи времени суток стоят у секторов, остальные - в легенде
+        var svg = canvas(el, spec.clockwise ? 380 : 600, 320);
+        var cx = spec.clockwise ? 190 : 160, cy = 160, r = 120;
+        var total = spec.values.reduce(function (a, b) {
+            return a + b;
+        }, 0);
+        // как в matplotlib: от оси x против часовой стрелки или от 12 часов
+        // по часовой
+        var angle = spec.clockwise ? Math.PI / 2 : 0;
+        var sign = spec.clockwise ? -1 : 1;
+        spec.values.forEach(function (value, i) {
+            var sweep = value / total * 2 * Math.PI;
+            var end = angle + sign * sweep;
+            var mid = (angle + end) / 2;
+            var point = function (a, k) {
+                return [cx + k * r * Math.cos(a), cy - k * r * Math.sin(a)];
+            };
+            var p1 = point(angle, 1), p2 = point(end, 1);
+            var d = sweep >= 2 * Math.PI - 1e-9 ?
+                "M" + (cx - r) + "," + cy + "a" + r + "," + r +
+                " 0 1,0 " + 2 * r + ",0a" + r + "," + r + " 0 1,0 " +
+                -2 * r + ",0" :
+                "M" + cx + "," + cy + "L" + p1 + "A" + r + "," + r +
+                " 0 " + (sweep > Math.PI ? 1 : 0) + "," +
+                (spec.clockwise ? 1 : 0) + " " + p2 + "Z";
+            var wedge = node(svg, "path", {d: d,
+                                           fill: COLORS[i % COLORS.length]});
+            node(wedge, "title", {}, spec.labels[i] + ": " + format(value));
+            if (spec.pct && value > 0) {
+                var pos = point(mid, spec.clockwise ? 0.6 : 1.25);
+                node(svg, "text", {x: pos[0], y: pos[1] + 4,
+                                   "text-anchor": "middle"},
+                     (value / total * 100).toFixed(1) + "%");
+            }
+            if (spec.amounts && value > 0) {
+                var at = point(mid, 0.875);
+                node(svg, "text", {x: at[0], y: at[1] + 4,
+                                   "text-anchor": "middle"}, format(value));
+            }
+            if (spec.clockwise) {
+                var label = point(mid, 1.1);
+                node(svg, "text", {
+                    x: label[0], y: label[1] + 4,
+                    "text-anchor": Math.cos(mid) < 0 ? "end" : "start"
+                }, spec.labels[i]);
+            }
+            angle = end;
+        });
+        if (!spec.clockwise) {
+            legend(svg, 330, 160 - spec.labels.length * 10, spec.labels);
+        }
+    }
+
+    // Подпись точки: день, неделя (с понедельника) или месяц
+    function dateString(start, day, resolution) {
+        var text = new Date(start + day * DAY).toISOString().slice(0, 10);
+        return resolution === "M" ? text.slice(0, 7) : text;
+    }
+
+    function line(el, spec) {
+        var svg = canvas(el, 900, 420);
+        var box = {x: 70, y: 20, w: 620, h: 320};
+        var start = Date.parse(spec.start);
+        var days = 1, max = 0, grid = {};
+        spec.series.forEach(function (s) {
+            days = Math.max(days, s.x[s.x.length - 1] + 1);
+            s.values.forEach(function (v, k) {
+                max = Math.max(max, v);
+                grid[s.x[k]] = true;
+            });
+        });
+        var y = yAxis(svg, box, ticks(max, 5));
+        var x = function (day) {
+            return box.x + (days > 1 ? day / (days - 1) * box.w : 0);
+        };
+        // деления дат, как в html_export.draw_date_plot
+        var step = Math.ceil(days / spec.label_max);
+        for (var day = 0; day < days - 1 || day === 0; day += step) {
+            node(svg, "line", {x1: x(day), x2: x(day), y1: box.y,
+                               y2: box.y + box.h, stroke: "currentColor",
+                               "stroke-opacity": 0.2});
+            var lx = x(day), ly = box.y + box.h + 14;
+            node(svg, "text", {
+                x: lx, y: ly, "text-anchor": "end",
+                transform: "rotate(-30 " + lx + " " + ly + ")"
+            }, dateString(start, day, "D"));
+        }
+        spec.series.forEach(function (s, i) {
+            var points = s.values.map(function (v, k) {
+                return x(s.x[k]) + "," + y(v);
+            });
+            node(svg, "polyline", {points: points.join(" "), fill: "none",
+                                   stroke: COLORS[i % COLORS.length],
+                                   "stroke-width": 1.5});
+        });
+        legend(svg, box.x + box.w + 20, box.y + 20,
+               spec.series.map(function (s) {
+                   return s.label;
+               }));
+        var xs = Object.keys(grid).map(Number).sort(function (a, b) {
+            return a - b;
+        });
+        hover(svg, box, spec, start, xs, x);
+    }
+
+    // Индекс элемента отсортированного массива, ближайшего к value
+    function nearest(array, value) {
+        var lo = 0, hi = array.length - 1;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (array[mid] < value) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        if (lo > 0 && value - array[lo - 1] < array[lo] - value) {
+            lo--;
+        }
+        return lo;
+    }
+
+    // Вертикальная линия и значения рядов в ближайшей к указателю точке
+    function hover(svg, box, spec, start, xs, x) {
+        var cursor = node(svg, "line", {y1: box.y, y2: box.y + box.h,
+                                        stroke: "currentColor",
+                                        visibility: "hidden"});
+        var tip = node(svg, "text", {y: box.y + 12, visibility: "hidden"});
+        var area = node(svg, "rect", {x: box.x, y: box.y, width: box.w,
+                                      height: box.h, fill: "transparent"});
+        var days = xs[xs.length - 1] + 1;
+        area.addEventListener("mousemove", function (event) {
+            var rect = svg.getBoundingClientRect();
+            var px = (event.clientX - rect.left) / rect.width * 900;
+            var day = xs[nearest(xs, (px - box.x) / box.w * (days - 1))];
+            cursor.setAttribute("x1", x(day));
+            cursor.setAttribute("x2", x(day));
+            var parts = [dateString(start, day, spec.resolution)];
+            spec.series.forEach(function (s) {
+                var k = nearest(s.x, day);
+                if (s.x[k] === day) {
+                    parts.push(s.label + ": " + format(s.values[k]));
+                }
+            });
+            tip.textContent = parts.join("  ");
+            var right = x(day) > box.x + box.w / 2;
+            tip.setAttribute("x", x(day) + (right ? -6 : 6));
+            tip.setAttribute("text-anchor", right ? "end" : "start");
+            cursor.setAttribute("visibility", "visible");
+            tip.setAttribute("visibility", "visible");
+        });
+        area.addEventListener("mouseleave", function () {
+            cursor.setAttribute("visibility", "hidden");
+            tip.setAttribute("visibility", "hidden");
+        });
+    }
+
+    var RENDERERS = {bar: bar, pie: pie, line: line};
+
+    function render(el) {
+        var spec = TG_CHARTS[el.getAttribute("data-chart")];
+        if (spec && !el.firstChild) {
+            RENDERERS[spec.kind](el, spec);
+        }
+    }
+
+    var elements = document.querySelectorAll("[data-chart]");
+    if (!("IntersectionObserver" in window)) {
+        elements.forEach(render);
+        return;
+    }
+    var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                render(entry.target);
+            }
+        });
+    }, {rootMargin: "200px"});
+    elements.forEach(function (el) {
+        observer.observe(el);
+    });
+})();